@@ -0,0 +1,143 @@
+"""
+Arquivo de rota binário (.npy) para a captura adensada.
+
+Cada ponto é um registro de um array estruturado do NumPy com id, X, Y,
+avanço opcional (F, NaN quando ausente) e a planta (vazio quando ausente).
+Com o campo plant padrão de 16 bytes o registro tem 44 bytes; se algum id da
+rota passar disso em UTF-8, o campo (e o registro) cresce até o maior id, sem
+truncar. O arquivo é gravado de uma vez e aberto com mmap, então grades de
+dezenas de milhares de pontos abrem instantaneamente e a captura lê as
+colunas X/Y em bloco. O pontos.json continua aceito para importação e
+exportação:
+
+    python arquivo_rota.py importar pontos.json pontos.npy
+    python arquivo_rota.py exportar pontos.npy pontos.json
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+ARQUIVO_ROTA = "pontos.npy"
+ARQUIVO_JSON = "pontos.json"
+
+DTYPE_ROTA = np.dtype([
+    ("id", "<i8"),
+    ("X", "<f8"),
+    ("Y", "<f8"),
+    ("F", "<f4"),
+    ("plant", "S16"),  # id da planta em UTF-8
+])
+
+
+def dtype_rota(plantas_utf8=()):
+    """
+    DTYPE_ROTA com o campo plant do tamanho do maior id (em bytes UTF-8), para
+    que ids longos não sejam truncados; nunca menor que os 16 bytes padrão.
+    """
+    tamanho = max((len(planta) for planta in plantas_utf8), default=0)
+    if tamanho <= DTYPE_ROTA["plant"].itemsize:
+        return DTYPE_ROTA
+    return np.dtype([(nome, DTYPE_ROTA[nome] if nome != "plant" else f"S{tamanho}")
+                     for nome in DTYPE_ROTA.names])
+
+
+def criar_rota(coords, ids=None, feed=None, plantas=None):
+    """Monta o array estruturado a partir de colunas (operação em bloco)."""
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if plantas is not None:
+        plantas = [str(planta).encode("utf-8") for planta in plantas]
+    rota = np.zeros(len(coords), dtype=dtype_rota(plantas or ()))
+    rota["id"] = np.arange(1, len(coords) + 1) if ids is None else ids
+    rota["X"] = coords[:, 0]
+    rota["Y"] = coords[:, 1]
+    rota["F"] = np.nan if feed is None else feed
+    if plantas is not None:
+        rota["plant"] = plantas
+    return rota
+
+
+def salvar_rota(rota, caminho=ARQUIVO_ROTA):
+    """Grava a rota; .json exporta no formato antigo, o resto vai para .npy."""
+    if caminho.lower().endswith(".json"):
+        exportar_json(rota, caminho)
+        return
+    # Mantém o dtype da rota: o campo plant pode ser maior que o padrão
+    np.save(caminho, np.asarray(rota), allow_pickle=False)
+
+
+def carregar_rota(caminho=ARQUIVO_ROTA):
+    """
+    Abre a rota. Para .npy retorna um memmap somente leitura (nada é lido do
+    disco até ser acessado); .json é convertido para o mesmo array estruturado.
+    """
+    if caminho.lower().endswith(".json"):
+        return importar_json(caminho)
+    rota = np.load(caminho, mmap_mode="r", allow_pickle=False)
+    if rota.dtype.names is None or not {"X", "Y"} <= set(rota.dtype.names):
+        raise ValueError(f"{caminho} não é um arquivo de rota (campos X/Y ausentes)")
+    return rota
+
+
+def localizar_rota(caminho=ARQUIVO_ROTA):
+    """Usa o arquivo pedido ou, se não existir, o pontos.json antigo."""
+    if os.path.exists(caminho) or not os.path.exists(ARQUIVO_JSON):
+        return caminho
+    return ARQUIVO_JSON
+
+
+def iterar_rota(rota, inicio=0):
+    """Gera um dicionário por ponto, lendo os registros sob demanda."""
+    campos = rota.dtype.names
+    for i in range(inicio, len(rota)):
+        registro = rota[i]
+        ponto = {"id": int(registro["id"]), "X": float(registro["X"]), "Y": float(registro["Y"])}
+        if "F" in campos and not np.isnan(registro["F"]):
+            ponto["F"] = float(registro["F"])
+        if "plant" in campos and registro["plant"]:
+            ponto["plant"] = registro["plant"].decode("utf-8")
+        yield ponto
+
+
+def importar_json(caminho=ARQUIVO_JSON):
+    """Converte uma lista de {"id", "X", "Y"[, "F", "plant"]} em array de rota."""
+    with open(caminho, "r") as f:
+        pontos = json.load(f)
+    if not isinstance(pontos, list):
+        raise ValueError(f"{caminho} deve conter uma lista de pontos")
+    plantas = [str(ponto.get("plant", "")).encode("utf-8") for ponto in pontos]
+    rota = np.zeros(len(pontos), dtype=dtype_rota(plantas))
+    for i, ponto in enumerate(pontos):
+        try:
+            identificador = int(ponto.get("id", i + 1))
+        except (TypeError, ValueError):
+            identificador = i + 1
+        rota[i] = (identificador, ponto.get("X", 0.0), ponto.get("Y", 0.0),
+                   ponto.get("F", np.nan), plantas[i])
+    return rota
+
+
+def exportar_json(rota, caminho=ARQUIVO_JSON):
+    with open(caminho, "w") as f:
+        json.dump(list(iterar_rota(rota)), f, indent=4)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Converte rotas entre pontos.json e .npy")
+    parser.add_argument("operacao", choices=["importar", "exportar"])
+    parser.add_argument("origem")
+    parser.add_argument("destino")
+    args = parser.parse_args(argv)
+    if args.operacao == "importar":
+        rota = importar_json(args.origem)
+        salvar_rota(rota, args.destino)
+    else:
+        rota = carregar_rota(args.origem)
+        exportar_json(rota, args.destino)
+    print(f"{len(rota)} pontos: {args.origem} -> {args.destino}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Captura adensada em movimento ("fly-by").
+
+Em vez de parar em cada ponto da grade, cada linha do zig-zag vira um único
+movimento G1 em velocidade de varredura. A thread de leitura preenche o
+histórico de posições (relatórios MPos/WPos em alta frequência); quando a
+cabeça cruza a coordenada de um alvo, é escolhido o frame exposto mais perto
+desse instante e a imagem recebe a posição interpolada no meio da exposição.
+
+O tempo total passa a depender do comprimento das linhas e da velocidade de
+varredura, não da quantidade de pontos. A velocidade é limitada pelo borrão
+admitido durante a exposição e pelo espaçamento entre frames consecutivos.
+"""
+
+import math
+
+BORRAO_PADRAO_MM = 0.5
+EXPOSICAO_PADRAO_S = 0.002
+TOLERANCIA_PADRAO_MM = 5.0
+
+
+def linhas_varredura(coords, tolerancia=1e-6):
+    """
+    Divide a sequência de pontos em linhas retas paralelas a um eixo,
+    percorridas em um único sentido. Retorna listas de índices em coords.
+    """
+    linhas = []
+    atual = []
+    eixo = None
+    for i, (x, y) in enumerate(coords):
+        if not atual:
+            atual = [i]
+            continue
+        x0, y0 = coords[atual[0]]
+        xa, ya = coords[atual[-1]]
+        if len(atual) == 1:
+            if abs(x - x0) <= tolerancia and abs(y - y0) > tolerancia:
+                eixo = 1
+            elif abs(y - y0) <= tolerancia and abs(x - x0) > tolerancia:
+                eixo = 0
+            else:
+                eixo = None
+        mesmo_eixo = eixo is not None and abs((x, y)[1 - eixo] - (x0, y0)[1 - eixo]) <= tolerancia
+        sentido = ((x, y)[eixo] - (xa, ya)[eixo]) * ((xa, ya)[eixo] - (x0, y0)[eixo]) if mesmo_eixo else 0
+        if mesmo_eixo and (len(atual) == 1 or sentido > 0):
+            atual.append(i)
+        else:
+            linhas.append(atual)
+            atual = [i]
+            eixo = None
+    if atual:
+        linhas.append(atual)
+    return linhas
+
+
+def feed_varredura(feed_max, borrao_mm=BORRAO_PADRAO_MM, exposicao_s=EXPOSICAO_PADRAO_S,
+                   periodo_frames=1.0 / 30.0, tolerancia_mm=TOLERANCIA_PADRAO_MM):
+    """
+    Avanço de varredura (mm/min) e o fator que o limita.
+
+    borrao_mm: deslocamento máximo admitido durante a exposição
+    periodo_frames: intervalo entre frames da câmera (s)
+    tolerancia_mm: distância máxima entre o alvo e o frame mais próximo
+    """
+    limites = {"feed": feed_max / 60.0}
+    if exposicao_s > 0:
+        limites["borrão"] = borrao_mm / exposicao_s
+    if periodo_frames > 0:
+        # O frame mais próximo fica a no máximo meio período do cruzamento
+        limites["taxa de frames"] = 2.0 * tolerancia_mm / periodo_frames
+    fator = min(limites, key=limites.get)
+    return 60.0 * limites[fator], fator
+
+
+class CapturaContinua:
+    """
+    Varredura contínua das linhas de uma grade.
+
+    streamer/estado/grabber: GrblStreamer, EstadoMaquina e FrameGrabber ativos
+    estimador: EstimadorMovimento com as configurações do $$
+    feed: avanço de varredura (mm/min); feed_deslocamento: avanço entre linhas
+    exposicao_s: duração da exposição, para situar o meio do frame
+    aguardar_parada: função que espera o fim do movimento (retorna None se cancelado)
+    ativo: função que retorna False quando a execução foi cancelada
+    """
+
+    def __init__(self, streamer, estado, grabber, estimador, feed, feed_deslocamento,
+                 exposicao_s=EXPOSICAO_PADRAO_S, aguardar_parada=None, ativo=None, log=None):
+        self.streamer = streamer
+        self.estado = estado
+        self.grabber = grabber
+        self.estimador = estimador
+        self.feed = feed
+        self.feed_deslocamento = feed_deslocamento
+        self.exposicao_s = exposicao_s
+        self.aguardar_parada = aguardar_parada
+        self.ativo = ativo or (lambda: True)
+        self.log = log or (lambda mensagem: None)
+        configuracoes = estimador.configuracoes
+        # Curso máximo ($130/$131): após o homing as coordenadas de máquina são negativas
+        self.curso = (configuracoes.get(130), configuracoes.get(131))
+
+    def _trecho(self, coords, linha, limites):
+        """Início e fim do movimento da linha, com distância de aceleração nas pontas."""
+        inicio = coords[linha[0]]
+        fim = coords[linha[-1]]
+        comprimento = math.hypot(fim[0] - inicio[0], fim[1] - inicio[1])
+        if comprimento == 0:
+            return inicio, fim, (0.0, 0.0)
+        direcao = ((fim[0] - inicio[0]) / comprimento, (fim[1] - inicio[1]) / comprimento)
+        aceleracao = self.estimador.acel_x if abs(direcao[0]) > abs(direcao[1]) else self.estimador.acel_y
+        v = self.feed / 60.0
+        margem = 1.2 * v * v / (2.0 * aceleracao)
+
+        def limitar(p):
+            return tuple(min(max(p[k], limites[k][0]), limites[k][1]) for k in (0, 1))
+
+        partida = limitar((inicio[0] - direcao[0] * margem, inicio[1] - direcao[1] * margem))
+        chegada = limitar((fim[0] + direcao[0] * margem, fim[1] + direcao[1] * margem))
+        return partida, chegada, direcao
+
+    def _limites(self, coords):
+        limites = []
+        for k in (0, 1):
+            valores = [p[k] for p in coords]
+            if self.curso[k]:
+                limites.append((-self.curso[k], 0.0))
+            else:
+                # Sem o curso conhecido, não sai do retângulo da própria grade
+                limites.append((min(valores), max(valores)))
+        return limites
+
+    def tempos_trechos(self, coords, linhas):
+        """
+        Tempo previsto por ponto (deslocamento até a linha e varredura divididos
+        entre os pontos dela) mais o retorno à origem, para a PrevisaoExecucao.
+        """
+        limites = self._limites(coords)
+        varredura = self.estimador.com_feed(self.feed)
+        deslocamento = self.estimador.com_feed(self.feed_deslocamento)
+        tempos = []
+        posicao = (0.0, 0.0)
+        for linha in linhas:
+            partida, chegada, _ = self._trecho(coords, linha, limites)
+            t_linha = (deslocamento.tempo(partida[0] - posicao[0], partida[1] - posicao[1])
+                       + varredura.tempo(chegada[0] - partida[0], chegada[1] - partida[1]))
+            tempos.extend([t_linha / len(linha)] * len(linha))
+            posicao = chegada
+        tempos.append(deslocamento.tempo(-posicao[0], -posicao[1]))
+        return tempos
+
+    def executar(self, coords, linhas, ao_capturar):
+        """
+        Varre as linhas em ordem. Para cada alvo chama
+        ao_capturar(indice, frame, x, y, instante) com a posição medida no meio
+        da exposição. Retorna a quantidade de alvos processados.
+        """
+        limites = self._limites(coords)
+        processados = 0
+        for numero, linha in enumerate(linhas):
+            if not self.ativo():
+                break
+            partida, chegada, direcao = self._trecho(coords, linha, limites)
+            self.log(f"Linha {numero + 1} de {len(linhas)}: {len(linha)} pontos a F{self.feed:.0f}")
+            self.streamer.enviar(f"G1 X{partida[0]:.3f} Y{partida[1]:.3f} F{self.feed_deslocamento:.0f}")
+            if self.aguardar_parada() is None:
+                break
+            t_inicio = self.estado.t_status or 0.0
+            self.streamer.enviar(f"G1 X{chegada[0]:.3f} Y{chegada[1]:.3f} F{self.feed:.0f}")
+            for indice in linha:
+                if not self.ativo():
+                    return processados
+                alvo = coords[indice]
+                distancia = (alvo[0] - partida[0]) * direcao[0] + (alvo[1] - partida[1]) * direcao[1]
+                t_cruzamento = self._aguardar_cruzamento(partida, direcao, distancia, t_inicio)
+                if t_cruzamento is None:
+                    self.log(f"Alvo {indice + 1} não cruzado (X={alvo[0]:.2f} Y={alvo[1]:.2f})")
+                    continue
+                t_inicio = t_cruzamento
+                frame, inicio_exposicao = self.grabber.frame_proximo(t_cruzamento - self.exposicao_s / 2)
+                if frame is None:
+                    self.log(f"Sem frame para o alvo {indice + 1}")
+                    continue
+                instante = inicio_exposicao + self.exposicao_s / 2
+                self.estado.aguardar_status(instante)
+                posicao = self.estado.posicao_em(instante) or alvo
+                ao_capturar(indice, frame, posicao[0], posicao[1], instante)
+                processados += 1
+            if self.aguardar_parada() is None:
+                break
+        return processados
+
+    def _aguardar_cruzamento(self, partida, direcao, distancia, apos, folga=0.5):
+        """
+        Espera a cabeça passar pela distância dada ao longo da linha e retorna
+        o instante interpolado do cruzamento, ou None se a máquina parou antes.
+        """
+        anterior = None
+        estado = self.estado
+        while self.ativo():
+            with estado.cond:
+                parado = estado.parado.is_set()
+                if anterior is None:
+                    # Parte do último relatório anterior a `apos`, para interpolar
+                    historico = [h for h in estado.historico if h[0] <= apos][-1:]
+                    historico += [h for h in estado.historico if h[0] > apos]
+                else:
+                    historico = [h for h in estado.historico if h[0] > apos]
+            for t, x, y in historico:
+                apos = t
+                percorrido = (x - partida[0]) * direcao[0] + (y - partida[1]) * direcao[1]
+                # Relatórios têm resolução de 0,001 mm
+                if percorrido >= distancia - 1e-3:
+                    if anterior is None or percorrido == anterior[1]:
+                        return t
+                    f = (distancia - anterior[1]) / (percorrido - anterior[1])
+                    return anterior[0] + f * (t - anterior[0])
+                anterior = (t, percorrido)
+            if parado and not historico:
+                return None
+            estado.aguardar_status(apos, timeout=folga)
+        return None
@@ -0,0 +1,201 @@
+"""
+Execução da captura sem interface gráfica (agendada, por SSH).
+
+Usa as mesmas rotinas de functions.py que a interface Tk, com um App mínimo e
+a InterfaceTerminal no lugar da PonteInterface: log, status e progresso vão
+para o terminal e a pré-visualização é descartada. O functions (OpenCV e
+NumPy) só é importado depois da leitura dos argumentos, e tkinter/matplotlib
+só se a visualização da grade for pedida:
+
+    python captura_terminal.py plantas --room "Room B"
+    python captura_terminal.py adensada --forcar-homing
+    python captura_terminal.py retomar "Fotos Adensadas/20250101_120000"
+    python captura_terminal.py grade adensada --frontal 0.7 --lateral 0.4
+    python captura_terminal.py grade plantas --room "Room A" --raio 80
+
+Ctrl+C cancela a execução como o botão Cancelar (código de saída 130); uma
+execução que termina por erro sai com 1.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+
+
+class InterfaceTerminal:
+    """
+    Mesmos métodos da PonteInterface, escrevendo no terminal. Pode ser
+    chamada de qualquer thread.
+
+    intervalo_progresso: segundos mínimos entre duas linhas de progresso
+    """
+
+    def __init__(self, intervalo_progresso=2.0, saida=None):
+        self.saida = saida or sys.stdout
+        self.intervalo_progresso = intervalo_progresso
+        self.lock = threading.Lock()
+        self._proximo_progresso = 0.0
+
+    def _escrever(self, texto):
+        with self.lock:
+            self.saida.write(texto + "\n")
+            self.saida.flush()
+
+    def log(self, mensagem):
+        self._escrever(mensagem)
+
+    def status(self, texto):
+        # O GRBL só avisa quando o estado muda: todas as mudanças são escritas
+        self._escrever(f"Status: {texto}")
+
+    def progresso(self, percentual, texto):
+        agora = time.monotonic()
+        if agora < self._proximo_progresso and percentual < 100:
+            return
+        self._proximo_progresso = agora + self.intervalo_progresso
+        self._escrever(f"Progresso: {texto}")
+
+    def imagem(self, frame, legenda):
+        pass
+
+    def chamar(self, funcao, *args):
+        """Sem thread de interface: executa na hora."""
+        funcao(*args)
+
+
+class AppTerminal:
+    """
+    O que as rotinas de captura usam do App, sem widgets.
+
+    data: cfg.json carregado
+    sala: Room das plantas (e dos ajustes travados da câmera)
+    forcar_homing: faz $H mesmo com a máquina referenciada
+    """
+
+    def __init__(self, data, sala, forcar_homing=False, ui=None):
+        self.ui = ui or InterfaceTerminal()
+        self.running = False
+        self.grbl = None
+        self.cam = None
+        self.room = sala
+        self.force_home_requested = forcar_homing
+        plantas = data.get(sala, [])
+        self.ID_PLANT = [planta["id"] for planta in plantas]
+        self.POS_X_PLANT = [planta["X"] for planta in plantas]
+        self.POS_Y_PLANT = [planta["Y"] for planta in plantas]
+
+    def fechar(self):
+        """Fecha a câmera e a porta do GRBL (na interface ficam abertas entre execuções)."""
+        if getattr(self, "camera_service", None):
+            self.camera_service.fechar()
+        if getattr(self, "conexao", None):
+            self.conexao.fechar()
+
+
+def executar(app, alvo):
+    """
+    Executa alvo em uma thread de trabalho, como a interface, e espera o fim.
+    Retorna 130 se for interrompido com Ctrl+C, 1 se a execução falhou (erro
+    de conexão, câmera, GRBL, gravação ou exceção inesperada) e 0 se concluiu.
+    """
+    import functions
+
+    fim = threading.Event()
+
+    def trabalhar():
+        try:
+            alvo()
+        except Exception:
+            app.failed = True
+            app.ui.log("Erro inesperado na execução:\n" + traceback.format_exc())
+            # Para a máquina e grava a fila, como nos erros tratados
+            functions.finalize(app, falha=True)
+        finally:
+            fim.set()
+
+    app.running = True
+    app.failed = False
+    threading.Thread(target=trabalhar, daemon=True).start()
+    try:
+        # Espera com timeout: o Ctrl+C só chega à thread principal entre as esperas
+        while not fim.wait(0.2):
+            pass
+    except KeyboardInterrupt:
+        functions.cancel(app)
+        fim.wait()
+        return 130
+    return 1 if app.failed else 0
+
+
+def gerar_grade(args, data):
+    import functions
+    from arquivo_rota import ARQUIVO_ROTA, salvar_rota
+
+    try:
+        if args.tipo == "adensada":
+            rota, campo, regioes, descricao = functions.plan_dense_grid(data, args.frontal, args.lateral)
+        else:
+            rota, campo, regioes, descricao = functions.plan_plant_grid(data, args.room, args.raio)
+    except ValueError as e:
+        print(f"Cobertura: {e}", file=sys.stderr)
+        return 1
+    print(descricao)
+    if args.mostrar:
+        functions.preview_grid(list(zip(rota["X"], rota["Y"])), descricao.splitlines()[0],
+                               campo, regioes)
+    caminho = args.saida or data.get("route_file", ARQUIVO_ROTA)
+    salvar_rota(rota, caminho)
+    print(f"{len(rota)} pontos salvos em {caminho}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Captura de imagens sem interface gráfica")
+    sub = parser.add_subparsers(dest="operacao", required=True)
+    plantas = sub.add_parser("plantas", help="uma imagem de cada planta do Room, na rota otimizada")
+    adensada = sub.add_parser("adensada", help="captura adensada pelo arquivo de rota do cfg.json")
+    retomar = sub.add_parser("retomar", help="continua uma sessão adensada interrompida")
+    retomar.add_argument("pasta")
+    for comando in (plantas, adensada, retomar):
+        comando.add_argument("--room", default="Room B")
+        comando.add_argument("--forcar-homing", action="store_true")
+    grade = sub.add_parser("grade", help="gera e salva o arquivo de rota sem confirmação")
+    grade.add_argument("tipo", choices=["adensada", "plantas"])
+    grade.add_argument("--frontal", type=float, help="sobreposição frontal (0 a 1)")
+    grade.add_argument("--lateral", type=float, help="sobreposição lateral (0 a 1)")
+    grade.add_argument("--raio", type=float, help="raio em volta de cada vaso (mm)")
+    grade.add_argument("--room", default="Room B")
+    grade.add_argument("--saida", help="arquivo de rota (padrão: route_file do cfg.json)")
+    grade.add_argument("--mostrar", action="store_true", help="mostra a grade (matplotlib)")
+    args = parser.parse_args(argv)
+
+    with open("cfg.json", "r") as f:
+        data = json.load(f)
+    if args.operacao == "grade":
+        return gerar_grade(args, data)
+    if args.room not in data:
+        parser.error(f"{args.room} não encontrado no cfg.json")
+    retomada = args.pasta if args.operacao == "retomar" else None
+    if retomada is not None and not os.path.isdir(retomada):
+        parser.error(f"Pasta {retomada} não encontrada")
+
+    import functions
+
+    app = AppTerminal(data, args.room, args.forcar_homing)
+    try:
+        if args.operacao == "plantas":
+            indices = functions.prepare_plant_session(app)
+            return executar(app, lambda: functions.run_process(app, indices))
+        if not functions.prepare_dense_session(app, retomada):
+            return 1
+        return executar(app, lambda: functions.run_dense_process(app, retomada is not None))
+    finally:
+        app.fechar()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,562 @@
+"""
+Comunicação com o GRBL usando o protocolo de contagem de caracteres.
+
+O GRBL possui um buffer de recepção serial de 128 bytes. Em vez de enviar uma
+linha e esperar o "ok" antes da próxima, o streamer contabiliza os bytes ainda
+não confirmados e envia novas linhas enquanto couberem no buffer. Cada
+"ok"/"error" recebido é associado ao comando mais antigo ainda em trânsito.
+
+Com um LeitorGrbl ativo, uma única thread é dona da leitura da porta: ela envia
+"?" periodicamente, atualiza o EstadoMaquina com os relatórios de status e
+entrega as confirmações ao streamer.
+
+A ConexaoGrbl mantém a porta, o streamer e a thread de leitura vivos entre
+execuções: a abertura espera o banner do GRBL em vez de pausas fixas e o
+homing só é repetido quando a máquina perdeu a referência.
+"""
+
+import bisect
+import collections
+import re
+import threading
+import time
+
+RX_BUFFER_SIZE = 128
+
+# Escrita de configuração ($N=valor) grava na EEPROM e não deve ser enviada em
+# fluxo: o GRBL desabilita interrupções durante a gravação.
+_RE_ESCRITA_CONFIG = re.compile(r"^\$\d+\s*=")
+# Comandos que colocam a máquina em movimento (homing, jog ou palavras de eixo)
+_RE_MOVIMENTO = re.compile(r"^\$(H|J=)|[XYZ]\s*[-+.\d]", re.IGNORECASE)
+_RE_SEM_MOVIMENTO = re.compile(r"^G(10|92|28\.1|30\.1)\b", re.IGNORECASE)
+_RE_EIXO = re.compile(r"([XYZ])\s*([-+]?\d*\.?\d+)", re.IGNORECASE)
+
+ESTADOS_EM_MOVIMENTO = ("Run", "Jog", "Home")
+
+
+class GrblError(Exception):
+    """Erro reportado pelo GRBL (error:N ou ALARM:N) durante o envio."""
+
+    def __init__(self, comando, resposta):
+        super().__init__(f"{comando} -> {resposta}" if comando else resposta)
+        self.comando = comando
+        self.resposta = resposta
+
+
+class ComandoGrbl:
+    """Linha enviada ao GRBL e as respostas associadas a ela."""
+
+    __slots__ = ("texto", "tamanho", "linhas", "resposta", "movimento")
+
+    def __init__(self, texto):
+        self.texto = texto
+        self.tamanho = len(texto) + 1  # inclui o '\n'
+        self.linhas = []
+        self.resposta = None
+        self.movimento = False
+
+    @property
+    def concluido(self):
+        return self.resposta is not None
+
+    @property
+    def ok(self):
+        return self.resposta == "ok"
+
+
+class EstadoMaquina:
+    """
+    Último estado reportado pelo GRBL (<Idle|MPos:...|FS:...>), compartilhado
+    entre a thread de leitura e a rotina de captura.
+
+    O evento de "movimento concluído" só dispara com um relatório Idle recebido
+    depois do "ok" do último comando de movimento e depois de a máquina ter
+    sido vista em movimento (ou já estar no alvo), evitando aceitar um Idle
+    antigo de antes do início do deslocamento.
+    """
+
+    def __init__(self, ao_mudar=None, tolerancia_mm=0.05, tamanho_historico=512):
+        self.ao_mudar = ao_mudar
+        self.tolerancia_mm = tolerancia_mm
+        self.cond = threading.Condition()
+        self.linha = None
+        self.estado = None
+        self.mpos = None
+        self.wco = (0.0, 0.0, 0.0)
+        self.feed = 0.0
+        self.t_status = None
+        self.t_parada = None
+        self.alvo = {}
+        # (instante, X, Y) de cada relatório, para interpolar a posição
+        self.historico = collections.deque(maxlen=tamanho_historico)
+        self._pendentes = 0
+        self._viu_movimento = False
+        self._idles_apos_ok = 0
+        self.parado = threading.Event()
+        self.parado.set()
+
+    @property
+    def wpos(self):
+        if self.mpos is None:
+            return None
+        return tuple(m - o for m, o in zip(self.mpos, self.wco))
+
+    def marcar_movimento(self, texto):
+        """Registra que um comando de movimento foi enviado (antes do write)."""
+        with self.cond:
+            if not _RE_SEM_MOVIMENTO.match(texto):
+                for eixo, valor in _RE_EIXO.findall(texto):
+                    self.alvo[eixo.upper()] = float(valor)
+            if texto.upper().startswith("$H"):
+                self.alvo = {}
+            self._pendentes += 1
+            self._viu_movimento = False
+            self._idles_apos_ok = 0
+            # A parada anterior não vale para o novo movimento
+            self.t_parada = None
+            self.parado.clear()
+
+    def movimento_confirmado(self):
+        """Chamado quando o "ok" de um comando de movimento é recebido."""
+        with self.cond:
+            self._pendentes = max(0, self._pendentes - 1)
+
+    def atualizar(self, linha):
+        """Interpreta um relatório de status e atualiza o estado."""
+        campos = linha.strip("<>").split("|")
+        agora = time.monotonic()
+        with self.cond:
+            anterior = self.estado
+            self.linha = linha
+            self.estado = campos[0].split(":")[0]
+            self.t_status = agora
+            for campo in campos[1:]:
+                nome, _, valor = campo.partition(":")
+                try:
+                    numeros = tuple(float(v) for v in valor.split(","))
+                except ValueError:
+                    continue
+                if nome == "MPos":
+                    self.mpos = numeros
+                elif nome == "WPos":
+                    self.mpos = tuple(w + o for w, o in zip(numeros, self.wco))
+                elif nome == "WCO":
+                    self.wco = numeros
+                elif nome in ("FS", "F"):
+                    self.feed = numeros[0]
+            posicao = self.wpos
+            if posicao is not None:
+                self.historico.append((agora, posicao[0], posicao[1]))
+
+            if self.estado in ESTADOS_EM_MOVIMENTO:
+                self._viu_movimento = True
+            elif self.estado == "Idle" and self._pendentes == 0 and not self.parado.is_set():
+                self._idles_apos_ok += 1
+                if self._viu_movimento or self._no_alvo() or self._idles_apos_ok >= 3:
+                    self.t_parada = agora
+                    self.parado.set()
+            elif self.estado == "Alarm":
+                self.parado.set()
+            self.cond.notify_all()
+        if self.ao_mudar and self.estado != anterior:
+            self.ao_mudar(linha)
+
+    def _no_alvo(self):
+        posicao = self.wpos
+        if not self.alvo or posicao is None:
+            return False
+        indices = {"X": 0, "Y": 1, "Z": 2}
+        return all(abs(posicao[indices[eixo]] - valor) <= self.tolerancia_mm
+                   for eixo, valor in self.alvo.items() if indices[eixo] < len(posicao))
+
+    def posicao_em(self, t):
+        """
+        Posição (X, Y) interpolada no instante t (time.monotonic) entre os dois
+        relatórios vizinhos. Retorna None se t ainda não foi coberto pelo
+        histórico (sem relatório posterior) ou já saiu dele.
+        """
+        with self.cond:
+            historico = list(self.historico)
+        if not historico or t > historico[-1][0] or t < historico[0][0]:
+            return None
+        i = max(bisect.bisect_left(historico, (t,)), 1)
+        if len(historico) == 1:
+            return historico[0][1], historico[0][2]
+        (t0, x0, y0), (t1, x1, y1) = historico[i - 1], historico[i]
+        f = (t - t0) / (t1 - t0) if t1 > t0 else 1.0
+        return x0 + f * (x1 - x0), y0 + f * (y1 - y0)
+
+    def aguardar_status(self, apos, timeout=1.0):
+        """Espera um relatório de status recebido depois do instante `apos`."""
+        limite = time.monotonic() + timeout
+        with self.cond:
+            while self.t_status is None or self.t_status <= apos:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return False
+                self.cond.wait(restante)
+        return True
+
+    def reiniciar(self):
+        """
+        Esquece movimentos pendentes (após soft reset ou fim de execução).
+        Quem espera a parada é liberado sem instante de parada: o movimento
+        foi interrompido, não concluído.
+        """
+        with self.cond:
+            self._pendentes = 0
+            self._viu_movimento = False
+            self._idles_apos_ok = 0
+            self.alvo = {}
+            self.t_parada = None
+            self.parado.set()
+            self.cond.notify_all()
+
+    def aguardar_parada(self, ativo=None, timeout=None):
+        """
+        Bloqueia até o fim do movimento corrente.
+        Retorna o instante (time.monotonic) do relatório Idle, ou None se
+        cancelado/expirado ou interrompido por reset. Levanta GrblError se a
+        máquina entrou em alarme.
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        while not self.parado.wait(0.05):
+            if ativo is not None and not ativo():
+                return None
+            if limite is not None and time.monotonic() > limite:
+                return None
+        if self.estado == "Alarm":
+            raise GrblError(None, self.linha)
+        return self.t_parada
+
+
+class GrblStreamer:
+    """
+    Envia comandos ao GRBL mantendo vários em trânsito (contagem de caracteres).
+
+    porta: objeto serial já aberto (readline/write)
+    rx_buffer: tamanho do buffer de recepção do controlador (bytes)
+    log: função chamada com mensagens para o usuário
+    ativo: função que retorna False quando a execução foi cancelada
+    estado: EstadoMaquina notificado dos movimentos e relatórios de status
+    """
+
+    def __init__(self, porta, rx_buffer=RX_BUFFER_SIZE, log=None, ativo=None, estado=None):
+        self.porta = porta
+        self.rx_buffer = rx_buffer
+        self.log = log or (lambda mensagem: None)
+        self.ativo = ativo or (lambda: True)
+        self.estado = estado
+        self.leitor = None
+        self.lock_escrita = threading.Lock()
+        self.cond = threading.Condition()
+        self.em_transito = collections.deque()
+        self.bytes_em_transito = 0
+        self.erro = None
+        self.alarme = None
+
+    def enviar(self, cmd):
+        """
+        Enfileira um comando no GRBL sem esperar pelo "ok".
+        Bloqueia apenas enquanto o buffer de recepção estiver cheio. Com a
+        execução cancelada (ativo() False) o comando não é enviado.
+        """
+        if self.erro:
+            raise self.erro
+        comando = ComandoGrbl(cmd.strip())
+        if comando.tamanho > self.rx_buffer:
+            raise ValueError(f"Comando maior que o buffer do GRBL: {comando.texto}")
+
+        sincrono = _RE_ESCRITA_CONFIG.match(comando.texto) is not None
+        if sincrono:
+            self.aguardar()
+        while self.em_transito and self.bytes_em_transito + comando.tamanho > self.rx_buffer:
+            if not self.ativo():
+                return comando
+            self._receber()
+            if self.erro:
+                self.aguardar()
+
+        movimento = _RE_MOVIMENTO.search(comando.texto) is not None
+        with self.lock_escrita:
+            # Verificado junto com a escrita: depois do cancelamento (e do
+            # feed hold/reset que o segue) nenhum comando chega ao GRBL
+            if not self.ativo():
+                return comando
+            if movimento and self.estado is not None:
+                self.estado.marcar_movimento(comando.texto)
+            with self.cond:
+                comando.movimento = movimento
+                self.em_transito.append(comando)
+                self.bytes_em_transito += comando.tamanho
+            self.porta.write((comando.texto + "\n").encode())
+        if sincrono:
+            self.aguardar()
+        return comando
+
+    def enviar_lote(self, cmds):
+        """Envia uma sequência de comandos em fluxo e espera todas as confirmações."""
+        comandos = [self.enviar(cmd) for cmd in cmds]
+        self.aguardar()
+        return comandos
+
+    def aguardar(self):
+        """
+        Espera até que todos os comandos em trânsito sejam confirmados.
+        Levanta GrblError se algum deles retornou erro.
+        """
+        while self.em_transito and self.ativo():
+            self._receber()
+        if self.erro:
+            raise self.erro
+
+    def descartar(self):
+        """Esquece comandos pendentes e erros (após reset ou reconexão)."""
+        self.em_transito.clear()
+        self.bytes_em_transito = 0
+        self.erro = None
+        self.alarme = None
+
+    def escrever(self, dados):
+        with self.lock_escrita:
+            self.porta.write(dados)
+
+    def _receber(self):
+        # Com a thread de leitura ativa, apenas espera ela entregar respostas
+        if self.leitor is not None and self.leitor.is_alive():
+            with self.cond:
+                if self.em_transito and not self.erro:
+                    self.cond.wait(0.1)
+            return
+        linha = self.porta.readline()
+        if linha:
+            self.processar_linha(linha.decode(errors="replace").strip())
+
+    def processar_linha(self, linha):
+        """
+        Trata uma linha recebida do GRBL.
+        Retorna o ComandoGrbl concluído quando a linha é "ok" ou "error".
+        """
+        if not linha:
+            return None
+        if linha.startswith("<"):
+            if self.estado is not None:
+                self.estado.atualizar(linha)
+            return None
+        if linha == "ok" or linha.startswith("error"):
+            with self.cond:
+                if not self.em_transito:
+                    comando = None
+                else:
+                    comando = self.em_transito.popleft()
+                    self.bytes_em_transito -= comando.tamanho
+                    comando.resposta = linha
+                    if linha != "ok" and self.erro is None:
+                        self.erro = GrblError(comando.texto, linha)
+                self.cond.notify_all()
+            if comando is None:
+                self.log("GRBL (resposta sem comando): " + linha)
+                return None
+            if comando.movimento and self.estado is not None:
+                self.estado.movimento_confirmado()
+            self.log(f"GRBL: {comando.texto} -> {linha}")
+            return comando
+        if linha.startswith("ALARM"):
+            with self.cond:
+                self.alarme = linha
+                if self.erro is None:
+                    self.erro = GrblError(None, linha)
+                self.cond.notify_all()
+            self.log("GRBL: " + linha)
+            return None
+        # Saída de comandos ($, $#, $G...) pertence ao comando mais antigo;
+        # mensagens soltas (banner, [MSG:...]) vão apenas para o log.
+        if self.em_transito and not linha.startswith("Grbl"):
+            self.em_transito[0].linhas.append(linha)
+        self.log("GRBL: " + linha)
+        return None
+
+
+class LeitorGrbl(threading.Thread):
+    """
+    Thread única dona da leitura da porta serial.
+
+    Envia "?" na frequência configurada, repassa cada linha ao streamer
+    (confirmações e saída de comandos) e ao EstadoMaquina (relatórios).
+    """
+
+    def __init__(self, streamer, frequencia_status=50.0):
+        super().__init__(daemon=True)
+        self.streamer = streamer
+        self.intervalo = 1.0 / frequencia_status if frequencia_status > 0 else None
+        self._parar = threading.Event()
+
+    def run(self):
+        porta = self.streamer.porta
+        # Timeout curto para que o "?" seja enviado mesmo sem tráfego
+        porta.timeout = min(self.intervalo or 0.05, 0.05)
+        proximo = time.monotonic()
+        while not self._parar.is_set():
+            try:
+                agora = time.monotonic()
+                if self.intervalo and agora >= proximo:
+                    self.streamer.escrever(b"?")
+                    proximo = max(proximo + self.intervalo, agora)
+                linha = porta.readline()
+            except Exception:
+                # Porta fechada ou desconectada: encerra a leitura
+                break
+            if linha:
+                self.streamer.processar_linha(linha.decode(errors="replace").strip())
+        with self.streamer.cond:
+            self.streamer.cond.notify_all()
+
+    def parar(self):
+        self._parar.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout=1.0)
+
+
+def iniciar_leitor(streamer, frequencia_status=50.0):
+    """Cria o EstadoMaquina (se preciso) e inicia a thread de leitura."""
+    if streamer.estado is None:
+        streamer.estado = EstadoMaquina()
+    streamer.leitor = LeitorGrbl(streamer, frequencia_status)
+    streamer.leitor.start()
+    return streamer.leitor
+
+
+class ConexaoGrbl:
+    """
+    Porta serial do GRBL mantida aberta enquanto o programa estiver rodando.
+
+    Na abertura espera o banner "Grbl x.x" enviado a cada reinício (o Arduino
+    reinicia ao abrir a porta); sem banner, um soft reset (Ctrl-X) o provoca.
+    A máquina é considerada referenciada depois de um $H bem-sucedido até a
+    porta ser reaberta ou o GRBL reportar um alarme.
+
+    porta, baudrate: parâmetros da serial
+    frequencia_status: frequência do "?" da thread de leitura
+    espera_banner: tempo máximo (s) por tentativa de leitura do banner
+    """
+
+    def __init__(self, porta, baudrate, frequencia_status=50.0, espera_banner=2.5, log=None):
+        self.nome = porta
+        self.baudrate = baudrate
+        self.frequencia_status = frequencia_status
+        self.espera_banner = espera_banner
+        self.log = log or (lambda mensagem: None)
+        self.porta = None
+        self.streamer = None
+        self.estado = None
+        self.banner = None
+        self.referenciada = False
+        self.configuracoes = None
+
+    def aberta(self):
+        return (self.porta is not None and self.porta.is_open and self.streamer is not None
+                and self.streamer.leitor is not None and self.streamer.leitor.is_alive())
+
+    def conectar(self, log=None, ativo=None, ao_mudar=None):
+        """
+        Retorna o streamer pronto para uma nova execução, reaproveitando a
+        porta aberta ou abrindo-a. log/ativo/ao_mudar passam a valer para ela.
+        """
+        if log:
+            self.log = log
+        if not self.aberta():
+            self.fechar()
+            self._abrir()
+        else:
+            self.log(f"Conexão com o GRBL reaproveitada ({self.nome})")
+        if self.streamer.alarme is not None or self.estado.estado == "Alarm":
+            self.referenciada = False
+        self.streamer.descartar()
+        self.estado.reiniciar()
+        self.streamer.log = self.log
+        self.streamer.ativo = ativo or (lambda: True)
+        self.estado.ao_mudar = ao_mudar
+        return self.streamer
+
+    def _abrir(self):
+        import serial
+        inicio = time.monotonic()
+        self.porta = serial.Serial(self.nome, self.baudrate, timeout=0.05)
+        self.banner = self._aguardar_banner()
+        if self.banner is None:
+            # Sem reinício automático ao abrir a porta: provoca um soft reset
+            self.porta.write(b"\x18")
+            self.banner = self._aguardar_banner()
+        if self.banner is None:
+            self.porta.close()
+            self.porta = None
+            raise TimeoutError(f"O GRBL não respondeu em {self.nome}")
+        self.referenciada = False
+        self.configuracoes = None
+        self.estado = EstadoMaquina()
+        self.streamer = GrblStreamer(self.porta, log=self.log, estado=self.estado)
+        iniciar_leitor(self.streamer, self.frequencia_status)
+        self.log(f"{self.banner} em {self.nome} ({time.monotonic() - inicio:.2f} s)")
+
+    def _aguardar_banner(self):
+        limite = time.monotonic() + self.espera_banner
+        while time.monotonic() < limite:
+            linha = self.porta.readline().decode(errors="replace").strip()
+            if linha.startswith("Grbl"):
+                return linha
+            if linha:
+                self.log("GRBL: " + linha)
+        return None
+
+    def precisa_referenciar(self):
+        """True se não houve $H nesta conexão ou se houve alarme depois dele."""
+        return (not self.referenciada or self.streamer.alarme is not None
+                or self.estado.estado == "Alarm")
+
+    def liberar(self):
+        """
+        Encerra a execução corrente mantendo a porta aberta. Um movimento em
+        andamento é parado com feed hold e soft reset, o que preserva a posição.
+        O `ativo` da execução continua valendo até o próximo conectar(): uma
+        rotina de captura ainda em andamento não volta a enviar comandos.
+        """
+        if not self.aberta():
+            self.fechar()
+            return
+        if self.streamer.em_transito or not self.estado.parado.is_set() \
+                or self.estado.estado in ESTADOS_EM_MOVIMENTO:
+            self.interromper()
+        if self.streamer.alarme is not None or self.estado.estado == "Alarm":
+            self.referenciada = False
+
+    def interromper(self, timeout=2.0):
+        """Feed hold, espera a desaceleração e soft reset."""
+        self.streamer.escrever(b"!")
+        limite = time.monotonic() + timeout
+        with self.estado.cond:
+            # <Hold:0|...> = desaceleração concluída (o simulador reporta só <Hold|...>)
+            while not (self.estado.estado == "Idle"
+                       or (self.estado.linha or "").startswith(("<Hold:0", "<Hold|"))):
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                self.estado.cond.wait(restante)
+        agora = time.monotonic()
+        self.streamer.escrever(b"\x18")
+        self.estado.aguardar_status(agora + 0.05, timeout)
+        self.streamer.descartar()
+        self.estado.reiniciar()
+        if self.estado.estado != "Idle":
+            self.referenciada = False
+
+    def fechar(self):
+        if self.streamer is not None and self.streamer.leitor is not None:
+            self.streamer.leitor.parar()
+        if self.porta is not None:
+            try:
+                self.porta.close()
+            except Exception:
+                pass
+        self.porta = None
+        self.streamer = None
+        self.estado = None
@@ -1,11 +1,11 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext, ttk
-from PIL import Image
-from PIL.ExifTags import TAGS, GPSTAGS
 import piexif
-import exifread
 import os
-import re
+import threading
+from datetime import datetime
+
+from indice_metadados import CacheMetadados, coordenadas_exif, indexar_sessao
 
 class VisualizadorMetadadosLimpo:
     def __init__(self, root):
@@ -13,6 +13,12 @@ class VisualizadorMetadadosLimpo:
         self.root.title("🔍 METADADOS COMPLETOS - FORMATO LIMPO")
         self.root.geometry("1400x900")
         self.arquivo_selecionado = None
+        self.cache = CacheMetadados()
+        self.grupos = {}  # nó do grupo na árvore -> linhas ainda não inseridas
+        self.pasta_atual = None
+        self.imagens_pasta = []
+        self.indexacao = None  # (feitos, total) da indexação em andamento
+        self.resultado_indexacao = None  # entregue pela thread de indexação
         self.setup_ui()
     
     def setup_ui(self):
@@ -22,6 +28,10 @@ class VisualizadorMetadadosLimpo:
         
         ttk.Button(header_frame, text="📁 ABRIR IMAGEM", 
                   command=self.selecionar_imagem, width=18).pack(side=tk.LEFT)
+        ttk.Button(header_frame, text="◀", width=3,
+                  command=lambda: self.navegar(-1)).pack(side=tk.LEFT, padx=(10,0))
+        ttk.Button(header_frame, text="▶", width=3,
+                  command=lambda: self.navegar(1)).pack(side=tk.LEFT)
         
         self.info_label = ttk.Label(header_frame, text="Selecione uma imagem...", 
                                    font=('Segoe UI', 11, 'bold'))
@@ -30,6 +40,12 @@ class VisualizadorMetadadosLimpo:
         ttk.Button(header_frame, text="🔄 ANALISAR", 
                   command=self.analisar_tudo).pack(side=tk.RIGHT)
         
+        self.botao_indexar = ttk.Button(header_frame, text="📂 INDEXAR PASTA", 
+                                        command=self.indexar_pasta, width=18)
+        self.botao_indexar.pack(side=tk.RIGHT, padx=(0,10))
+        self.progresso_indice = ttk.Progressbar(header_frame, length=200, mode='determinate')
+        self.progresso_indice.pack(side=tk.RIGHT, padx=(0,10))
+        
         # Notebook com abas organizadas
         notebook = ttk.Notebook(self.root)
         notebook.pack(fill=tk.BOTH, expand=True, padx=15, pady=(0,15))
@@ -40,7 +56,10 @@ class VisualizadorMetadadosLimpo:
         
         # Treeview para tabela limpa
         columns = ('GRUPO', 'TAG', 'VALOR')
-        self.tree = ttk.Treeview(main_frame, columns=columns, show='headings', height=30)
+        # Grupos são nós recolhidos; as tags só são inseridas ao expandir
+        self.tree = ttk.Treeview(main_frame, columns=columns, show='tree headings', height=30)
+        self.tree.column('#0', width=30, stretch=False)
+        self.tree.bind('<<TreeviewOpen>>', self.expandir_grupo)
         
         self.tree.heading('GRUPO', text='GRUPO')
         self.tree.heading('TAG', text='TAG')
@@ -63,6 +82,9 @@ class VisualizadorMetadadosLimpo:
         coords_frame = ttk.Frame(notebook)
         notebook.add(coords_frame, text="📍 COORDENADAS CNC")
         self.setup_coordenadas(coords_frame)
+        
+        self.root.bind('<Left>', lambda e: self.navegar(-1))
+        self.root.bind('<Right>', lambda e: self.navegar(1))
     
     def setup_coordenadas(self, parent):
         frame = ttk.LabelFrame(parent, text="X-LAT / Y-LONG", padding=20)
@@ -83,22 +105,71 @@ class VisualizadorMetadadosLimpo:
         ttk.Button(btn_frame, text="📋 COPIAR", command=self.copiar_coords, width=20).pack(side=tk.LEFT, padx=(10,0))
     
     def limpar_tabela(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.tree.delete(*self.tree.get_children())
+        self.grupos.clear()
     
-    def adicionar_linha(self, grupo, tag, valor):
-        self.tree.insert('', 'end', values=(grupo, tag, valor))
+    def adicionar_linha(self, grupo, tag, valor, pai=''):
+        self.tree.insert(pai, 'end', values=(grupo, tag, valor))
+    
+    def adicionar_grupo(self, grupo, linhas, aberto=False, total=None):
+        """
+        Nó do grupo com a contagem de tags. As linhas (função que gera pares
+        tag/valor) só são montadas quando o grupo é expandido.
+        """
+        linhas = list(linhas) if aberto else linhas
+        total = len(linhas) if aberto else total
+        no = self.tree.insert('', 'end', values=(grupo, f"{total} tags" if total is not None else "", ""),
+                              open=aberto)
+        if aberto:
+            for tag, valor in linhas:
+                self.adicionar_linha(grupo, tag, valor, no)
+        else:
+            self.grupos[no] = (grupo, linhas)
+            self.tree.insert(no, 'end', values=("", "...", ""))  # mostra o expansor
+        return no
+    
+    def expandir_grupo(self, event=None):
+        no = self.tree.focus()
+        if no not in self.grupos:
+            return
+        grupo, linhas = self.grupos.pop(no)
+        self.tree.delete(*self.tree.get_children(no))
+        quantidade = 0
+        for tag, valor in linhas():
+            self.adicionar_linha(grupo, tag, valor, no)
+            quantidade += 1
+        self.tree.set(no, 'TAG', f"{quantidade} tags")
     
     def selecionar_imagem(self):
         arquivo = filedialog.askopenfilename(
             filetypes=[("JPG", "*.jpg *.jpeg"), ("Todas", "*.*")]
         )
         if arquivo:
-            self.arquivo_selecionado = arquivo
-            nome = os.path.basename(arquivo)
-            tamanho = os.path.getsize(arquivo)
-            self.info_label.config(text=f"✅ {nome} | {tamanho:,} bytes")
-            self.analisar_tudo()
+            self.abrir_imagem(arquivo)
+    
+    def abrir_imagem(self, arquivo):
+        self.arquivo_selecionado = arquivo
+        nome = os.path.basename(arquivo)
+        tamanho = os.path.getsize(arquivo)
+        self.info_label.config(text=f"✅ {nome} | {tamanho:,} bytes")
+        self.analisar_tudo()
+    
+    def navegar(self, passo):
+        """Abre a imagem anterior/seguinte da mesma pasta."""
+        if not self.arquivo_selecionado:
+            return
+        pasta = os.path.dirname(self.arquivo_selecionado)
+        if pasta != self.pasta_atual:
+            self.pasta_atual = pasta
+            self.imagens_pasta = [os.path.join(pasta, nome) for nome in sorted(os.listdir(pasta))
+                                  if nome.lower().endswith(('.jpg', '.jpeg'))]
+        atual = os.path.normpath(self.arquivo_selecionado)
+        caminhos = [os.path.normpath(c) for c in self.imagens_pasta]
+        if atual not in caminhos:
+            return
+        indice = caminhos.index(atual) + passo
+        if 0 <= indice < len(self.imagens_pasta):
+            self.abrir_imagem(self.imagens_pasta[indice])
     
     def analisar_tudo(self):
         if not self.arquivo_selecionado:
@@ -106,117 +177,93 @@ class VisualizadorMetadadosLimpo:
         
         self.limpar_tabela()
         
-        # INFO BÁSICA
-        self.adicionar_info_basica()
-        
-        # PIL EXIF
-        self.extrair_pil_exif()
-        
-        # PIEXIF (MAIS IMPORTANTE)
-        self.extrair_piexif_completo()
+        # Uma única leitura do cabeçalho, reaproveitada por todas as seções
+        try:
+            metadados = self.cache.obter(self.arquivo_selecionado)
+        except OSError as e:
+            self.adicionar_linha("📁 ARQUIVO", "Erro", str(e))
+            return
         
-        # EXIFREAD corrigido
-        self.extrair_exifread()
+        # INFO BÁSICA
+        self.adicionar_info_basica(metadados)
         
         # Extrair coordenadas
-        self.extrair_coordenadas()
+        self.extrair_coordenadas(metadados)
+        
+        # EXIF por IFD, expandido sob demanda
+        self.extrair_piexif_completo(metadados)
     
-    def adicionar_info_basica(self):
-        try:
-            st = os.stat(self.arquivo_selecionado)
-            img = Image.open(self.arquivo_selecionado)
-            
-            self.adicionar_linha("📁 ARQUIVO", "Nome", os.path.basename(self.arquivo_selecionado))
-            self.adicionar_linha("📁 ARQUIVO", "Tamanho", f"{st.st_size:,} bytes")
-            self.adicionar_linha("📁 ARQUIVO", "Criado", datetime.fromtimestamp(st.st_ctime).strftime('%Y-%m-%d %H:%M:%S'))
-            self.adicionar_linha("📁 ARQUIVO", "Modificado", datetime.fromtimestamp(st.st_mtime).strftime('%Y-%m-%d %H:%M:%S'))
-            self.adicionar_linha("🖼️ IMAGEM", "Resolução", f"{img.size[0]}x{img.size[1]}")
-            self.adicionar_linha("🖼️ IMAGEM", "Modo", img.mode)
-            self.adicionar_linha("🖼️ IMAGEM", "Formato", img.format)
-        except:
-            pass
+    def adicionar_info_basica(self, metadados):
+        self.adicionar_grupo("📁 ARQUIVO", [
+            ("Nome", os.path.basename(metadados["caminho"])),
+            ("Tamanho", f"{metadados['tamanho']:,} bytes"),
+            ("Criado", datetime.fromtimestamp(metadados["criado"]).strftime('%Y-%m-%d %H:%M:%S')),
+            ("Modificado", datetime.fromtimestamp(metadados["modificado"]).strftime('%Y-%m-%d %H:%M:%S')),
+        ], aberto=True)
+        if metadados["largura"]:
+            modos = {1: "L", 3: "RGB", 4: "CMYK"}
+            self.adicionar_grupo("🖼️ IMAGEM", [
+                ("Resolução", f"{metadados['largura']}x{metadados['altura']}"),
+                ("Modo", modos.get(metadados["componentes"], str(metadados["componentes"]))),
+                ("Formato", "JPEG"),
+            ], aberto=True)
+        if metadados["erro"]:
+            self.adicionar_linha("EXIF", "Erro", metadados["erro"])
     
-    def extrair_pil_exif(self):
-        try:
-            img = Image.open(self.arquivo_selecionado)
-            exif = img.getexif()
-            if exif:
-                self.adicionar_linha("PIL EXIF", "Total Tags", str(len(exif)))
-                for tag_id, valor in exif.items():
-                    tag_nome = TAGS.get(tag_id, f"Tag_{tag_id}")
-                    valor_str = str(valor)
-                    self.adicionar_linha("PIL EXIF", tag_nome, valor_str)
-        except:
-            self.adicionar_linha("PIL EXIF", "Status", "Erro de leitura")
+    def extrair_piexif_completo(self, metadados):
+        exif_dict = metadados["exif"]
+        if not exif_dict:
+            self.adicionar_linha("EXIF", "Status", "Sem EXIF")
+            return
+        
+        for ifd_name, ifd_data in exif_dict.items():
+            if not ifd_data:
+                continue
+            if ifd_name == 'thumbnail':
+                self.adicionar_linha("EXIF thumbnail", "Tamanho", f"{len(ifd_data):,} bytes")
+                continue
+            self.adicionar_grupo(f"EXIF {ifd_name}",
+                                 lambda ifd_name=ifd_name, ifd_data=ifd_data: self.linhas_ifd(ifd_name, ifd_data),
+                                 total=len(ifd_data))
     
-    def extrair_piexif_completo(self):
-        try:
-            exif_dict = piexif.load(self.arquivo_selecionado)
+    @staticmethod
+    def linhas_ifd(ifd_name, ifd_data):
+        for tag_id, valor_raw in ifd_data.items():
+            tabela = "Image" if ifd_name in ("0th", "1st") else ifd_name
+            tag_info = piexif.TAGS.get(tabela, {}).get(tag_id, {}).get("name", f"0x{tag_id:04x}")
             
-            for ifd_name, ifd_data in exif_dict.items():
-                if ifd_data and ifd_name != 'thumbnail':
-                    grupo = f"PIEXIF {ifd_name}"
-                    self.adicionar_linha(grupo, "Total Tags", str(len(ifd_data)))
-                    
-                    for tag_id, valor_raw in ifd_data.items():
-                        try:
-                            tag_info = piexif.TAGS.get(ifd_name, {}).get(tag_id, f"0x{tag_id:04x}")
-                            
-                            # ✅ LIMPA O VALOR
-                            if isinstance(valor_raw, bytes):
-                                try:
-                                    valor = valor_raw.decode('utf-8').strip()
-                                except:
-                                    valor = f"b'{valor_raw[:50]}...'"
-                            elif isinstance(valor_raw, (tuple, list)):
-                                valor = str(valor_raw)
-                            else:
-                                valor = str(valor_raw)
-                            
-                            self.adicionar_linha(grupo, tag_info, valor)
-                        except:
-                            continue
-        except Exception as e:
-            self.adicionar_linha("PIEXIF", "Erro", str(e))
-    
-    def extrair_exifread(self):
-        # ✅ CORRIGIDO: remove stop_tagdict
-        try:
-            with open(self.arquivo_selecionado, 'rb') as f:
-                tags = exifread.process_file(f)  # Sem parâmetro problemático
-            if tags:
-                self.adicionar_linha("EXIFREAD", "Total Tags", str(len(tags)))
-                for tag_name in sorted(tags.keys()):
-                    valor = str(tags[tag_name])
-                    self.adicionar_linha("EXIFREAD", tag_name, valor)
-        except Exception as e:
-            self.adicionar_linha("EXIFREAD", "Erro", str(e))
-    
-    def extrair_coordenadas(self):
-        try:
-            exif_dict = piexif.load(self.arquivo_selecionado)
+            # ✅ LIMPA O VALOR
+            if isinstance(valor_raw, bytes):
+                if tag_id == piexif.ExifIFD.MakerNote and ifd_name == "Exif":
+                    valor = f"{len(valor_raw):,} bytes"
+                else:
+                    try:
+                        valor = valor_raw.decode('utf-8').strip()
+                    except UnicodeDecodeError:
+                        valor = f"b'{valor_raw[:50]}...'"
+            else:
+                valor = str(valor_raw)
             
-            # Procura X-LAT e Y-LONG no UserComment
-            if 'Exif' in exif_dict and piexif.ExifIFD.UserComment in exif_dict['Exif']:
-                comentario = exif_dict['Exif'][piexif.ExifIFD.UserComment].decode('utf-8', errors='ignore')
-                
-                # Extrai coordenadas
-                x_match = re.search(r'X[-_]?LAT[:\s]*([-\d.]+)', comentario, re.IGNORECASE)
-                y_match = re.search(r'Y[-_]?LONG[:\s]*([-\d.]+)', comentario, re.IGNORECASE)
-                
-                if x_match:
-                    self.entry_xlat.delete(0, tk.END)
-                    self.entry_xlat.insert(0, x_match.group(1))
-                
-                if y_match:
-                    self.entry_ylong.delete(0, tk.END)
-                    self.entry_ylong.insert(0, y_match.group(1))
-                    
-                self.adicionar_linha("📍 COORDENADAS", "X-LAT", x_match.group(1) if x_match else "N/A")
-                self.adicionar_linha("📍 COORDENADAS", "Y-LONG", y_match.group(1) if y_match else "N/A")
-                
-        except:
-            pass
+            yield tag_info, valor
+    
+    def extrair_coordenadas(self, metadados):
+        if not metadados["exif"]:
+            return
+        x, y, planta = coordenadas_exif(metadados["exif"])
+        
+        if x is not None:
+            self.entry_xlat.delete(0, tk.END)
+            self.entry_xlat.insert(0, str(x))
+        
+        if y is not None:
+            self.entry_ylong.delete(0, tk.END)
+            self.entry_ylong.insert(0, str(y))
+        
+        linhas = [("X-LAT", str(x) if x is not None else "N/A"),
+                  ("Y-LONG", str(y) if y is not None else "N/A")]
+        if planta:
+            linhas.append(("PLANTA", planta))
+        self.adicionar_grupo("📍 COORDENADAS", linhas, aberto=True)
     
     def salvar_coordenadas(self):
         xlat = self.entry_xlat.get().strip()
@@ -245,6 +292,54 @@ class VisualizadorMetadadosLimpo:
         except Exception as e:
             messagebox.showerror("ERRO", str(e))
     
+    def indexar_pasta(self):
+        """Indexa todas as imagens de uma pasta de sessão em segundo plano."""
+        pasta = filedialog.askdirectory(title="Pasta da sessão")
+        if not pasta:
+            return
+        self.botao_indexar.config(state=tk.DISABLED)
+        self.info_label.config(text=f"📂 Indexando {os.path.basename(pasta)}...")
+        self.indexacao = (0, 0)
+        self.resultado_indexacao = None
+        
+        def progresso(feitos, total):
+            self.indexacao = (feitos, total)
+        
+        def executar():
+            try:
+                resultado = indexar_sessao(pasta, ao_progresso=progresso)
+            except Exception as e:
+                resultado = e
+            # Tkinter só na thread da interface: acompanhar_indexacao entrega o resultado
+            self.resultado_indexacao = resultado
+        
+        threading.Thread(target=executar, daemon=True).start()
+        self.acompanhar_indexacao()
+    
+    def acompanhar_indexacao(self):
+        if self.indexacao is None:
+            return
+        if self.resultado_indexacao is not None:
+            self.indexacao_concluida(self.resultado_indexacao)
+            return
+        feitos, total = self.indexacao
+        self.progresso_indice['value'] = 100.0 * feitos / total if total else 0
+        self.info_label.config(text=f"📂 Indexando... {feitos}/{total}")
+        self.root.after(100, self.acompanhar_indexacao)
+    
+    def indexacao_concluida(self, resultado):
+        self.indexacao = None
+        self.botao_indexar.config(state=tk.NORMAL)
+        if isinstance(resultado, Exception):
+            self.progresso_indice['value'] = 0
+            self.info_label.config(text="Selecione uma imagem...")
+            messagebox.showerror("ERRO", str(resultado))
+            return
+        destino, quantidade, segundos = resultado
+        self.progresso_indice['value'] = 100
+        self.info_label.config(text=f"✅ {quantidade} imagens indexadas em {segundos:.1f} s")
+        messagebox.showinfo("✅ ÍNDICE", f"{quantidade} imagens\n{destino}")
+    
     def copiar_coords(self):
         coords = f"X-LAT:{self.entry_xlat.get()}, Y-LONG:{self.entry_ylong.get()}"
         self.root.clipboard_clear()
@@ -252,7 +347,6 @@ class VisualizadorMetadadosLimpo:
         messagebox.showinfo("COPIADO", "Coordenadas copiadas!")
 
 if __name__ == "__main__":
-    from datetime import datetime
     root = tk.Tk()
     app = VisualizadorMetadadosLimpo(root)
     root.mainloop()
@@ -0,0 +1,257 @@
+"""
+Estimativa do tempo de movimento a partir das configurações do GRBL ($$).
+
+Usa as velocidades máximas ($110/$111/$112), acelerações ($120/$121/$122) e o
+desvio de junção ($11) para prever o tempo de cada movimento com perfil
+trapezoidal, como o planejador do GRBL. Serve para a ETA da barra de progresso,
+como custo no planejamento de rota e para comparar avanços (F) offline:
+
+    python estimativa_movimento.py --sala "Room A" --feed 6000 10000 14000
+"""
+
+import argparse
+import json
+import math
+import re
+import time
+
+import numpy as np
+
+from arquivo_rota import carregar_rota, localizar_rota
+
+FEED_PADRAO = 14000.0       # mm/min, o mesmo "G1 F14000" das rotinas de captura
+VEL_MAX_PADRAO = 14000.0    # mm/min, usado quando $110/$111 não são conhecidos
+ACEL_PADRAO = 200.0         # mm/s², usado quando $120/$121 não são conhecidos
+DESVIO_JUNCAO_PADRAO = 0.010
+
+ARQUIVO_CONFIGURACOES = "grbl_configuracoes.txt"
+
+_RE_CONFIGURACAO = re.compile(r"^\$(\d+)=([-+]?\d*\.?\d+)")
+
+
+def ler_configuracoes(linhas):
+    """Converte as linhas "$N=valor" da saída do $$ em {N: valor}."""
+    configuracoes = {}
+    for linha in linhas:
+        encontrado = _RE_CONFIGURACAO.match(linha.strip())
+        if encontrado:
+            configuracoes[int(encontrado.group(1))] = float(encontrado.group(2))
+    return configuracoes
+
+
+def salvar_configuracoes(linhas, caminho=ARQUIVO_CONFIGURACOES):
+    with open(caminho, "w") as f:
+        f.write("\n".join(linhas) + "\n")
+
+
+def carregar_configuracoes(caminho=ARQUIVO_CONFIGURACOES):
+    """Lê um dump de $$ salvo anteriormente; retorna {} se não existir."""
+    try:
+        with open(caminho, "r") as f:
+            return ler_configuracoes(f.read().splitlines())
+    except OSError:
+        return {}
+
+
+def tempo_bloco(distancia, velocidade, aceleracao, v_entrada=0.0, v_saida=0.0):
+    """Tempo (s) de um bloco com perfil trapezoidal entre as velocidades dadas."""
+    if distancia <= 0:
+        return 0.0
+    pico = math.sqrt((2 * aceleracao * distancia + v_entrada ** 2 + v_saida ** 2) / 2)
+    if pico <= velocidade:
+        return (2 * pico - v_entrada - v_saida) / aceleracao
+    d_acel = (velocidade ** 2 - v_entrada ** 2) / (2 * aceleracao)
+    d_desacel = (velocidade ** 2 - v_saida ** 2) / (2 * aceleracao)
+    return ((2 * velocidade - v_entrada - v_saida) / aceleracao
+            + (distancia - d_acel - d_desacel) / velocidade)
+
+
+class EstimadorMovimento:
+    """
+    Modelo de tempo de movimento do GRBL.
+
+    configuracoes: {N: valor} lido do $$ (ausentes usam os valores padrão)
+    feed: avanço programado dos movimentos G1 (mm/min)
+    """
+
+    def __init__(self, configuracoes=None, feed=FEED_PADRAO):
+        configuracoes = configuracoes or {}
+        self.configuracoes = configuracoes
+        self.feed_mm_min = feed
+        self.feed = feed / 60.0
+        self.vel_x = configuracoes.get(110, VEL_MAX_PADRAO) / 60.0
+        self.vel_y = configuracoes.get(111, VEL_MAX_PADRAO) / 60.0
+        self.acel_x = configuracoes.get(120, ACEL_PADRAO)
+        self.acel_y = configuracoes.get(121, ACEL_PADRAO)
+        self.desvio_juncao = configuracoes.get(11, DESVIO_JUNCAO_PADRAO)
+
+    @classmethod
+    def de_linhas(cls, linhas, feed=FEED_PADRAO):
+        return cls(ler_configuracoes(linhas), feed)
+
+    def com_feed(self, feed):
+        return EstimadorMovimento(self.configuracoes, feed)
+
+    def _limites(self, dx, dy):
+        """Velocidade (mm/s) e aceleração (mm/s²) ao longo de um trecho."""
+        distancia = math.hypot(dx, dy)
+        velocidade = self.feed
+        aceleracao = math.inf
+        if dx:
+            velocidade = min(velocidade, self.vel_x * distancia / abs(dx))
+            aceleracao = self.acel_x * distancia / abs(dx)
+        if dy:
+            velocidade = min(velocidade, self.vel_y * distancia / abs(dy))
+            aceleracao = min(aceleracao, self.acel_y * distancia / abs(dy))
+        return distancia, velocidade, aceleracao
+
+    def tempo(self, dx, dy):
+        """
+        Tempo de um movimento isolado (parte e termina parado). Nenhum eixo
+        passa do seu limite, então uma diagonal custa quase o mesmo que o
+        maior dos deslocamentos (tempo tipo Chebyshev).
+        """
+        if dx == 0 and dy == 0:
+            return 0.0
+        return tempo_bloco(*self._limites(dx, dy))
+
+    def tempos(self, dx, dy):
+        """Versão vetorizada de tempo() para arrays NumPy."""
+        dx = np.abs(np.asarray(dx, dtype=float))
+        dy = np.abs(np.asarray(dy, dtype=float))
+        distancia = np.hypot(dx, dy)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            razao_x = np.where(dx > 0, distancia / dx, np.inf)
+            razao_y = np.where(dy > 0, distancia / dy, np.inf)
+            velocidade = np.minimum(self.feed, np.minimum(self.vel_x * razao_x, self.vel_y * razao_y))
+            aceleracao = np.minimum(self.acel_x * razao_x, self.acel_y * razao_y)
+            trapezio = distancia / velocidade + velocidade / aceleracao
+            triangulo = 2.0 * np.sqrt(distancia / aceleracao)
+            t = np.where(distancia >= velocidade * velocidade / aceleracao, trapezio, triangulo)
+        return np.where(distancia > 0, t, 0.0)
+
+    def tempos_rota(self, coords, origem=(0.0, 0.0), retorno=True):
+        """
+        Tempo de cada trecho de uma rota com parada em todos os pontos:
+        origem -> p1, p1 -> p2, ..., pn -> origem (se retorno).
+        """
+        caminho = [origem] + [tuple(p) for p in coords] + ([origem] if retorno else [])
+        delta = np.diff(np.asarray(caminho, dtype=float).reshape(-1, 2), axis=0)
+        return self.tempos(delta[:, 0], delta[:, 1])
+
+    def tempos_continuos(self, coords):
+        """
+        Tempo de cada trecho de uma trajetória sem paradas intermediárias
+        (linhas enviadas em fluxo), com velocidades de junção limitadas pelo
+        desvio de junção ($11) e passes para trás/para frente como no GRBL.
+        """
+        pontos = [tuple(p) for p in coords]
+        blocos = []
+        for (x0, y0), (x1, y1) in zip(pontos, pontos[1:]):
+            dx, dy = x1 - x0, y1 - y0
+            if dx == 0 and dy == 0:
+                continue
+            distancia, velocidade, aceleracao = self._limites(dx, dy)
+            blocos.append([distancia, velocidade, aceleracao, dx / distancia, dy / distancia])
+        if not blocos:
+            return []
+
+        # Velocidade máxima na entrada de cada bloco (junção com o anterior)
+        entrada_max = [0.0]
+        for anterior, atual in zip(blocos, blocos[1:]):
+            cos_theta = -(anterior[3] * atual[3] + anterior[4] * atual[4])
+            if cos_theta > 0.999999:
+                v_juncao = 0.0
+            elif cos_theta < -0.999999:
+                v_juncao = math.inf
+            else:
+                sin_meio = math.sqrt(0.5 * (1.0 - cos_theta))
+                aceleracao = min(anterior[2], atual[2])
+                v_juncao = math.sqrt(aceleracao * self.desvio_juncao * sin_meio / (1.0 - sin_meio))
+            entrada_max.append(min(v_juncao, anterior[1], atual[1]))
+
+        entrada = list(entrada_max)
+        saida = [0.0] * len(blocos)
+        # Passe para trás: é preciso conseguir frear até a saída de cada bloco
+        for i in range(len(blocos) - 1, -1, -1):
+            distancia, _, aceleracao = blocos[i][:3]
+            saida[i] = entrada[i + 1] if i + 1 < len(blocos) else 0.0
+            entrada[i] = min(entrada[i], math.sqrt(saida[i] ** 2 + 2 * aceleracao * distancia))
+        # Passe para frente: é preciso conseguir acelerar até a entrada seguinte
+        for i in range(len(blocos)):
+            distancia, _, aceleracao = blocos[i][:3]
+            alcancavel = math.sqrt(entrada[i] ** 2 + 2 * aceleracao * distancia)
+            saida[i] = min(saida[i], alcancavel)
+            if i + 1 < len(blocos):
+                entrada[i + 1] = saida[i]
+
+        return [tempo_bloco(b[0], b[1], b[2], entrada[i], saida[i]) for i, b in enumerate(blocos)]
+
+
+class PrevisaoExecucao:
+    """
+    ETA de uma execução: tempo de movimento previsto para os trechos que faltam
+    somado ao custo extra médio medido por ponto (espera, captura, gravação).
+
+    tempos_trechos: tempo previsto de cada trecho (n pontos + retorno)
+    """
+
+    def __init__(self, tempos_trechos):
+        tempos = np.asarray(tempos_trechos, dtype=float)
+        self.total_pontos = max(len(tempos) - 1, 0)
+        self.acumulado = np.concatenate([[0.0], np.cumsum(tempos)])
+        self.total_movimento = float(self.acumulado[-1])
+        self.inicio = time.monotonic()
+
+    def restante(self, concluidos):
+        """Segundos previstos até o fim, após `concluidos` pontos."""
+        decorrido = time.monotonic() - self.inicio
+        movimento_feito = self.acumulado[min(concluidos, len(self.acumulado) - 1)]
+        extra_por_ponto = max(0.0, decorrido - movimento_feito) / concluidos if concluidos else 0.0
+        faltam = max(self.total_pontos - concluidos, 0)
+        return float(self.total_movimento - movimento_feito + extra_por_ponto * faltam)
+
+
+def formatar_duracao(segundos):
+    segundos = int(round(segundos))
+    horas, resto = divmod(segundos, 3600)
+    minutos, segundos = divmod(resto, 60)
+    if horas:
+        return f"{horas}h{minutos:02d}m{segundos:02d}s"
+    return f"{minutos:02d}:{segundos:02d}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara o tempo de execução para diferentes avanços (F)")
+    origem = parser.add_mutually_exclusive_group()
+    origem.add_argument("--pontos", help="arquivo de rota .npy ou .json (padrão pontos.npy ou pontos.json)")
+    origem.add_argument("--sala", help='sala do cfg.json (ex.: "Room A")')
+    parser.add_argument("--configuracoes", default=ARQUIVO_CONFIGURACOES,
+                        help="saída do $$ salva (padrão grbl_configuracoes.txt)")
+    parser.add_argument("--feed", type=float, nargs="+", default=[FEED_PADRAO], help="avanços (mm/min)")
+    parser.add_argument("--parada", type=float, default=0.0,
+                        help="tempo fixo por ponto para estabilizar/capturar (s)")
+    args = parser.parse_args(argv)
+
+    if args.sala:
+        with open("cfg.json", "r") as f:
+            pontos = json.load(f)[args.sala]
+        coords = [(p.get("X", 0.0), p.get("Y", 0.0)) for p in pontos]
+    else:
+        rota = carregar_rota(args.pontos or localizar_rota())
+        coords = np.column_stack([rota["X"], rota["Y"]])
+    configuracoes = carregar_configuracoes(args.configuracoes)
+    if not configuracoes:
+        print(f"Aviso: {args.configuracoes} não encontrado, usando limites padrão.")
+
+    print(f"{len(coords)} pontos, parada de {args.parada:.2f} s por ponto")
+    print(f"{'F (mm/min)':>12} {'movimento':>12} {'total':>12}")
+    for feed in args.feed:
+        estimador = EstimadorMovimento(configuracoes, feed)
+        movimento = float(estimador.tempos_rota(coords).sum())
+        total = movimento + args.parada * len(coords)
+        print(f"{feed:>12.0f} {formatar_duracao(movimento):>12} {formatar_duracao(total):>12}")
+
+
+if __name__ == "__main__":
+    main()
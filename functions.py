@@ -1,18 +1,34 @@
 
 import cv2 as cv
-import serial
-import time
 import os
 import json
 import signal
 import sys
-from PIL import Image
 import datetime
 import threading
-import tkinter as tk
-import tkinter.messagebox as msg
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+import numpy as np
+
+from comunicacao_grbl import ConexaoGrbl, GrblError
+from planejamento_rota import otimizar_rota
+from estimativa_movimento import (
+    EstimadorMovimento, PrevisaoExecucao, carregar_configuracoes, salvar_configuracoes,
+    formatar_duracao)
+
+from servico_camera import GrupoCameras, abrir_camera
+from captura_continua import CapturaContinua, linhas_varredura, feed_varredura
+from arquivo_rota import ARQUIVO_ROTA, criar_rota, salvar_rota, carregar_rota, localizar_rota
+from planejamento_cobertura import (
+    campo_visao_cfg, planejar_cobertura, micro_grades_plantas, regioes_plantas)
+from gravacao_imagens import GravadorImagens, montar_exif
+from manifesto_sessao import (
+    ARQUIVO_ROTA_SESSAO, ARQUIVO_SESSAO, ManifestoSessao, carregar_sessao, pontos_concluidos,
+    salvar_sessao)
+from indice_espacial import ARQUIVO_INDICE_ESPACIAL, IndiceEspacial
+
+FEED_RATE = 14000  # mm/min dos deslocamentos G1 entre pontos
+
+# tkinter, matplotlib e PIL são importados só nas funções que os usam: a
+# execução sem interface (captura_terminal.py) não depende de display.
 
 def multi_images_capture():
     """
@@ -26,30 +42,17 @@ def multi_images_capture():
 
     def finalize():
         print("\n--- Fechando conexão... ---")
-        grbl.close()
+        conexao.fechar()
         cam.release()
         cv.destroyAllWindows()
         sys.exit(0)
 
     def send_grbl(cmd):
-        grbl.write((cmd + "\r\n").encode())
-        while True:
-            if grbl.inWaiting() > 0:
-                response = grbl.readline().decode().strip()
-                print("GRBL:", response)
-                if "ok" in response or "error" in response:
-                    break
-            time.sleep(0.01)
+        streamer.enviar(cmd)
 
     def wait_for_idle():
-        while True:
-            grbl.write(b"?")
-            time.sleep(0.1)
-            if grbl.inWaiting() > 0:
-                status = grbl.readline().decode().strip()
-                print("Status:", status)
-                if "<Idle" in status:
-                    break
+        streamer.aguardar()
+        streamer.estado.aguardar_parada()
 
     def wait_user(msg):
         cmd = input('\n' + msg + " ( y= yes  n= no ) >> ")
@@ -84,20 +87,20 @@ def multi_images_capture():
 
     PORT = data["port"]
     BAUDRATE = data["baudrate"]
-    ID_PLANT = [plant["id"] for plant in data["plants"]]
-    POS_X_PLANT = [plant["X"] for plant in data["plants"]]
-    POS_Y_PLANT = [plant["Y"] for plant in data["plants"]]
+    plants = data["Room B"]
+    ID_PLANT = [plant["id"] for plant in plants]
+    POS_X_PLANT = [plant["X"] for plant in plants]
+    POS_Y_PLANT = [plant["Y"] for plant in plants]
 
     signal.signal(signal.SIGINT, signal_handler)
 
     print("Iniciando comunicacao GRBL...")
     try:
-        global grbl
-        grbl = serial.Serial(PORT, BAUDRATE, timeout=1)
-        time.sleep(2)
-        grbl.write(b"\r\n\r\n")
-        time.sleep(2)
-        grbl.flushInput()
+        global conexao
+        conexao = ConexaoGrbl(PORT, BAUDRATE, data.get("status_hz", 50.0),
+                              data.get("banner_timeout_s", 2.5), log=print)
+        global streamer
+        streamer = conexao.conectar(ao_mudar=lambda status: print("Status:", status))
         print("Conectado ao GRBL na porta:", PORT)
     except Exception:
         print("Erro ao conectar na porta:", PORT)
@@ -105,24 +108,23 @@ def multi_images_capture():
 
     print("-> Iniciando Camera...")
     global cam
-    cam = cv.VideoCapture(0, cv.CAP_DSHOW)
-    if not cam.isOpened():
+    try:
+        cam = abrir_camera(data.get("camera"))
+    except RuntimeError:
         print("-> Erro ao abrir a câmera. Verifique a conexão...")
-        grbl.close()
+        conexao.fechar()
         exit()
-    cam.set(3, 1920)
-    cam.set(4, 1080)
 
     print(f"Processando 12 plantas, 10 vezes cada (120 capturas)...")
     print_progress(0, 120)
-    send_grbl('$X')
-    wait_for_idle()
-    send_grbl('$H')
+    comandos = streamer.enviar_lote(['$X', '$H', '$$'])
+    conexao.referenciada = True
+    conexao.configuracoes = comandos[-1].linhas
+    if conexao.configuracoes:
+        salvar_configuracoes(conexao.configuracoes)
     wait_for_idle()
-    send_grbl('$')
-    send_grbl('?')
     wait_user('-> Iniciar Captura Automatica? ')
-    send_grbl('G1 F14000')
+    send_grbl(f'G1 F{FEED_RATE}')
 
     total_images = 120
     image_counter = 1
@@ -143,113 +145,366 @@ def multi_images_capture():
     wait_for_idle()
     finalize()
 
+# Atualizações de interface passam pela PonteInterface (self.ui): podem ser
+# chamadas de qualquer thread e são aplicadas em lote pela thread do Tk.
 def log(self, message):
-    self.log_text.insert('end', message + "\n")
-    self.log_text.see('end')
-    self.root.update_idletasks()
+    self.ui.log(message)
 
 def update_status(self, status):
-    self.status_label.config(text=f"Status: {status}")
+    self.ui.status(status)
 
-def update_progress(self, current, total):
+def update_progress(self, current, total, restante=None):
     percent = (current / total) * 100 if total > 0 else 0
-    self.progress_bar['value'] = percent
-    self.progress_text.config(text=f"{percent:.1f}% ({current}/{total})")
-    self.root.update_idletasks()
+    texto = f"{percent:.1f}% ({current}/{total})"
+    if restante is not None:
+        texto += f" - restam ~{formatar_duracao(restante)}"
+    self.ui.progresso(percent, texto)
 
 def update_image(self, frame, plant_name):
-    from PIL import Image, ImageTk
-    frame_resized = cv.resize(frame, (640, 360))
-    img = cv.cvtColor(frame_resized, cv.COLOR_BGR2RGB)
-    img = Image.fromarray(img)
-    photo = ImageTk.PhotoImage(image=img)
-    self.canvas.create_image(0, 0, anchor='nw', image=photo)
-    self.canvas.image = photo
-    self.image_label.config(text=f"Imagem Atual: {plant_name}")
-    self.root.update_idletasks()
+    # Redução e conversão ficam na thread de pré-visualização da ponte
+    self.ui.imagem(frame, plant_name)
 
 def signal_handler(self, sig, frame):
     log(self, "===============================================================")
     log(self, "\nInterrupção detectada (Ctrl + C). Finalizando...")
     log(self, "===============================================================")
-    finalize(self)
+    # Como no cancelamento, quem finaliza é a thread de captura
+    self.running = False
 
 def cancel(self):
     log(self, "===============================================================")
     log(self, "\nCancelamento solicitado. Finalizando...")
     log(self, "===============================================================")
-    finalize(self)
+    # Só sinaliza a thread de captura, sem travar a interface: as esperas e o
+    # streamer (`ativo`) veem self.running False em até ~0,1 s, e a própria
+    # thread para a máquina, grava a fila e fecha o manifesto em finalize
+    self.running = False
 
-def finalize(self):
+def finalize(self, falha=False):
+    """
+    Encerra a execução na thread de captura (fim normal, erro ou cancelamento):
+    para a máquina, grava as imagens pendentes e fecha o manifesto.
+    falha: a execução terminou por erro; self.failed também fica True se
+    alguma imagem não foi gravada (código de saída do captura_terminal.py)
+    """
+    self.failed = falha
     log(self, "\n--- Fechando conexão... ---")
-    if self.grbl:
-        self.grbl.close()
-    if self.cam:
-        self.cam.release()
-    cv.destroyAllWindows()
+    # Antes de parar a máquina: nada mais é enviado ao GRBL
     self.running = False
+    # A porta continua aberta para a próxima execução; só o movimento é parado
+    if getattr(self, "conexao", None):
+        self.conexao.liberar()
+    # A câmera também continua aberta, com exposição e balanço de branco travados
+    self.grabber = None
+    self.cam = None
+    if getattr(self, "writer", None):
+        # Garante que todas as imagens da fila sejam gravadas antes de encerrar
+        log(self, f"Gravando {self.writer.pendentes} imagens pendentes...")
+        self.writer.finalizar()
+        log(self, self.writer.resumo())
+        if self.writer.falhas:
+            self.failed = True
+        self.writer = None
+    if getattr(self, "manifesto", None):
+        close_manifest(self)
+    try:
+        cv.destroyAllWindows()
+    except cv.error:
+        # OpenCV sem suporte a janelas (opencv-python-headless)
+        pass
+    self.ui.chamar(reset_controls, self)
+
+def reset_controls(self):
+    if getattr(self, "start_button", None) is None:
+        # Execução sem interface
+        return
     self.start_button.config(state='normal')
     self.cancel_button.config(state='disabled')
     self.image_label.config(text="Imagem Atual: Nenhuma planta selecionada")
 
 def send_grbl(self, cmd):
-    self.grbl.write((cmd + "\r\n").encode())
-    while True:
-        if self.grbl.inWaiting() > 0:
-            response = self.grbl.readline().decode().strip()
-            log(self, "GRBL: " + response)
-            if "ok" in response or "error" in response:
-                break
-        time.sleep(0.01)
+    """
+    Enfileira o comando no GRBL (contagem de caracteres) sem esperar o "ok".
+    Erros do GRBL são levantados como GrblError no próximo envio ou espera.
+    """
+    return self.streamer.enviar(cmd)
+
+def connect_grbl(self, data):
+    """
+    Prepara o GRBL para uma execução: reaproveita a porta aberta em execuções
+    anteriores ou abre a do cfg.json esperando o banner (sem pausas fixas).
+    A thread de leitura envia "?" em cfg "status_hz".
+    """
+    conexao = getattr(self, "conexao", None)
+    if conexao is not None and (conexao.nome, conexao.baudrate) != (data["port"], data["baudrate"]):
+        conexao.fechar()
+        conexao = None
+    if conexao is None:
+        conexao = ConexaoGrbl(data["port"], data["baudrate"], data.get("status_hz", 50.0),
+                              data.get("banner_timeout_s", 2.5))
+        self.conexao = conexao
+    self.streamer = conexao.conectar(
+        log=lambda m: log(self, m), ativo=lambda: self.running,
+        ao_mudar=lambda status: update_status(self, status))
+    self.machine = conexao.estado
+    self.grbl = conexao.porta
+    self.force_home = getattr(self, "force_home_requested", False) or data.get("force_homing", False)
+
+def connect_camera(self, data, tamanho=4):
+    """
+    Prepara as câmeras para uma execução pelo GrupoCameras do aplicativo: a
+    principal (bloco "camera" do cfg.json) e as de "extra_cameras" são abertas
+    uma única vez e, a cada troca de sala, aquecidas e travadas ou ajustadas
+    com os valores guardados da sala.
+    """
+    grupo = getattr(self, "camera_service", None)
+    cfgs = [data.get("camera", {})] + data.get("extra_cameras", [])
+    empilhar = data.get("multispectral_stack", True)
+    if grupo is not None and not grupo.mesma_configuracao(cfgs, empilhar):
+        grupo.fechar()
+        grupo = None
+    if grupo is None:
+        grupo = GrupoCameras(cfgs, empilhar)
+        self.camera_service = grupo
+    self.grabber = grupo.preparar(getattr(self, "room", None), tamanho, log=lambda m: log(self, m))
+    self.cam = grupo.principal.cam
+    self.stop_frames = {}
+
+def close_app(self):
+    """Fecha a câmera e a porta do GRBL ao sair do aplicativo."""
+    if self.running:
+        cancel(self)
+    thread = getattr(self, "thread", None)
+    if thread is not None and thread.is_alive():
+        # A porta só fecha depois que a thread de captura parou a máquina
+        self.root.after(100, close_app, self)
+        return
+    if getattr(self, "camera_service", None):
+        self.camera_service.fechar()
+    if getattr(self, "conexao", None):
+        self.conexao.fechar()
+    self.root.destroy()
+
+def setup_grbl(self):
+    # Desbloqueio, homing, leitura das configurações e avanço em um único fluxo.
+    # O homing é dispensado se a máquina continua referenciada desde o último $H
+    # desta conexão, sem alarme; o $$ é lido uma vez por conexão.
+    conexao = self.conexao
+    homing = self.force_home or conexao.precisa_referenciar()
+    cmds = (['$X', '$H'] if homing else []) + (['$$'] if conexao.configuracoes is None else [])
+    comandos = self.streamer.enviar_lote(cmds + [f'G1 F{FEED_RATE}'])
+    if not self.running:
+        # Cancelado antes das confirmações: nem o $H nem o $$ valem
+        return
+    if homing:
+        conexao.referenciada = True
+    else:
+        log(self, "Homing dispensado: máquina referenciada e sem alarme desde o último $H")
+    if conexao.configuracoes is None:
+        conexao.configuracoes = comandos[len(cmds) - 1].linhas
+    self.grbl_settings = conexao.configuracoes
+    if self.grbl_settings:
+        salvar_configuracoes(self.grbl_settings)
+        salvar_configuracoes(self.grbl_settings, os.path.join(self.session_dir, "grbl_configuracoes.txt"))
+    self.estimador = EstimadorMovimento.de_linhas(self.grbl_settings, FEED_RATE)
+    wait_for_idle(self)
+
+def load_estimator():
+    """Estimador com as configurações do último $$ lido (ou valores padrão)."""
+    return EstimadorMovimento(carregar_configuracoes(), FEED_RATE)
+
+def start_route_forecast(self, coords):
+    """Prevê o tempo de cada trecho com as configurações lidas do GRBL."""
+    tempos = self.estimador.tempos_rota(coords)
+    log(self, f"Tempo de movimento previsto ({len(coords)} pontos): "
+              f"{formatar_duracao(float(tempos.sum()))}")
+    return PrevisaoExecucao(tempos)
 
 def wait_for_idle(self):
-    while self.running:
-        self.grbl.write(b"?")
-        time.sleep(0.1)
-        if self.grbl.inWaiting() > 0:
-            status = self.grbl.readline().decode().strip()
-            update_status(self, status)
-            log(self, "Status: " + status)
-            if "<Idle" in status:
-                break
-
-def get_image(self, plant_idx):
-    self.cam.read() # importante para descartar o primeiro frame
-    time.sleep(0.1)  # Aguarda um pouco para estabilizar a câmera
-    ret, frame = self.cam.read()
-    if not ret:
-        log(self, f"Erro ao capturar imagem para {self.ID_PLANT[plant_idx]}")
+    """
+    Espera as confirmações pendentes e o fim do movimento (evento disparado
+    pela thread de leitura). Retorna o instante em que a máquina parou, ou
+    None se a execução foi cancelada ou o movimento interrompido por reset.
+    """
+    self.streamer.aguardar()
+    return self.machine.aguardar_parada(ativo=lambda: self.running)
+
+def reported_position(self):
+    """Última posição (X, Y) reportada pelo GRBL, ou (None, None)."""
+    posicao = self.machine.wpos if getattr(self, "machine", None) else None
+    return (posicao[0], posicao[1]) if posicao else (None, None)
+
+def send_capture(self, nome, frame, metadados, registrar):
+    """
+    Envia ao gravador a imagem principal e, com câmeras extras, os arquivos
+    delas na mesma parada (self.stop_frames), com nomes derivados de `nome`.
+    registrar(tamanho, crc, **extras) é chamado quando todos estão no disco;
+    extras traz bandas e defasagem_ms para o manifesto.
+    """
+    grupo = self.camera_service
+    quadros = getattr(self, "stop_frames", None) or {}
+    extras = grupo.arquivos_extras(quadros, os.path.splitext(nome)[0]) if grupo.extras else []
+    if not extras:
+        self.writer.enviar(nome, frame, metadados, ao_gravar=registrar)
         return
+    defasagem_ms = round(1000 * grupo.defasagem(quadros), 2)
+
+    def gravados(arquivos):
+        bandas = [dict(descricao, arquivo=caminho, tamanho=arquivos[caminho][0],
+                       crc32=arquivos[caminho][1])
+                  for caminho, _, descricao in extras]
+        registrar(*arquivos[nome], bandas=bandas, defasagem_ms=defasagem_ms)
+
+    self.writer.enviar_conjunto(
+        [(nome, frame, metadados)] + [(caminho, dados, None) for caminho, dados, _ in extras],
+        ao_gravar=gravados)
+
+def save_plant_image(self, plant_idx, frame):
     update_image(self, frame, self.ID_PLANT[plant_idx])
     nome = os.path.join(self.session_dir, f"{self.ID_PLANT[plant_idx]}.jpg")
-    cv.imwrite(nome, frame)
+    x, y = self.POS_X_PLANT[plant_idx], self.POS_Y_PLANT[plant_idx]
+    x_medido, y_medido = self.stop_position
+    momento = datetime.datetime.now()
+    send_capture(self, nome, frame, {
+        "x": x, "y": y, "planta": self.ID_PLANT[plant_idx], "momento": momento},
+        lambda tamanho, crc, **extras: self.manifesto.registrar(
+            nome, x, y, x_medido, y_medido, self.ID_PLANT[plant_idx], momento=momento,
+            tamanho=tamanho, crc=crc, **extras))
     log(self, f"Imagem capturada para {self.ID_PLANT[plant_idx]} em {nome}")
 
+def capture_route(self, alvos, salvar, previsao=None):
+    """
+    Percorre alvos [(x, y, mensagem[, feed])] e chama salvar(i, frame) em cada parada.
+
+    Com cfg "pipelined_capture" (padrão), o G1 do próximo ponto é enviado
+    assim que o frame está em memória: pré-visualização, EXIF, gravação e log
+    acontecem durante o deslocamento seguinte. Retorna os pontos visitados.
+    """
+    total = len(alvos)
+
+    def mover(i):
+        x, y, mensagem = alvos[i][:3]
+        feed = alvos[i][3] if len(alvos[i]) > 3 else None
+        log(self, "===============================================================")
+        log(self, mensagem)
+        send_grbl(self, f'G1 X{x:.3f} Y{y:.3f}' + (f' F{feed:.0f}' if feed else ''))
+
+    if total:
+        mover(0)
+    for i in range(total):
+        t_parada = wait_for_idle(self)
+        if t_parada is None or not self.running:
+            return i
+        # Posição do relatório Idle, antes de o próximo G1 ser enviado
+        self.stop_position = reported_position(self)
+        # Primeiro frame exposto depois da parada e da estabilização mecânica,
+        # pedido a todas as câmeras ao mesmo tempo
+        self.stop_frames = self.camera_service.capturar(t_parada + self.settle_time)
+        frame = self.stop_frames[self.camera_service.principal.nome][0]
+        # Cancelado enquanto o frame era lido: nada mais é enviado nem gravado
+        if not self.running:
+            return i
+        if self.pipelined and i + 1 < total:
+            mover(i + 1)
+        for nome, (quadro, _) in self.stop_frames.items():
+            if quadro is None and frame is not None:
+                log(self, f"Câmera {nome} sem frame no ponto {i + 1}")
+        if frame is None:
+            log(self, f"Erro ao capturar imagem no ponto {i + 1}")
+        else:
+            salvar(i, frame)
+        update_progress(self, i + 1, total, previsao.restante(i + 1) if previsao else None)
+        if not self.pipelined and i + 1 < total:
+            mover(i + 1)
+    return total
+
+def start_flyby(self, data):
+    """
+    Varredura contínua da captura adensada; o avanço é limitado pelo borrão
+    admitido (cfg "flyby_blur_mm") na exposição travada da câmera e pela taxa
+    de frames. Sem exposição travada vale cfg "flyby_exposure_ms".
+    """
+    exposicao = self.camera_service.principal.exposicao_s()
+    if exposicao is None:
+        exposicao = data.get("flyby_exposure_ms", 2.0) / 1000.0
+        log(self, f"Aviso: exposição da câmera não travada ou em unidade desconhecida; "
+                  f"borrão calculado com flyby_exposure_ms = {1000 * exposicao:.1f} ms")
+    feed, fator = feed_varredura(
+        FEED_RATE, data.get("flyby_blur_mm", 0.5), exposicao,
+        self.grabber.periodo, data.get("flyby_tolerance_mm", 5.0))
+    log(self, f"Captura em movimento: F{feed:.0f} mm/min (limitado por {fator}, "
+              f"exposição {1000 * exposicao:.1f} ms)")
+    return CapturaContinua(
+        self.streamer, self.machine, self.grabber, self.estimador, feed, FEED_RATE,
+        exposicao_s=exposicao, aguardar_parada=lambda: wait_for_idle(self),
+        ativo=lambda: self.running, log=lambda m: log(self, m))
+
+def start_writer(self, data):
+    """Pool de gravação; profundidade da fila e threads vêm do cfg.json."""
+    self.writer = GravadorImagens(
+        trabalhadores=data.get("writer_workers", 2),
+        profundidade=data.get("writer_queue_depth", 8),
+        log=lambda m: log(self, m))
+
+def start_manifest(self, data):
+    """Manifesto da sessão; ao final, as capturas entram no índice espacial (cfg "spatial_index")."""
+    self.manifesto = ManifestoSessao(self.session_dir)
+    self.spatial_index = data.get("spatial_index", ARQUIVO_INDICE_ESPACIAL)
+
+def close_manifest(self):
+    self.manifesto.fechar()
+    try:
+        with IndiceEspacial(self.spatial_index) as indice:
+            total = indice.adicionar_manifesto(self.manifesto.caminho)
+        log(self, f"Índice espacial: {total} capturas da sessão {self.manifesto.sessao} em {self.spatial_index}")
+    except Exception as e:
+        log(self, f"Erro ao atualizar o índice espacial: {e}")
+    self.manifesto = None
+
 def start_process(self):
     if self.running:
         return
+    selected_indices = prepare_plant_session(self)
+    start_worker(self, lambda: run_process(self, selected_indices))
 
-    # Sempre processa todas as plantas do JSON, na ordem
-    selected_indices = list(range(len(self.ID_PLANT)))
-    log(self, "Processando todas as plantas do JSON, na ordem definida.")
+def prepare_plant_session(self):
+    """
+    Ordena as plantas do Room (self.ID_PLANT/POS_X_PLANT/POS_Y_PLANT) pelo
+    menor tempo de deslocamento e cria a pasta da sessão. Retorna a ordem.
+    """
+    # Processa todas as plantas do JSON, na ordem de menor tempo de deslocamento
+    coords = list(zip(self.POS_X_PLANT, self.POS_Y_PLANT))
+    ordem, t_rota, t_json = otimizar_rota(coords, load_estimator())
+    selected_indices = [int(i) for i in ordem]
+    log(self, "Rota otimizada: " + " -> ".join(self.ID_PLANT[i] for i in selected_indices))
+    log_route_estimate(self, t_rota, t_json)
 
     # Cria pasta com data/hora
-    
     now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     self.session_dir = os.path.join("output_images", now)
     if not os.path.exists(self.session_dir):
         os.makedirs(self.session_dir)
     log(self, f"Imagens serão salvas em: {self.session_dir}")
+    return selected_indices
 
+def start_worker(self, alvo):
+    """Trava os botões, lê as opções da interface e executa alvo em uma thread."""
     self.start_button.config(state='disabled')
     self.cancel_button.config(state='normal')
+    self.force_home_requested = self.force_home_var.get() if hasattr(self, "force_home_var") else False
+    self.room = self.room_var.get() if hasattr(self, "room_var") else None
     self.running = True
-    
-    self.thread = threading.Thread(
-        target=lambda: run_process(self, selected_indices))
+
+    self.thread = threading.Thread(target=alvo)
     self.thread.daemon = True
     self.thread.start()
 
+def log_route_estimate(self, t_rota, t_original):
+    economia = t_original - t_rota
+    percentual = 100 * economia / t_original if t_original > 0 else 0
+    log(self, f"Deslocamento previsto: {t_rota:.1f} s (ordem original: {t_original:.1f} s, "
+              f"economia de {economia:.1f} s / {percentual:.0f}%)")
+
 def run_process(self, selected_indices):
     self.grbl = None
     self.cam = None
@@ -257,65 +512,67 @@ def run_process(self, selected_indices):
     with open("cfg.json", "r") as file:
         data = json.load(file)
 
-    PORT = data["port"]
-    BAUDRATE = data["baudrate"]
-
     log(self, "Iniciando comunicacao GRBL...")
     try:
-        self.grbl = serial.Serial(PORT, BAUDRATE, timeout=1)
-        time.sleep(2)
-        self.grbl.write(b"\r\n\r\n")
-        time.sleep(2)
-        self.grbl.flushInput()
-        log(self, "Conectado ao GRBL na porta: " + PORT)
+        connect_grbl(self, data)
+        log(self, "Conectado ao GRBL na porta: " + data["port"])
     except Exception as e:
         log(self, "Erro ao conectar na porta: " + str(e))
-        finalize(self)
+        finalize(self, falha=True)
         return
 
     log(self, "-> Iniciando Camera...")
-    self.cam = cv.VideoCapture(0, cv.CAP_DSHOW)
-    if not self.cam.isOpened():
-        log(self, "-> Erro ao abrir a câmera. Verifique a conexão...")
-        self.grbl.close()
-        finalize(self)
+    try:
+        connect_camera(self, data)
+    except Exception as e:
+        log(self, f"-> Erro ao abrir a câmera ({e}). Verifique a conexão...")
+        finalize(self, falha=True)
         return
-    else:
-        log(self, "-> Camera iniciada com sucesso...")
-    #define o tamanho da imagem
-    self.cam.set(3, 1920)
-    self.cam.set(4, 1080)
+    log(self, "-> Camera pronta")
+    start_writer(self, data)
+    start_manifest(self, data)
+    self.pipelined = data.get("pipelined_capture", True)
+    self.settle_time = data.get("settle_s", 0.0)
     
     
     num_plants = len(selected_indices)
     log(self, f"Processando {num_plants} plantas...")
     update_progress(self, 0, num_plants)
-    send_grbl(self, '$X')
-    wait_for_idle(self)
-    send_grbl(self, '$H')
-    wait_for_idle(self)
-    send_grbl(self, '$')
-    send_grbl(self, '?')
-    send_grbl(self, 'G1 F14000')
-
-    # Loop para as plantas do JSON, na ordem
-    for i, plant_idx in enumerate(selected_indices):
-        if not self.running:
-            break
-        log(self, "===============================================================")
-        log(self, f'Planta {i + 1} de {num_plants} - Deslocando para ' + self.ID_PLANT[plant_idx])
-        send_grbl(self, 'G1 X' + str(self.POS_X_PLANT[plant_idx]) + ' Y' + str(self.POS_Y_PLANT[plant_idx]))
-        wait_for_idle(self)
-        get_image(self, plant_idx)
-        update_progress(self, i + 1, num_plants)
+    try:
+        setup_grbl(self)
+    except GrblError as e:
+        log(self, f"Erro do GRBL na inicialização: {e}")
+        finalize(self, falha=True)
+        return
+    if not self.running:
+        # Cancelado durante a preparação
+        finalize(self)
+        return
 
-    update_progress(self, num_plants, num_plants)
-    log(self, "\nConcluído!")
+    previsao = start_route_forecast(
+        self, [(self.POS_X_PLANT[i], self.POS_Y_PLANT[i]) for i in selected_indices])
 
-    # Retorna para origem SEM capturar imagem
-    send_grbl(self, 'G0 X0 Y0')
-    wait_for_idle(self)
-    finalize(self)
+    # Plantas do JSON, na ordem planejada
+    alvos = [(self.POS_X_PLANT[plant_idx], self.POS_Y_PLANT[plant_idx],
+              f'Planta {i + 1} de {num_plants} - Deslocando para ' + self.ID_PLANT[plant_idx])
+             for i, plant_idx in enumerate(selected_indices)]
+    falha = False
+    try:
+        capture_route(self, alvos,
+                      lambda i, frame: save_plant_image(self, selected_indices[i], frame),
+                      previsao)
+        # Cancelado: finalize para a máquina sem voltar à origem
+        if self.running:
+            update_progress(self, num_plants, num_plants)
+            log(self, "\nConcluído!")
+
+            # Retorna para origem SEM capturar imagem
+            send_grbl(self, 'G0 X0 Y0')
+            wait_for_idle(self)
+    except GrblError as e:
+        log(self, f"Erro do GRBL, execução interrompida: {e}")
+        falha = True
+    finalize(self, falha)
 
 def captura_adensada_functions(self):
     """
@@ -333,209 +590,429 @@ def captura_adensada_functions(self):
     t = threading.Thread(target=run, daemon=True)
     t.start()
 
-def start_dense_process(self):
+def start_dense_process(self, retomar=None):
+    """
+    Inicia a captura adensada em uma nova pasta ou, com retomar, continua a
+    sessão interrompida dessa pasta a partir do primeiro ponto que falta.
+    """
     if self.running:
         return
+    if prepare_dense_session(self, retomar):
+        start_worker(self, lambda: run_dense_process(self, retomar is not None))
 
-    log(self, "Iniciando Captura Adensada (alta sobreposição)...")
-    # Cria pasta com data/hora
-    now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    self.session_dir = os.path.join("Fotos Adensadas", now)
-    if not os.path.exists(self.session_dir):
-        os.makedirs(self.session_dir)
-    log(self, f"Imagens adensadas serão salvas em: {self.session_dir}")
-
-    self.start_button.config(state='disabled')
-    self.cancel_button.config(state='normal')
-    self.running = True
-
-    self.thread = threading.Thread(
-        target=lambda: run_dense_process(self))
-    self.thread.daemon = True
-    self.thread.start()
-
-def run_dense_process(self):
+def prepare_dense_session(self, retomar=None):
+    """
+    Cria a pasta de uma nova sessão adensada ou confere a pasta a retomar.
+    Retorna False se a sessão não puder ser retomada.
+    """
+    if retomar:
+        faltando = [nome for nome in (ARQUIVO_SESSAO, ARQUIVO_ROTA_SESSAO)
+                    if not os.path.exists(os.path.join(retomar, nome))]
+        if faltando:
+            log(self, f"Sessão {retomar} não pode ser retomada: {', '.join(faltando)} ausente")
+            return False
+        log(self, f"Retomando Captura Adensada em: {retomar}")
+        self.session_dir = retomar
+    else:
+        log(self, "Iniciando Captura Adensada (alta sobreposição)...")
+        # Cria pasta com data/hora
+        now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.session_dir = os.path.join("Fotos Adensadas", now)
+        if not os.path.exists(self.session_dir):
+            os.makedirs(self.session_dir)
+        log(self, f"Imagens adensadas serão salvas em: {self.session_dir}")
+    return True
+
+def resume_dense_process(self):
+    """Escolhe a pasta de uma sessão adensada interrompida e a retoma."""
+    from tkinter import filedialog
+    pasta = filedialog.askdirectory(title="Sessão a retomar", initialdir="Fotos Adensadas")
+    if pasta:
+        start_dense_process(self, retomar=pasta)
+
+def run_dense_process(self, retomar=False):
     self.grbl = None
     self.cam = None
 
     with open("cfg.json", "r") as file:
         data = json.load(file)
-
-    PORT = data["port"]
-    BAUDRATE = data["baudrate"]
+    # Na retomada valem o modo e a rota gravados na pasta da sessão
+    sessao = carregar_sessao(self.session_dir) if retomar else None
 
     log(self, "Iniciando comunicacao GRBL...")
     try:
-        self.grbl = serial.Serial(PORT, BAUDRATE, timeout=1)
-        time.sleep(2)
-        self.grbl.write(b"\r\n\r\n")
-        time.sleep(2)
-        self.grbl.flushInput()
-        log(self, "Conectado ao GRBL na porta: " + PORT)
+        connect_grbl(self, data)
+        log(self, "Conectado ao GRBL na porta: " + data["port"])
     except Exception as e:
         log(self, "Erro ao conectar na porta: " + str(e))
-        finalize(self)
+        finalize(self, falha=True)
         return
 
     log(self, "-> Iniciando Camera...")
-    self.cam = cv.VideoCapture(0, cv.CAP_DSHOW)
-    if not self.cam.isOpened():
-        log(self, "-> Erro ao abrir a câmera. Verifique a conexão...")
-        self.grbl.close()
-        finalize(self)
+    # Em movimento o frame é escolhido depois do cruzamento: buffer maior
+    flyby = (sessao["modo"] if sessao else data.get("dense_mode", "stop")) == "flyby"
+    try:
+        connect_camera(self, data, tamanho=8 if flyby else 4)
+    except Exception as e:
+        log(self, f"-> Erro ao abrir a câmera ({e}). Verifique a conexão...")
+        finalize(self, falha=True)
         return
+    log(self, "-> Camera pronta")
+    start_writer(self, data)
+    start_manifest(self, data)
+    self.pipelined = data.get("pipelined_capture", True)
+    self.settle_time = data.get("settle_s", 0.0)
+
+    rota_sessao = os.path.join(self.session_dir, ARQUIVO_ROTA_SESSAO)
+    if retomar:
+        rota = carregar_rota(rota_sessao)
+        concluidos = pontos_concluidos(self.session_dir)
+        log(self, f"{len(concluidos)} de {len(rota)} pontos já capturados e verificados")
     else:
-        log(self, "-> Camera iniciada com sucesso...")
-    self.cam.set(3, 1920)
-    self.cam.set(4, 1080)
+        # Lê a rota (pontos.npy via mmap; o pontos.json antigo continua aceito)
+        caminho_rota = localizar_rota(data.get("route_file", ARQUIVO_ROTA))
+        try:
+            rota = carregar_rota(caminho_rota)
+        except Exception as e:
+            log(self, f"Erro ao ler {caminho_rota}: {e}")
+            finalize(self, falha=True)
+            return
 
+        if len(rota) == 0:
+            log(self, f"Nenhuma coordenada encontrada em {caminho_rota}!")
+            finalize(self, falha=True)
+            return
 
-    # Lê coordenadas do pontos.json
+        if not flyby:
+            # Reordena os pontos pelo menor tempo de deslocamento (mantém a ordem do
+            # arquivo se ela já for a melhor, como no zig-zag gerado pela interface)
+            ordem, t_rota, t_original = otimizar_rota(
+                np.column_stack([rota["X"], rota["Y"]]), load_estimator())
+            rota = rota[ordem]
+            log_route_estimate(self, t_rota, t_original)
+        # Rota planejada e modo ficam na sessão para uma eventual retomada
+        salvar_rota(rota, rota_sessao)
+        salvar_sessao(self.session_dir, modo="flyby" if flyby else "stop", rota=caminho_rota,
+                      inicio=datetime.datetime.now().isoformat(timespec="seconds"), pontos=len(rota))
+        concluidos = {}
+
+    # Índices (na rota da sessão) dos pontos que faltam, na ordem planejada
+    indices = [i for i in range(len(rota)) if i not in concluidos]
+    if not indices:
+        log(self, "Todos os pontos da sessão já foram capturados.")
+        finalize(self)
+        return
+    rota_total, rota = rota, rota[indices]
+    coords = list(zip(rota["X"].tolist(), rota["Y"].tolist()))
+    plantas = rota["plant"] if "plant" in rota.dtype.names else None
+    # Avanço por ponto (coluna F); pontos sem F usam o avanço padrão
+    feeds = [None] * len(rota)
+    if "F" in rota.dtype.names and np.isfinite(rota["F"]).any():
+        feeds = np.where(np.isfinite(rota["F"]), rota["F"], FEED_RATE).tolist()
+
+    total_imgs = len(rota_total)
+    log(self, f"Capturando {len(rota)} imagens adensadas conforme {rota_sessao}...")
+    update_progress(self, len(concluidos), total_imgs)
     try:
-        with open("pontos.json", "r") as f:
-            pontos = json.load(f)
-    except Exception as e:
-        log(self, f"Erro ao ler pontos.json: {e}")
+        setup_grbl(self)
+    except GrblError as e:
+        log(self, f"Erro do GRBL na inicialização: {e}")
+        finalize(self, falha=True)
+        return
+    if not self.running:
+        # Cancelado durante a preparação
         finalize(self)
         return
 
-    if not isinstance(pontos, list) or not pontos:
-        log(self, "Nenhuma coordenada encontrada em pontos.json!")
-        finalize(self)
+    if flyby:
+        captura = start_flyby(self, data)
+        # Cada linha do zig-zag (pontos alinhados, mesmo sentido) vira um só movimento
+        linhas = linhas_varredura(coords)
+        log(self, f"{len(linhas)} linhas de varredura")
+        previsao = PrevisaoExecucao(captura.tempos_trechos(coords, linhas))
+        log(self, f"Tempo de movimento previsto: {formatar_duracao(previsao.total_movimento)}")
+    else:
+        previsao = start_route_forecast(self, coords)
+
+    alvos = [(x, y, f"Adensada {indices[i]+1} de {total_imgs} - X={x:.2f} Y={y:.2f}", feeds[i])
+             for i, (x, y) in enumerate(coords)]
+    salvas = []
+
+    def salvar(i, frame, x_medido=None, y_medido=None):
+        x, y = coords[i]
+        # Pontos gerados por planta levam o id dela no nome e no EXIF
+        planta = plantas[i].decode("utf-8") if plantas is not None and plantas[i] else None
+        # Numeração pela posição na rota da sessão: estável entre retomadas
+        numero = indices[i] + 1
+        prefixo = f"adensada_{numero:04d}_{planta}" if planta else f"adensada_{numero:04d}"
+        nome = os.path.join(self.session_dir, f"{prefixo}_X{x:.2f}_Y{y:.2f}.jpg")
+        # Coordenadas X-LAT e Y-LONG vão para o EXIF na gravação em segundo plano;
+        # em movimento, vale a posição medida no meio da exposição
+        if x_medido is None:
+            x_medido, y_medido = self.stop_position
+            x_exif, y_exif = x, y
+        else:
+            x_exif, y_exif = x_medido, y_medido
+        momento = datetime.datetime.now()
+        ponto = int(rota["id"][i])
+        send_capture(self, nome, frame, {"x": x_exif, "y": y_exif, "planta": planta,
+                                         "momento": momento},
+                     lambda tamanho, crc, **extras: self.manifesto.registrar(
+                         nome, x, y, x_medido, y_medido, planta, ponto, momento,
+                         indices[i], tamanho, crc, **extras))
+        log(self, f"Imagem adensada enviada para gravação: {nome}")
+        salvas.append(nome)
+
+    def salvar_em_movimento(i, frame, x, y, instante):
+        if self.camera_service.extras:
+            # Câmeras extras: o frame de cada uma com início de exposição mais
+            # perto do da principal (instante é o meio da exposição)
+            inicio = instante - captura.exposicao_s / 2
+            self.stop_frames = self.camera_service.capturar(
+                inicio, proximo=True, servicos=self.camera_service.extras)
+            self.stop_frames[self.camera_service.principal.nome] = (frame, inicio)
+        update_image(self, frame, f"Adensada {indices[i]+1} - X={x:.2f} Y={y:.2f}")
+        salvar(i, frame, x, y)
+        update_progress(self, len(concluidos) + len(salvas), total_imgs,
+                        previsao.restante(len(salvas)))
+
+    falha = False
+    try:
+        if flyby:
+            captura.executar(coords, linhas, salvar_em_movimento)
+        else:
+            capture_route(self, alvos, salvar, previsao)
+        # Cancelado: finalize para a máquina sem voltar à origem
+        if self.running:
+            update_progress(self, len(concluidos) + len(salvas), total_imgs)
+            log(self, "\nCaptura Adensada Concluída!")
+            send_grbl(self, 'G0 X0 Y0')
+            wait_for_idle(self)
+    except GrblError as e:
+        log(self, f"Erro do GRBL, execução interrompida: {e}")
+        falha = True
+    finalize(self, falha)
+
+def gerar_pontos_adensados(self, frontal=None, lateral=None):
+    """
+    Gera os pontos adensados a partir do campo de visão calibrado da câmera e
+    das regiões de cobertura do cfg.json, salva o arquivo de rota (pontos.npy)
+    e mostra popup para confirmação.
+    frontal/lateral: sobreposição entre imagens na varredura (Y) e entre
+    colunas (X), de 0 a 1; padrão do bloco "coverage" do cfg.json
+    """
+    import tkinter.messagebox as msg
+    with open("cfg.json", "r") as f:
+        data = json.load(f)
+    try:
+        rota, campo, regioes, descricao = plan_dense_grid(data, frontal, lateral)
+    except ValueError as e:
+        msg.showerror("Cobertura", str(e))
         return
+    coords = np.column_stack([rota["X"], rota["Y"]])
+    preview_grid(coords, f'Pontos Adensados: {len(rota)} pontos\n{descricao}',
+                 campo, regioes)
+    confirm_and_save_route(rota, f"Grade de {len(rota)} pontos gerada ({descricao}).")
 
-    total_imgs = len(pontos)
-    log(self, f"Capturando {total_imgs} imagens adensadas conforme pontos.json...")
-    update_progress(self, 0, total_imgs)
-    send_grbl(self, '$X')
-    wait_for_idle(self)
-    send_grbl(self, '$H')
-    wait_for_idle(self)
-    send_grbl(self, '$')
-    send_grbl(self, '?')
-    send_grbl(self, 'G1 F14000')
+def plan_dense_grid(data, frontal=None, lateral=None):
+    """
+    Grade de cobertura da mesa pelo cfg.json. Retorna (rota, campo, regiões,
+    descrição). Levanta ValueError se o campo de visão ou as regiões forem
+    inválidos.
+    """
+    cobertura = data.get("coverage", {})
+    frontal = cobertura.get("forward_overlap", 0.6) if frontal is None else frontal
+    lateral = cobertura.get("side_overlap", 0.3) if lateral is None else lateral
+    regioes = cobertura.get("regions", [[-900.0, -2000.0, 0.0, 0.0]])
+    campo = campo_visao_cfg(data)
+    coords, _ = planejar_cobertura(regioes, campo, frontal, lateral)
+    rota = criar_rota(np.round(coords, 3))
+    descricao = (f"campo {campo[0]:.0f}x{campo[1]:.0f}mm, sobreposição "
+                 f"{100 * frontal:.0f}%/{100 * lateral:.0f}%")
+    return rota, campo, regioes, descricao
+
+def gerar_pontos_plantas(self, raio=None):
+    """
+    Gera micro-grades de alta sobreposição só em volta das plantas do Room
+    selecionado, encadeadas pela rota otimizada entre elas. Cada ponto leva o
+    id da planta ("plant"), gravado no EXIF das imagens.
+    raio: raio de captura em volta de cada vaso (mm); padrão do cfg.json
+    """
+    import tkinter.messagebox as msg
+    with open("cfg.json", "r") as f:
+        data = json.load(f)
+    try:
+        rota, campo, regioes, descricao = plan_plant_grid(data, self.room_var.get(), raio)
+    except ValueError as e:
+        msg.showerror("Cobertura", str(e))
+        return
+    coords = np.column_stack([rota["X"], rota["Y"]])
+    preview_grid(coords, f'Pontos por Planta\n{descricao.splitlines()[0]}',
+                 campo, regioes)
+    confirm_and_save_route(rota, descricao)
 
-    img_count = 0
-    for pt in pontos:
-        if not self.running:
-            break
-        x = pt.get("X", 0.0)
-        y = pt.get("Y", 0.0)
-        log(self, f"Adensada {img_count+1} de {total_imgs} - X={x:.2f} Y={y:.2f}")
-        send_grbl(self, f'G1 X{x:.2f} Y{y:.2f}')
-        wait_for_idle(self)
-        self.cam.read()
-        time.sleep(0.1)
-        ret, frame = self.cam.read()
-        if not ret:
-            log(self, f"Erro ao capturar imagem adensada {img_count+1}")
-            continue
-        nome = os.path.join(self.session_dir, f"adensada_{img_count+1:04d}_X{x:.2f}_Y{y:.2f}.jpg")
-        cv.imwrite(nome, frame)
-        # Salva coordenadas X-LAT e Y-LONG no EXIF imediatamente após a captura
-        try:
-            import piexif
-            from PIL import Image
-            pil_img = Image.open(nome)
-            # Cria EXIF mínimo se não existir
-            try:
-                exif_dict = piexif.load(nome)
-            except Exception:
-                exif_dict = {"0th":{}, "Exif":{}, "GPS":{}, "1st":{}, "thumbnail":None}
-            # Concatena ambos os campos no UserComment
-            user_comment = f"X-LAT:{x:.2f};Y-LONG:{y:.2f}"
-            exif_dict['Exif'][piexif.ExifIFD.UserComment] = user_comment.encode('utf-8')
-            exif_bytes = piexif.dump(exif_dict)
-            pil_img.save(nome, exif=exif_bytes)
-            pil_img.close()
-        except Exception as e:
-            log(self, f"Não foi possível gravar EXIF X-LAT/Y-LONG: {e}")
-        log(self, f"Imagem adensada salva: {nome}")
-        img_count += 1
-        update_progress(self, img_count, total_imgs)
-
-    update_progress(self, img_count, total_imgs)
-    log(self, "\nCaptura Adensada Concluída!")
-    send_grbl(self, 'G0 X0 Y0')
-    wait_for_idle(self)
-    finalize(self)
-
-def gerar_pontos_adensados(self, step=100):
-    """
-    Gera pontos adensados em padrão zig-zag, salva em pontos.json e mostra popup para confirmação.
-    step: espaçamento entre pontos (mm)
-    """
-    width = 900
-    length = 2000
-    points = []
-    pid = 1
-    xs = list(range(0, width + 1, step))
-    ys = list(range(0, length + 1, step))
-    for xi, x in enumerate(xs):
-        linha = []
-        y_iter = ys if xi % 2 == 0 else ys[::-1]
-        for y in y_iter:
-            linha.append({
-                "id": pid,
-                "X": float(-x),
-                "Y": float(-y)
-            })
-            pid += 1
-        points.extend(linha)
-    # Visualização: quadrado de borda preta e 'x' azul dentro
+def plan_plant_grid(data, sala, raio=None):
+    """
+    Micro-grades em volta das plantas da sala pelo cfg.json. Retorna (rota,
+    campo, regiões em volta dos vasos, descrição). Levanta ValueError se o
+    campo de visão ou as regiões forem inválidos.
+    """
+    cobertura = data.get("coverage", {})
+    raio = cobertura.get("plant_radius_mm", 60.0) if raio is None else raio
+    frontal = cobertura.get("plant_forward_overlap", 0.8)
+    lateral = cobertura.get("plant_side_overlap", 0.8)
+    plantas = data[sala]
+    campo = campo_visao_cfg(data)
+    coords, indices = micro_grades_plantas(plantas, raio, campo, frontal, lateral, load_estimator())
+    mesa, _ = planejar_cobertura(cobertura.get("regions", [[-900.0, -2000.0, 0.0, 0.0]]),
+                                 campo, frontal, lateral)
+    ids_plantas = np.array([str(p["id"]) for p in plantas])
+    rota = criar_rota(np.round(coords, 3), plantas=ids_plantas[indices])
+    descricao = (f"{len(rota)} pontos gerados ({len(plantas)} plantas do {sala}, raio {raio:.0f}mm, "
+                 f"sobreposição {100 * frontal:.0f}%/{100 * lateral:.0f}%).\n"
+                 f"A mesa inteira com a mesma sobreposição teria {len(mesa)} pontos.")
+    return rota, campo, regioes_plantas(plantas, raio), descricao
+
+def confirm_and_save_route(rota, descricao):
+    """Salva a rota no arquivo do cfg.json ("route_file", padrão pontos.npy)."""
+    import tkinter.messagebox as msg
+    with open("cfg.json", "r") as f:
+        caminho = json.load(f).get("route_file", ARQUIVO_ROTA)
+    confirm = msg.askyesno("Confirmação de Grade", f"{descricao}\n\nA visualização foi exibida.\n\nDeseja salvar {caminho}?")
+    if confirm:
+        salvar_rota(rota, caminho)
+        msg.showinfo("Pontos Gerados", f"{len(rota)} pontos salvos em {caminho}.")
+    else:
+        msg.showinfo("Cancelado", "Geração de pontos cancelada.")
+
+def preview_grid(coords, titulo, campo=(100.0, 100.0), regioes=None):
+    """
+    Mostra a grade (campo de visão de borda preta e 'x' azul em cada ponto),
+    as regiões de cobertura, a ordem de visita e o deslocamento previsto.
+    Tudo é montado com NumPy em poucas camadas, então grades de 100 mil
+    pontos abrem em menos de 1 s.
+    """
+    import matplotlib.pyplot as plt
+    pontos = -np.asarray(coords, dtype=float).reshape(-1, 2)
+    n = len(pontos)
+    meio = np.asarray(campo, dtype=float) / 2
     fig, ax = plt.subplots(figsize=(5, 10))
-    for p in points:
-        x = -p['X']
-        y = -p['Y']
-        # Quadrado de borda preta
-        rect = patches.Rectangle(
-            (x - 50, y - 50), 100, 100,
-            linewidth=2, edgecolor='black', facecolor='none', alpha=1.0
-        )
-        ax.add_patch(rect)
-        # 'X' azul
-        ax.plot([x - 40, x + 40], [y - 40, y + 40], color='blue', linewidth=2)
-        ax.plot([x - 40, x + 40], [y + 40, y - 40], color='blue', linewidth=2)
-    ax.set_xlim(-50, width + 50)
-    ax.set_ylim(-50, length + 50)
+
+    cantos = [pontos - meio, pontos + meio, np.zeros((1, 2))]
+    if regioes:
+        retangulos = -np.asarray(regioes, dtype=float).reshape(-1, 2, 2)
+        cantos.append(retangulos.reshape(-1, 2))
+        # Regiões de cobertura em verde tracejado
+        contorno = np.array([[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]])
+        for (x0, y0), (x1, y1) in retangulos:
+            ax.plot(x0 + contorno[:, 0] * (x1 - x0), y0 + contorno[:, 1] * (y1 - y0),
+                    color='green', linestyle='--', linewidth=1)
+    cantos = np.vstack(cantos)
+    minimo, maximo = cantos.min(axis=0) - 0.05 * meio, cantos.max(axis=0) + 0.05 * meio
+
+    if n <= 2000:
+        # Campo de borda preta e 'x' azul: um único traço por camada, com
+        # NaN separando os contornos de pontos vizinhos
+        contorno = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1], [-1, -1], [np.nan, np.nan]]) * meio
+        quadrados = (pontos[:, None, :] + contorno[None, :, :]).reshape(-1, 2)
+        ax.plot(quadrados[:, 0], quadrados[:, 1], color='black', linewidth=2 if n <= 300 else 1)
+        diagonais = np.array([[-1, -1], [1, 1], [np.nan, np.nan],
+                              [-1, 1], [1, -1], [np.nan, np.nan]]) * 0.8 * meio
+        cruzes = (pontos[:, None, :] + diagonais[None, :, :]).reshape(-1, 2)
+        ax.plot(cruzes[:, 0], cruzes[:, 1], color='blue', linewidth=2 if n <= 300 else 1)
+    else:
+        # Grades finas: os marcadores se sobrepõem, então são rasterizados na
+        # resolução da tela (custo proporcional aos pixels, não aos pontos)
+        tamanho_px = np.array([fig.get_figwidth(), fig.get_figheight()]) * fig.dpi
+        tamanho_px = tamanho_px.astype(int)
+        mm_por_px = (maximo - minimo) / tamanho_px
+        imagem = _rasterize_markers(pontos, minimo, mm_por_px, tamanho_px, meio)
+        ax.imshow(imagem, origin='lower', interpolation='nearest', aspect='auto',
+                  extent=(minimo[0], maximo[0], minimo[1], maximo[1]))
+    # Ordem de visita: origem -> pontos -> origem
+    caminho = np.vstack([[0.0, 0.0], pontos, [0.0, 0.0]])
+    ax.plot(caminho[:, 0], caminho[:, 1], color='red', linewidth=0.8, alpha=0.6)
+
+    estimador = load_estimator()
+    distancia = float(np.hypot(*np.diff(caminho, axis=0).T).sum())
+    tempo = float(estimador.tempos_rota(-pontos).sum())
+    ax.set_xlim(minimo[0], maximo[0])
+    ax.set_ylim(minimo[1], maximo[1])
     ax.set_aspect('auto')
     ax.set_xlabel('X (mm)')
     ax.set_ylabel('Y (mm)')
-    ax.set_title(f'Visualização dos Pontos Adensados ({len(points)} pontos, passo {step}mm)')
+    ax.set_title(f'{titulo}\nPercurso: {distancia / 1000:.1f} m, '
+                 f'deslocamento previsto {formatar_duracao(tempo)}', fontsize=9)
     plt.tight_layout()
     plt.show()
-    confirm = msg.askyesno("Confirmação de Grade", f"Grade de pontos gerada com passo {step}mm.\n\nA visualização foi exibida.\n\nDeseja salvar pontos.json?")
-    if confirm:
-        with open("pontos.json", "w") as f:
-            json.dump(points, f, indent=4)
-        msg.showinfo("Pontos Gerados", f"{len(points)} pontos salvos em pontos.json.")
-    else:
-        msg.showinfo("Cancelado", "Geração de pontos cancelada.")
+
+def _rasterize_markers(pontos, origem, mm_por_px, tamanho_px, meio):
+    """Imagem RGBA com o campo de visão (borda preta) e o 'x' azul de cada ponto."""
+    largura_px, altura_px = int(tamanho_px[0]), int(tamanho_px[1])
+    centros = np.zeros((altura_px, largura_px), dtype=bool)
+    coluna = np.floor((pontos[:, 0] - origem[0]) / mm_por_px[0]).astype(np.int64)
+    linha = np.floor((pontos[:, 1] - origem[1]) / mm_por_px[1]).astype(np.int64)
+    dentro = (coluna >= 0) & (coluna < largura_px) & (linha >= 0) & (linha < altura_px)
+    centros[linha[dentro], coluna[dentro]] = True
+
+    def dilatar(deslocamentos):
+        # OU de cópias deslocadas do mapa de centros (um deslocamento por pixel do marcador)
+        saida = np.zeros_like(centros)
+        for dy, dx in set(deslocamentos):
+            saida[max(dy, 0):altura_px + min(dy, 0), max(dx, 0):largura_px + min(dx, 0)] |= \
+                centros[max(-dy, 0):altura_px + min(-dy, 0), max(-dx, 0):largura_px + min(-dx, 0)]
+        return saida
+
+    rx = max(1, int(round(meio[0] / mm_por_px[0])))
+    ry = max(1, int(round(meio[1] / mm_por_px[1])))
+    borda = [(dy, dx) for dx in range(-rx, rx + 1) for dy in (-ry, ry)]
+    borda += [(dy, dx) for dy in range(-ry, ry + 1) for dx in (-rx, rx)]
+    passos = max(rx, ry)
+    cruz = [(int(round(0.8 * ry * k / passos)), int(round(0.8 * rx * k / passos) * sinal))
+            for k in range(-passos, passos + 1) for sinal in (1, -1)]
+
+    imagem = np.zeros((altura_px, largura_px, 4), dtype=np.uint8)
+    imagem[dilatar(borda)] = (0, 0, 0, 255)
+    imagem[dilatar(cruz)] = (0, 0, 255, 255)
+    return imagem
+
 def criar_interface_gerar_pontos(self):
     """
     Adiciona botão e entrada para gerar pontos adensados na interface principal.
     """
+    import tkinter as tk
     from tkinter import ttk
     frame = tk.Frame(self.root)
     frame.pack(pady=10)
-    tk.Label(frame, text="Passo (mm):").pack(side=tk.LEFT)
-    passo_entry = tk.Entry(frame, width=5)
-    passo_entry.insert(0, "100")
-    passo_entry.pack(side=tk.LEFT)
+    with open("cfg.json", "r") as f:
+        cobertura = json.load(f).get("coverage", {})
+    tk.Label(frame, text="Sobreposição frontal (%):").pack(side=tk.LEFT)
+    frontal_entry = tk.Entry(frame, width=4)
+    frontal_entry.insert(0, f'{100 * cobertura.get("forward_overlap", 0.6):.0f}')
+    frontal_entry.pack(side=tk.LEFT)
+    tk.Label(frame, text="lateral (%):").pack(side=tk.LEFT)
+    lateral_entry = tk.Entry(frame, width=4)
+    lateral_entry.insert(0, f'{100 * cobertura.get("side_overlap", 0.3):.0f}')
+    lateral_entry.pack(side=tk.LEFT)
     def on_gerar():
         try:
-            step = int(passo_entry.get())
+            frontal = float(frontal_entry.get()) / 100
+            lateral = float(lateral_entry.get()) / 100
         except Exception:
-            step = 100
-        gerar_pontos_adensados(self, step)
+            frontal = lateral = None
+        gerar_pontos_adensados(self, frontal, lateral)
     btn = ttk.Button(frame, text="Gerar Pontos Adensados", command=on_gerar)
     btn.pack(side=tk.LEFT)
+    btn_plantas = ttk.Button(frame, text="Gerar Pontos por Planta",
+                             command=lambda: gerar_pontos_plantas(self))
+    btn_plantas.pack(side=tk.LEFT, padx=5)
 
 # --- Classes utilitárias (de camera.py e cnc_controller.py) ---
 class Camera:
     def get_field_of_view_mm(self):
-        """Retorna o campo de visão da câmera em mm."""
-        return 10.0  # valor exemplo
+        """Retorna o campo de visão da câmera em X (mm), da calibração do cfg.json."""
+        with open("cfg.json", "r") as f:
+            return campo_visao_cfg(json.load(f))[0]
 
     def get_num_capturas_x(self):
         """Retorna o número de capturas na linha (exemplo fixo)."""
@@ -547,6 +1024,7 @@ class Camera:
 
     def capturar_imagem(self):
         """Captura e retorna uma imagem PIL.Image (stub: imagem branca)."""
+        from PIL import Image
         return Image.new('RGB', (1024, 768), color='white')
 
 class CNCController:
@@ -572,26 +1050,15 @@ class CNCController:
 
 # --- Funções de captura adensada (de capture_dense.py) ---
 import logging
-import piexif
 from pathlib import Path
 
 def salvar_imagem_com_exif(img, filepath, filename, dpi, x, y):
     """
     Salva a imagem com metadados EXIF personalizados.
     """
-    # Formato customizado: X-LAT e Y-LONG no UserComment
-    user_comment = f"X-LAT:{x};Y-LONG:{y}"
-    exif_dict = {
-        "0th": {
-            piexif.ImageIFD.ImageDescription: filename.encode(),
-            piexif.ImageIFD.XResolution: (dpi, 1),
-            piexif.ImageIFD.YResolution: (dpi, 1),
-        },
-        "Exif": {
-            piexif.ExifIFD.UserComment: user_comment.encode('utf-8')
-        }
-    }
-    exif_bytes = piexif.dump(exif_dict)
+    # Mesmo bloco EXIF das capturas da CNC (X-LAT/Y-LONG, resolução, data/hora)
+    exif_bytes = montar_exif(x, y, dpi=dpi, largura=img.width, altura=img.height,
+                             descricao=filename)
     img.save(filepath, "jpeg", exif=exif_bytes)
 
 def captura_adensada():
@@ -0,0 +1,224 @@
+"""
+Gravação assíncrona das imagens capturadas.
+
+A rotina de captura entrega o frame e seus metadados a uma fila limitada,
+drenada por um pool de threads que codificam e gravam os arquivos. Assim o
+pórtico não fica parado esperando disco e compressão JPEG; quando a fila
+enche, a captura espera (contrapressão) e o uso de memória fica limitado a
+`profundidade` frames.
+
+Os arquivos das câmeras extras (bandas multiespectrais) passam pela mesma
+fila: PNG sem perdas ou .npy com todas as bandas, sem EXIF.
+"""
+
+import datetime
+import functools
+import io
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import cv2 as cv
+import numpy as np
+
+QUALIDADE_JPEG = 95
+
+
+def montar_exif(x=None, y=None, planta=None, dpi=None, largura=None, altura=None,
+                momento=None, descricao=None):
+    """
+    Monta o bloco EXIF em memória: coordenadas X-LAT/Y-LONG (e a planta) no
+    UserComment, resolução, dimensões e data/hora da captura.
+    """
+    # Importado aqui: só a gravação de JPEG precisa do piexif, não a
+    # geração de grades nem o import de functions na execução sem interface
+    import piexif
+    momento = momento or datetime.datetime.now()
+    data_hora = momento.strftime("%Y:%m:%d %H:%M:%S").encode()
+    zeroth = {piexif.ImageIFD.DateTime: data_hora}
+    exif = {
+        piexif.ExifIFD.DateTimeOriginal: data_hora,
+        piexif.ExifIFD.SubSecTimeOriginal: f"{momento.microsecond // 1000:03d}".encode(),
+    }
+    if dpi:
+        zeroth[piexif.ImageIFD.XResolution] = (int(dpi), 1)
+        zeroth[piexif.ImageIFD.YResolution] = (int(dpi), 1)
+        zeroth[piexif.ImageIFD.ResolutionUnit] = 2  # polegadas
+    if largura and altura:
+        exif[piexif.ExifIFD.PixelXDimension] = int(largura)
+        exif[piexif.ExifIFD.PixelYDimension] = int(altura)
+    if descricao or planta:
+        zeroth[piexif.ImageIFD.ImageDescription] = str(descricao or planta).encode()
+    if x is not None and y is not None:
+        # Formato customizado: X-LAT e Y-LONG no UserComment
+        user_comment = f"X-LAT:{x:.2f};Y-LONG:{y:.2f}"
+        if planta:
+            user_comment += f";PLANTA:{planta}"
+        exif[piexif.ExifIFD.UserComment] = user_comment.encode('utf-8')
+    return piexif.dump({"0th": zeroth, "Exif": exif})
+
+
+def inserir_exif(jpeg, exif_bytes):
+    """
+    Insere o segmento APP1 (EXIF) nos bytes de um JPEG já codificado, sem
+    decodificar a imagem: logo após o SOI, ou após o APP0 (JFIF) se houver.
+    """
+    if jpeg[:2] != b"\xff\xd8":
+        raise ValueError("Dados não são um JPEG")
+    app1 = b"\xff\xe1" + struct.pack(">H", len(exif_bytes) + 2) + exif_bytes
+    posicao = 2
+    if jpeg[2:4] == b"\xff\xe0":
+        posicao = 4 + struct.unpack(">H", jpeg[4:6])[0]
+    return jpeg[:posicao] + app1 + jpeg[posicao:]
+
+
+def codificar_jpeg(frame, exif_bytes=None, qualidade=QUALIDADE_JPEG):
+    """Codifica o frame uma única vez e anexa o EXIF, retornando os bytes do arquivo."""
+    ok, dados = cv.imencode(".jpg", frame, [cv.IMWRITE_JPEG_QUALITY, qualidade])
+    if not ok:
+        raise RuntimeError("Falha ao codificar JPEG")
+    dados = dados.tobytes()
+    return inserir_exif(dados, exif_bytes) if exif_bytes else dados
+
+
+def codificar_arquivo(caminho, frame, metadados=None):
+    """
+    Bytes do arquivo conforme a extensão: JPEG com EXIF (padrão), .npy com o
+    array inteiro (qualquer número de bandas) ou PNG/TIFF sem perdas.
+    """
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao == ".npy":
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(frame))
+        return buffer.getvalue()
+    if extensao in (".png", ".tif", ".tiff"):
+        ok, dados = cv.imencode(extensao, frame)
+        if not ok:
+            raise RuntimeError(f"Falha ao codificar {extensao}")
+        return dados.tobytes()
+    altura, largura = frame.shape[:2]
+    exif_bytes = montar_exif(largura=largura, altura=altura, **(metadados or {}))
+    return codificar_jpeg(frame, exif_bytes)
+
+
+def gravar_imagem(caminho, frame, metadados=None):
+    """
+    Codifica e grava um frame (JPEG com EXIF) em uma única passada.
+    metadados: dicionário com as chaves aceitas por montar_exif
+    (x, y, planta, dpi, momento, descricao).
+    Retorna (tamanho em bytes, CRC-32) do arquivo gravado.
+    """
+    dados = codificar_arquivo(caminho, frame, metadados)
+    with open(caminho, "wb") as f:
+        f.write(dados)
+    return len(dados), zlib.crc32(dados)
+
+
+class GravadorImagens:
+    """
+    Pool de gravação com fila limitada.
+
+    trabalhadores: threads de codificação/gravação (o OpenCV libera o GIL)
+    profundidade: frames aguardando gravação antes de bloquear a captura
+    log: função chamada com mensagens de erro
+    """
+
+    def __init__(self, trabalhadores=2, profundidade=8, log=None):
+        self.profundidade = profundidade
+        self.log = log or (lambda mensagem: None)
+        self.fila = queue.Queue(maxsize=profundidade)
+        self.lock = threading.Lock()
+        self.gravadas = 0
+        self.falhas = 0
+        self.pico_fila = 0
+        self.latencia_total = 0.0
+        self.latencia_max = 0.0
+        self.espera_total = 0.0
+        self.threads = [threading.Thread(target=self._trabalhar, daemon=True)
+                        for _ in range(max(1, trabalhadores))]
+        for thread in self.threads:
+            thread.start()
+
+    def enviar(self, caminho, frame, metadados=None, ao_gravar=None):
+        """
+        Enfileira um frame para gravação; bloqueia se a fila estiver cheia.
+        ao_gravar: chamado com (tamanho, crc32) na thread de gravação depois
+        que o arquivo está no disco
+        """
+        inicio = time.monotonic()
+        self.fila.put((caminho, frame, metadados, ao_gravar))
+        espera = time.monotonic() - inicio
+        with self.lock:
+            self.espera_total += espera
+            self.pico_fila = max(self.pico_fila, self.fila.qsize())
+
+    def enviar_conjunto(self, itens, ao_gravar=None):
+        """
+        Enfileira os arquivos de uma mesma captura [(caminho, frame,
+        metadados)], ex.: a imagem RGB e as bandas multiespectrais.
+        ao_gravar: chamado uma única vez, com {caminho: (tamanho, crc32)},
+        quando todos estiverem no disco; se algum falhar, não é chamado
+        """
+        gravados = {}
+        lock = threading.Lock()
+
+        def gravado(caminho, tamanho, crc):
+            with lock:
+                gravados[caminho] = (tamanho, crc)
+                completo = len(gravados) == len(itens)
+            if completo and ao_gravar:
+                ao_gravar(dict(gravados))
+
+        for caminho, frame, metadados in itens:
+            self.enviar(caminho, frame, metadados, functools.partial(gravado, caminho))
+
+    def _trabalhar(self):
+        while True:
+            item = self.fila.get()
+            if item is None:
+                self.fila.task_done()
+                return
+            caminho, frame, metadados, ao_gravar = item
+            inicio = time.monotonic()
+            try:
+                gravado = gravar_imagem(caminho, frame, metadados)
+                ok = True
+            except Exception as e:
+                ok = False
+                self.log(f"Erro ao gravar {caminho}: {e}")
+            if ok and ao_gravar:
+                try:
+                    ao_gravar(*gravado)
+                except Exception as e:
+                    self.log(f"Erro ao registrar {caminho}: {e}")
+            latencia = time.monotonic() - inicio
+            with self.lock:
+                if ok:
+                    self.gravadas += 1
+                    self.latencia_total += latencia
+                    self.latencia_max = max(self.latencia_max, latencia)
+                else:
+                    self.falhas += 1
+            self.fila.task_done()
+
+    @property
+    def pendentes(self):
+        return self.fila.qsize()
+
+    def finalizar(self):
+        """Grava tudo o que está na fila e encerra as threads."""
+        for _ in self.threads:
+            self.fila.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def resumo(self):
+        with self.lock:
+            media = 1000 * self.latencia_total / self.gravadas if self.gravadas else 0.0
+            return (f"Gravação: {self.gravadas} imagens, {self.falhas} falhas, "
+                    f"latência média {media:.0f} ms (máx {1000 * self.latencia_max:.0f} ms), "
+                    f"fila máx {self.pico_fila}/{self.profundidade}, "
+                    f"captura aguardou {self.espera_total:.1f} s")
@@ -0,0 +1,191 @@
+"""
+Índice espacial das capturas de todas as sessões.
+
+Os manifestos das sessões (manifesto.jsonl) são reunidos em um banco SQLite
+único, com cada imagem atribuída a uma célula de uma grade regular em mm. As
+consultas por raio, por retângulo ou pela planta selecionam primeiro as
+células candidatas pelo índice (cx, cy) e só então filtram as coordenadas
+exatas, sem abrir nenhuma imagem:
+
+    python indice_espacial.py reconstruir "Fotos Adensadas" output_images
+    python indice_espacial.py raio -450 -1200 30
+    python indice_espacial.py caixa -500 -1300 -400 -1100 --desde 2026-09-17
+    python indice_espacial.py planta B07 --room "Room B"
+"""
+
+import argparse
+import json
+import math
+import os
+import sqlite3
+
+from manifesto_sessao import ARQUIVO_MANIFESTO, ler_manifesto
+
+ARQUIVO_INDICE_ESPACIAL = "indice_espacial.sqlite"
+CELULA_MM = 50.0
+
+_COLUNAS = ("sessao", "arquivo", "ponto", "planta", "x_cmd", "y_cmd", "x", "y", "momento")
+
+
+class IndiceEspacial:
+    """
+    Banco de capturas indexado por grade.
+
+    caminho: arquivo SQLite (criado se não existir)
+    celula_mm: lado da célula da grade; um índice existente mantém o seu
+    """
+
+    def __init__(self, caminho=ARQUIVO_INDICE_ESPACIAL, celula_mm=CELULA_MM):
+        self.caminho = caminho
+        self.conexao = sqlite3.connect(caminho)
+        self.conexao.row_factory = sqlite3.Row
+        with self.conexao:
+            self.conexao.execute("CREATE TABLE IF NOT EXISTS parametros (nome TEXT PRIMARY KEY, valor REAL)")
+            self.conexao.execute(
+                "CREATE TABLE IF NOT EXISTS capturas (sessao TEXT, arquivo TEXT PRIMARY KEY, "
+                "ponto INTEGER, planta TEXT, x_cmd REAL, y_cmd REAL, x REAL, y REAL, "
+                "momento TEXT, cx INTEGER, cy INTEGER)")
+            self.conexao.execute("CREATE INDEX IF NOT EXISTS capturas_celula ON capturas (cx, cy)")
+            self.conexao.execute("CREATE INDEX IF NOT EXISTS capturas_planta ON capturas (planta, momento)")
+            self.conexao.execute("CREATE INDEX IF NOT EXISTS capturas_sessao ON capturas (sessao)")
+            self.conexao.execute("INSERT OR IGNORE INTO parametros VALUES ('celula_mm', ?)", (celula_mm,))
+        self.celula_mm = self.conexao.execute(
+            "SELECT valor FROM parametros WHERE nome = 'celula_mm'").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def fechar(self):
+        self.conexao.close()
+
+    def _celula(self, valor):
+        return math.floor(valor / self.celula_mm)
+
+    def adicionar_manifesto(self, caminho):
+        """
+        Indexa (ou reindexa) as capturas de um manifesto. A posição usada é a
+        reportada pelo GRBL; sem ela, a comandada. Retorna quantas entraram.
+        """
+        linhas = []
+        sessoes = set()
+        for registro in ler_manifesto(caminho):
+            x = registro["x"] if registro.get("x") is not None else registro["x_cmd"]
+            y = registro["y"] if registro.get("y") is not None else registro["y_cmd"]
+            registro = dict(registro, x=x, y=y)
+            sessoes.add(registro["sessao"])
+            linhas.append([registro.get(coluna) for coluna in _COLUNAS]
+                          + [self._celula(x), self._celula(y)])
+        with self.conexao:
+            self.conexao.executemany("DELETE FROM capturas WHERE sessao = ?", [(s,) for s in sessoes])
+            self.conexao.executemany(
+                f"INSERT OR REPLACE INTO capturas ({', '.join(_COLUNAS)}, cx, cy) "
+                f"VALUES ({', '.join('?' * (len(_COLUNAS) + 2))})", linhas)
+        return len(linhas)
+
+    def reconstruir(self, *pastas):
+        """Indexa todos os manifestos encontrados nas pastas. Retorna (manifestos, capturas)."""
+        manifestos = capturas = 0
+        for pasta in pastas:
+            for raiz, _, arquivos in os.walk(pasta):
+                if ARQUIVO_MANIFESTO in arquivos:
+                    capturas += self.adicionar_manifesto(os.path.join(raiz, ARQUIVO_MANIFESTO))
+                    manifestos += 1
+        return manifestos, capturas
+
+    def _consultar(self, xmin, ymin, xmax, ymax, condicao="", parametros=(),
+                   planta=None, desde=None, ate=None):
+        sql = ("SELECT * FROM capturas WHERE cx BETWEEN ? AND ? AND cy BETWEEN ? AND ? "
+               "AND x BETWEEN ? AND ? AND y BETWEEN ? AND ?")
+        valores = [self._celula(xmin), self._celula(xmax), self._celula(ymin), self._celula(ymax),
+                   xmin, xmax, ymin, ymax]
+        if condicao:
+            sql += " AND " + condicao
+            valores.extend(parametros)
+        if planta is not None:
+            sql += " AND planta = ?"
+            valores.append(planta)
+        if desde is not None:
+            sql += " AND momento >= ?"
+            valores.append(desde)
+        if ate is not None:
+            sql += " AND momento < ?"
+            valores.append(ate)
+        return [dict(linha) for linha in self.conexao.execute(sql + " ORDER BY momento", valores)]
+
+    def caixa(self, xmin, ymin, xmax, ymax, **filtros):
+        """
+        Capturas com centro no retângulo. filtros: planta, desde e ate
+        (data/hora ISO, ex. "2026-09-17", comparadas como texto).
+        """
+        return self._consultar(min(xmin, xmax), min(ymin, ymax), max(xmin, xmax), max(ymin, ymax),
+                               **filtros)
+
+    def raio(self, x, y, raio_mm, **filtros):
+        """Capturas com centro a até raio_mm de (x, y), da mais próxima para a mais distante."""
+        capturas = self._consultar(
+            x - raio_mm, y - raio_mm, x + raio_mm, y + raio_mm,
+            "(x - ?) * (x - ?) + (y - ?) * (y - ?) <= ?", (x, x, y, y, raio_mm * raio_mm),
+            **filtros)
+        return sorted(capturas, key=lambda c: (c["x"] - x) ** 2 + (c["y"] - y) ** 2)
+
+    def cobrindo(self, x, y, campo, **filtros):
+        """Capturas cujo campo de visão (largura, altura em mm) contém o ponto (x, y)."""
+        meia_largura, meia_altura = campo[0] / 2.0, campo[1] / 2.0
+        return self.caixa(x - meia_largura, y - meia_altura, x + meia_largura, y + meia_altura,
+                          **filtros)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consulta as capturas por coordenada")
+    parser.add_argument("--indice", default=ARQUIVO_INDICE_ESPACIAL)
+    sub = parser.add_subparsers(dest="operacao", required=True)
+    reconstruir = sub.add_parser("reconstruir", help="indexa os manifestos das pastas")
+    reconstruir.add_argument("pastas", nargs="+")
+    consultas = []
+    raio = sub.add_parser("raio")
+    raio.add_argument("x", type=float)
+    raio.add_argument("y", type=float)
+    raio.add_argument("raio", type=float)
+    consultas.append(raio)
+    caixa = sub.add_parser("caixa")
+    for nome in ("xmin", "ymin", "xmax", "ymax"):
+        caixa.add_argument(nome, type=float)
+    consultas.append(caixa)
+    planta = sub.add_parser("planta", help="imagens cujo campo de visão contém o vaso")
+    planta.add_argument("id")
+    planta.add_argument("--room", default="Room B")
+    consultas.append(planta)
+    for consulta in consultas:
+        consulta.add_argument("--desde")
+        consulta.add_argument("--ate")
+    args = parser.parse_args(argv)
+
+    with IndiceEspacial(args.indice) as indice:
+        if args.operacao == "reconstruir":
+            manifestos, capturas = indice.reconstruir(*args.pastas)
+            print(f"{capturas} capturas de {manifestos} sessões -> {args.indice}")
+            return
+        filtros = {"desde": args.desde, "ate": args.ate}
+        if args.operacao == "raio":
+            capturas = indice.raio(args.x, args.y, args.raio, **filtros)
+        elif args.operacao == "caixa":
+            capturas = indice.caixa(args.xmin, args.ymin, args.xmax, args.ymax, **filtros)
+        else:
+            from planejamento_cobertura import campo_visao_cfg
+            with open("cfg.json", "r") as f:
+                cfg = json.load(f)
+            vaso = next((p for p in cfg[args.room] if p["id"] == args.id), None)
+            if vaso is None:
+                parser.error(f"Planta {args.id} não encontrada em {args.room}")
+            capturas = indice.cobrindo(vaso["X"], vaso["Y"], campo_visao_cfg(cfg), **filtros)
+    for captura in capturas:
+        print(f"{captura['momento'] or '-':23}  X={captura['x']:9.2f} Y={captura['y']:9.2f}  "
+              f"{captura['planta'] or '-':8}  {captura['arquivo']}")
+    print(f"{len(capturas)} capturas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Índice de metadados de uma pasta de sessão (milhares de imagens adensadas).
+
+Cada arquivo é lido só até o segmento APP1 (EXIF): os marcadores do JPEG são
+percorridos a partir do início e a leitura para antes dos dados da imagem, sem
+decodificar pixels. O EXIF é interpretado uma única vez e as informações das
+capturas (X-LAT/Y-LONG, planta, data/hora, resolução) vão para um índice
+SQLite ou CSV. Os arquivos são processados em paralelo por um pool de
+processos. O visualizador usa a mesma leitura de cabeçalho para um arquivo
+por vez, com os resultados guardados em CacheMetadados:
+
+    python indice_metadados.py "Fotos Adensadas/20250101_120000"
+    python indice_metadados.py pasta --saida indice.csv --processos 4
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import csv
+import os
+import re
+import sqlite3
+import struct
+import time
+
+import piexif
+
+ARQUIVO_INDICE = "indice_metadados.sqlite"
+EXTENSOES = (".jpg", ".jpeg")
+
+CAMPOS = ("arquivo", "x", "y", "planta", "data_hora", "largura", "altura", "dpi",
+          "tamanho", "modificado", "erro")
+
+_RE_X = re.compile(r"X[-_]?LAT[:\s]*([-\d.]+)", re.IGNORECASE)
+_RE_Y = re.compile(r"Y[-_]?LONG[:\s]*([-\d.]+)", re.IGNORECASE)
+_RE_PLANTA = re.compile(r"PLANTA[:\s]*([^;]+)", re.IGNORECASE)
+
+# Início de quadro (SOF0..SOF15), exceto DHT, JPG e DAC que usam a mesma faixa
+_MARCADORES_SOF = tuple(t for t in range(0xC0, 0xD0) if t not in (0xC4, 0xC8, 0xCC))
+
+
+def _segmentos(f, tipos):
+    """
+    Percorre os marcadores do JPEG aberto em f até o início dos dados
+    comprimidos, gerando (tipo, conteúdo) só dos segmentos em `tipos`; os
+    demais são pulados com seek, sem leitura.
+    """
+    if f.read(2) != b"\xff\xd8":
+        raise ValueError("Não é um JPEG")
+    while True:
+        marcador = f.read(2)
+        if len(marcador) < 2 or marcador[0] != 0xFF:
+            return
+        tipo = marcador[1]
+        if tipo == 0xFF:
+            # Bytes de preenchimento entre marcadores
+            f.seek(-1, os.SEEK_CUR)
+            continue
+        if tipo in (0xD9, 0xDA):
+            # Fim da imagem ou início dos dados comprimidos
+            return
+        tamanho = struct.unpack(">H", f.read(2))[0]
+        if tipo in tipos:
+            yield tipo, f.read(tamanho - 2)
+        else:
+            f.seek(tamanho - 2, os.SEEK_CUR)
+
+
+def ler_app1(caminho):
+    """
+    Retorna o conteúdo do segmento APP1 EXIF ("Exif\\0\\0" + TIFF) lendo só o
+    cabeçalho do arquivo, ou None se não houver EXIF.
+    """
+    with open(caminho, "rb") as f:
+        for _, dados in _segmentos(f, (0xE1,)):
+            if dados.startswith(b"Exif\x00\x00"):
+                return dados
+    return None
+
+
+def ler_cabecalho(caminho):
+    """
+    (app1, (largura, altura, componentes)) lidos do cabeçalho: o EXIF e as
+    dimensões do quadro (SOF), sem decodificar a imagem. Ausentes são None.
+    """
+    app1 = quadro = None
+    with open(caminho, "rb") as f:
+        for tipo, dados in _segmentos(f, (0xE1,) + _MARCADORES_SOF):
+            if tipo == 0xE1:
+                if app1 is None and dados.startswith(b"Exif\x00\x00"):
+                    app1 = dados
+            elif quadro is None:
+                altura, largura = struct.unpack(">HH", dados[1:5])
+                quadro = (largura, altura, dados[5])
+            if app1 is not None and quadro is not None:
+                break
+    return app1, quadro
+
+
+def interpretar_exif(app1):
+    """Dicionário do piexif a partir do segmento APP1 (uma única interpretação)."""
+    return piexif.load(app1)
+
+
+def _texto(valor):
+    if isinstance(valor, bytes):
+        # UserComment pode vir com o prefixo de 8 bytes do código de caracteres
+        if valor[:8] in (b"ASCII\x00\x00\x00", b"UNICODE\x00", b"\x00" * 8):
+            valor = valor[8:]
+        return valor.decode("utf-8", errors="ignore").strip("\x00 ")
+    return str(valor)
+
+
+def coordenadas_exif(exif):
+    """(x, y, planta) do UserComment gravado pela captura, ou Nones."""
+    comentario = _texto(exif.get("Exif", {}).get(piexif.ExifIFD.UserComment, b""))
+    x = _RE_X.search(comentario)
+    y = _RE_Y.search(comentario)
+    planta = _RE_PLANTA.search(comentario)
+    return (float(x.group(1)) if x else None,
+            float(y.group(1)) if y else None,
+            planta.group(1).strip() if planta else None)
+
+
+def extrair_metadados(caminho):
+    """Uma linha do índice para o arquivo (lê apenas o cabeçalho)."""
+    st = os.stat(caminho)
+    linha = dict.fromkeys(CAMPOS)
+    linha.update(arquivo=caminho, tamanho=st.st_size, modificado=st.st_mtime)
+    try:
+        app1 = ler_app1(caminho)
+        if app1 is None:
+            linha["erro"] = "sem EXIF"
+            return linha
+        exif = interpretar_exif(app1)
+    except Exception as e:
+        linha["erro"] = str(e)
+        return linha
+
+    linha["x"], linha["y"], linha["planta"] = coordenadas_exif(exif)
+    zeroth = exif.get("0th", {})
+    dados_exif = exif.get("Exif", {})
+    data_hora = dados_exif.get(piexif.ExifIFD.DateTimeOriginal) or zeroth.get(piexif.ImageIFD.DateTime)
+    if data_hora:
+        linha["data_hora"] = _texto(data_hora)
+        subsegundo = dados_exif.get(piexif.ExifIFD.SubSecTimeOriginal)
+        if subsegundo:
+            linha["data_hora"] += "." + _texto(subsegundo)
+    linha["largura"] = dados_exif.get(piexif.ExifIFD.PixelXDimension)
+    linha["altura"] = dados_exif.get(piexif.ExifIFD.PixelYDimension)
+    resolucao = zeroth.get(piexif.ImageIFD.XResolution)
+    if resolucao and resolucao[1]:
+        linha["dpi"] = resolucao[0] / resolucao[1]
+    return linha
+
+
+def listar_imagens(pasta):
+    caminhos = []
+    for raiz, _, arquivos in os.walk(pasta):
+        caminhos.extend(os.path.join(raiz, nome) for nome in arquivos
+                        if nome.lower().endswith(EXTENSOES))
+    caminhos.sort()
+    return caminhos
+
+
+def indexar_sessao(pasta, destino=None, processos=None, ao_progresso=None, cancelado=None):
+    """
+    Extrai os metadados de todas as imagens da pasta e grava o índice.
+
+    destino: .sqlite/.db (padrão, dentro da pasta) ou .csv
+    ao_progresso: função chamada com (processados, total)
+    cancelado: função que retorna True para interromper
+    Retorna (caminho do índice, quantidade de linhas, segundos).
+    """
+    inicio = time.monotonic()
+    destino = destino or os.path.join(pasta, ARQUIVO_INDICE)
+    caminhos = listar_imagens(pasta)
+    total = len(caminhos)
+    linhas = []
+    if ao_progresso:
+        ao_progresso(0, total)
+    # Arquivos pequenos e numerosos: lotes grandes reduzem a troca entre processos
+    lote = max(1, min(256, total // (4 * (processos or os.cpu_count() or 1)) or 1))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processos) as pool:
+        for linha in pool.map(extrair_metadados, caminhos, chunksize=lote):
+            linhas.append(linha)
+            if ao_progresso and (len(linhas) % lote == 0 or len(linhas) == total):
+                ao_progresso(len(linhas), total)
+            if cancelado and cancelado():
+                pool.shutdown(cancel_futures=True)
+                break
+    gravar_indice(linhas, destino)
+    return destino, len(linhas), time.monotonic() - inicio
+
+
+def gravar_indice(linhas, destino):
+    if destino.lower().endswith(".csv"):
+        with open(destino, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.DictWriter(f, fieldnames=CAMPOS)
+            escritor.writeheader()
+            escritor.writerows(linhas)
+        return
+    conexao = sqlite3.connect(destino)
+    try:
+        conexao.execute("DROP TABLE IF EXISTS imagens")
+        conexao.execute(
+            "CREATE TABLE imagens (arquivo TEXT PRIMARY KEY, x REAL, y REAL, planta TEXT, "
+            "data_hora TEXT, largura INTEGER, altura INTEGER, dpi REAL, tamanho INTEGER, "
+            "modificado REAL, erro TEXT)")
+        conexao.executemany(
+            f"INSERT INTO imagens VALUES ({', '.join('?' * len(CAMPOS))})",
+            ([linha[campo] for campo in CAMPOS] for linha in linhas))
+        conexao.execute("CREATE INDEX imagens_xy ON imagens (x, y)")
+        conexao.execute("CREATE INDEX imagens_planta ON imagens (planta)")
+        conexao.commit()
+    finally:
+        conexao.close()
+
+
+class CacheMetadados:
+    """
+    Metadados de arquivos individuais, interpretados uma única vez e guardados
+    por caminho. A entrada vale enquanto o mtime e o tamanho do arquivo não
+    mudarem; as menos usadas saem quando a capacidade é atingida.
+    """
+
+    def __init__(self, capacidade=256):
+        self.capacidade = capacidade
+        self.entradas = collections.OrderedDict()
+
+    def obter(self, caminho):
+        """
+        Dicionário com caminho, tamanho, criado, modificado, largura, altura,
+        componentes, exif (dicionário do piexif ou None) e erro.
+        """
+        st = os.stat(caminho)
+        chave = (st.st_mtime_ns, st.st_size)
+        entrada = self.entradas.get(caminho)
+        if entrada is not None and entrada[0] == chave:
+            self.entradas.move_to_end(caminho)
+            return entrada[1]
+        metadados = {"caminho": caminho, "tamanho": st.st_size, "criado": st.st_ctime,
+                     "modificado": st.st_mtime, "largura": None, "altura": None,
+                     "componentes": None, "exif": None, "erro": None}
+        try:
+            app1, quadro = ler_cabecalho(caminho)
+            if quadro:
+                metadados["largura"], metadados["altura"], metadados["componentes"] = quadro
+            if app1 is not None:
+                metadados["exif"] = interpretar_exif(app1)
+        except Exception as e:
+            metadados["erro"] = str(e)
+        self.entradas[caminho] = (chave, metadados)
+        while len(self.entradas) > self.capacidade:
+            self.entradas.popitem(last=False)
+        return metadados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera o índice de metadados de uma pasta de sessão")
+    parser.add_argument("pasta")
+    parser.add_argument("--saida", help=f"arquivo .sqlite ou .csv (padrão <pasta>/{ARQUIVO_INDICE})")
+    parser.add_argument("--processos", type=int, help="processos em paralelo (padrão: núcleos)")
+    args = parser.parse_args(argv)
+
+    def progresso(feitos, total):
+        print(f"\r{feitos}/{total}", end="", flush=True)
+
+    destino, quantidade, segundos = indexar_sessao(args.pasta, args.saida, args.processos, progresso)
+    print(f"\n{quantidade} imagens indexadas em {segundos:.1f} s -> {destino}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,11 @@ import threading
 import signal
 import json
 
+from ponte_interface import PonteInterface
 from functions import (
     log, update_status, update_progress, update_image,
     signal_handler, cancel, finalize, send_grbl, wait_for_idle,
-    get_image, start_process, run_process, criar_interface_gerar_pontos
+    save_plant_image, start_process, run_process, criar_interface_gerar_pontos, close_app
 )
 
 
@@ -91,13 +92,24 @@ class App:
         self.cancel_button.pack(side=tk.LEFT, padx=5)
 
         # Botão Captura Adensada
-        from functions import start_dense_process
+        from functions import start_dense_process, resume_dense_process
         self.captura_adensada_button = ttk.Button(
             self.button_frame,
             text="Captura Adensada",
             command=lambda: start_dense_process(self)
         )
         self.captura_adensada_button.pack(side=tk.LEFT, padx=5)
+        self.retomar_button = ttk.Button(
+            self.button_frame,
+            text="Retomar Sessão",
+            command=lambda: resume_dense_process(self)
+        )
+        self.retomar_button.pack(side=tk.LEFT, padx=5)
+        # Sem marcar, o homing só é feito se a máquina perdeu a referência
+        self.force_home_var = tk.BooleanVar(value=False)
+        self.force_home_check = ttk.Checkbutton(
+            self.button_frame, text="Forçar homing", variable=self.force_home_var)
+        self.force_home_check.pack(side=tk.LEFT, padx=5)
 
         # Frame para visualização da imagem (direita)
         self.image_frame = ttk.Frame(self.main_frame)
@@ -114,6 +126,15 @@ class App:
         self.running = False
         self.thread = None
 
+        # Logs, progresso e imagens das threads de trabalho chegam por aqui
+        self.ui = PonteInterface(
+            self, intervalo_ms=self.data_json.get("ui_poll_ms", 100),
+            max_linhas=self.data_json.get("log_max_lines", 2000),
+            fps_preview=self.data_json.get("preview_fps", 10)).iniciar()
+
+        # Câmera e porta do GRBL ficam abertas entre execuções; fecham ao sair
+        self.root.protocol("WM_DELETE_WINDOW", lambda: close_app(self))
+
         # Registra o manipulador de sinal na thread principal
         signal.signal(signal.SIGINT, lambda sig,
                       frame: signal_handler(self, sig, frame))
@@ -0,0 +1,166 @@
+"""
+Manifesto da sessão de captura.
+
+Cada imagem gravada acrescenta uma linha JSON ao manifesto.jsonl da pasta da
+sessão: arquivo, ponto da rota, planta, posição comandada e reportada pelo
+GRBL, data/hora e id da sessão. A linha é escrita pela thread de gravação
+depois que o arquivo está no disco e descarregada na hora, então o manifesto
+nunca aponta para uma imagem inexistente e uma queda no meio da execução perde
+no máximo a linha em andamento.
+
+O manifesto também é o diário da sessão: cada linha guarda o índice do ponto
+na rota planejada (gravada na pasta como rota.npy), o tamanho e o CRC-32 do
+arquivo. Para retomar uma sessão interrompida, pontos_concluidos() confere as
+imagens no disco e a captura continua do primeiro ponto que falta.
+
+Com câmeras extras, a linha da imagem principal também lista os arquivos das
+outras câmeras da mesma parada ("bandas") e a defasagem entre as exposições; a
+linha só é escrita quando todos os arquivos estão no disco.
+"""
+
+import concurrent.futures
+import json
+import os
+import threading
+import zlib
+
+ARQUIVO_MANIFESTO = "manifesto.jsonl"
+ARQUIVO_ROTA_SESSAO = "rota.npy"
+ARQUIVO_SESSAO = "sessao.json"
+
+
+class ManifestoSessao:
+    """
+    Manifesto (JSON Lines, só acréscimo) de uma pasta de sessão.
+
+    pasta: pasta da sessão, onde ficam as imagens e o manifesto
+    sessao: id da sessão (padrão: nome da pasta, a data/hora de início)
+    """
+
+    def __init__(self, pasta, sessao=None):
+        self.pasta = pasta
+        self.sessao = sessao or os.path.basename(os.path.normpath(pasta))
+        self.caminho = os.path.join(pasta, ARQUIVO_MANIFESTO)
+        self.lock = threading.Lock()
+        self.arquivo = open(self.caminho, "a", encoding="utf-8")
+        self.registrados = 0
+
+    def registrar(self, arquivo, x, y, x_medido=None, y_medido=None, planta=None,
+                  ponto=None, momento=None, indice=None, tamanho=None, crc=None,
+                  bandas=None, defasagem_ms=None):
+        """
+        Acrescenta uma imagem gravada. Pode ser chamado de qualquer thread.
+
+        arquivo: caminho da imagem (guardado relativo à pasta da sessão)
+        x, y: posição comandada; x_medido, y_medido: posição reportada pelo GRBL
+        ponto: id do ponto na rota; indice: posição dele na rota da sessão
+        momento: datetime da captura; tamanho, crc: do arquivo gravado
+        bandas: arquivos das câmeras extras [{arquivo, tamanho, crc32, cameras,
+        bandas, atraso_ms}]; defasagem_ms: entre o primeiro e o último início
+        de exposição das câmeras
+        """
+        registro = {
+            "sessao": self.sessao,
+            "arquivo": os.path.relpath(arquivo, self.pasta),
+            "ponto": ponto,
+            "indice": indice,
+            "planta": planta,
+            "x_cmd": round(float(x), 3),
+            "y_cmd": round(float(y), 3),
+            "x": round(float(x_medido), 3) if x_medido is not None else None,
+            "y": round(float(y_medido), 3) if y_medido is not None else None,
+            "momento": momento.isoformat(timespec="milliseconds") if momento else None,
+            "tamanho": tamanho,
+            "crc32": crc,
+        }
+        if bandas is not None:
+            registro["bandas"] = [dict(banda, arquivo=os.path.relpath(banda["arquivo"], self.pasta))
+                                  for banda in bandas]
+            registro["defasagem_ms"] = defasagem_ms
+        linha = json.dumps(registro, ensure_ascii=False)
+        with self.lock:
+            self.arquivo.write(linha + "\n")
+            self.arquivo.flush()
+            self.registrados += 1
+        return registro
+
+    def fechar(self):
+        with self.lock:
+            if not self.arquivo.closed:
+                self.arquivo.close()
+
+
+def ler_manifesto(caminho):
+    """
+    Registros do manifesto, com o arquivo convertido em caminho absoluto.
+    Uma última linha truncada (queda durante a escrita) é ignorada.
+    """
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    with open(caminho, "r", encoding="utf-8") as f:
+        for linha in f:
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError:
+                continue
+            registro["arquivo"] = os.path.join(pasta, registro["arquivo"])
+            for banda in registro.get("bandas", ()):
+                banda["arquivo"] = os.path.join(pasta, banda["arquivo"])
+            yield registro
+
+
+def crc_arquivo(caminho, bloco=1 << 20):
+    crc = 0
+    with open(caminho, "rb") as f:
+        while True:
+            dados = f.read(bloco)
+            if not dados:
+                return crc
+            crc = zlib.crc32(dados, crc)
+
+
+def _verificar(registro):
+    for arquivo in [registro] + registro.get("bandas", []):
+        try:
+            if os.path.getsize(arquivo["arquivo"]) != arquivo["tamanho"]:
+                return False
+            if crc_arquivo(arquivo["arquivo"]) != arquivo["crc32"]:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def pontos_concluidos(pasta, verificar=True):
+    """
+    {índice na rota: registro} dos pontos com imagem íntegra na sessão.
+
+    verificar: confere tamanho e CRC-32 de cada arquivo, incluindo os das
+    câmeras extras (leitura em paralelo);
+    sem isso basta o arquivo existir. Registros sem índice ou sem CRC (sessões
+    antigas) não contam como concluídos.
+    """
+    caminho = os.path.join(pasta, ARQUIVO_MANIFESTO)
+    if not os.path.exists(caminho):
+        return {}
+    registros = {}
+    for registro in ler_manifesto(caminho):
+        if registro.get("indice") is not None and registro.get("crc32") is not None:
+            # Um ponto recapturado vale pela última gravação
+            registros[registro["indice"]] = registro
+    if verificar:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+            integros = list(pool.map(_verificar, registros.values()))
+    else:
+        integros = [os.path.exists(r["arquivo"]) for r in registros.values()]
+    return {indice: registro for (indice, registro), ok in zip(registros.items(), integros) if ok}
+
+
+def salvar_sessao(pasta, **dados):
+    """Descrição da sessão (modo, rota, início) para a retomada."""
+    with open(os.path.join(pasta, ARQUIVO_SESSAO), "w") as f:
+        json.dump(dados, f, indent=4)
+
+
+def carregar_sessao(pasta):
+    with open(os.path.join(pasta, ARQUIVO_SESSAO), "r") as f:
+        return json.load(f)
@@ -0,0 +1,427 @@
+"""
+Mosaico da mesa a partir das imagens de uma sessão adensada.
+
+Cada imagem é posicionada pela coordenada da CNC (manifesto.jsonl da sessão ou,
+na falta dele, o X-LAT/Y-LONG do EXIF) e pela escala calibrada em mm/pixel do
+bloco "camera" do cfg.json. Opcionalmente a posição é refinada por correlação
+de fase entre imagens vizinhas: os deslocamentos medidos em cada sobreposição
+são conciliados por mínimos quadrados, presos à posição da CNC.
+
+A saída é uma pirâmide de tiles em JPEG (<saida>/<nível>/<linha>_<coluna>.jpg,
+nível 0 na resolução total) descrita por mosaico.json. Nada é montado inteiro
+na memória: cada tile é mesclado (pesos que caem a zero nas bordas de cada
+imagem) e gravado em um canvas .npy mapeado em disco, por um pool de
+processos; os níveis seguintes são reduzidos em faixas a partir do anterior.
+
+    python mosaico.py "Fotos Adensadas/20250101_120000"
+    python mosaico.py pasta --escala 0.25 --refinar --processos 4
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import math
+import os
+import time
+
+import cv2 as cv
+import numpy as np
+
+from indice_metadados import extrair_metadados, listar_imagens
+from manifesto_sessao import ARQUIVO_MANIFESTO, ler_manifesto
+from planejamento_cobertura import RESOLUCAO_PADRAO, campo_visao_cfg
+
+TAMANHO_TILE = 1024
+QUALIDADE_TILE = 90
+# Imagens decodificadas mantidas por processo enquanto os tiles de uma linha são montados
+LIMITE_CACHE_BYTES = 256 * 2 ** 20
+
+_REDUCOES = ((8, cv.IMREAD_REDUCED_COLOR_8, cv.IMREAD_REDUCED_GRAYSCALE_8),
+             (4, cv.IMREAD_REDUCED_COLOR_4, cv.IMREAD_REDUCED_GRAYSCALE_4),
+             (2, cv.IMREAD_REDUCED_COLOR_2, cv.IMREAD_REDUCED_GRAYSCALE_2))
+
+
+def posicoes_sessao(pasta):
+    """
+    [(caminho, x, y)] das imagens da sessão: posição reportada pelo GRBL do
+    manifesto (ou a comandada) e, sem manifesto, as coordenadas do EXIF.
+    """
+    manifesto = os.path.join(pasta, ARQUIVO_MANIFESTO)
+    if os.path.exists(manifesto):
+        # Um ponto recapturado na retomada da sessão vale pela última gravação
+        registros = {r["arquivo"]: r for r in ler_manifesto(manifesto)}
+        return [(r["arquivo"],
+                 r["x"] if r.get("x") is not None else r["x_cmd"],
+                 r["y"] if r.get("y") is not None else r["y_cmd"])
+                for r in registros.values() if os.path.exists(r["arquivo"])]
+    with concurrent.futures.ProcessPoolExecutor() as pool:
+        linhas = list(pool.map(extrair_metadados, listar_imagens(pasta), chunksize=64))
+    return [(l["arquivo"], l["x"], l["y"]) for l in linhas if l["x"] is not None and l["y"] is not None]
+
+
+def carregar_quadro(caminho, tamanho, transformacao, cinza=False):
+    """
+    Decodifica a imagem já reduzida pelo próprio decodificador JPEG (1/2, 1/4,
+    1/8) quando possível, aplica a orientação e ajusta ao tamanho (largura,
+    altura) de destino.
+    """
+    girada, inverter_x, inverter_y = transformacao
+    largura, altura = (tamanho[1], tamanho[0]) if girada else tamanho
+    bandeira = cv.IMREAD_GRAYSCALE if cinza else cv.IMREAD_COLOR
+    original = _largura_original(caminho)
+    if original:
+        escala = largura / original
+        for fator, colorida, cinzenta in _REDUCOES:
+            if escala <= 1.0 / fator:
+                bandeira = cinzenta if cinza else colorida
+                break
+    imagem = cv.imread(caminho, bandeira)
+    if imagem is None:
+        return None
+    if (imagem.shape[1], imagem.shape[0]) != (largura, altura):
+        menor = largura < imagem.shape[1]
+        imagem = cv.resize(imagem, (largura, altura),
+                           interpolation=cv.INTER_AREA if menor else cv.INTER_LINEAR)
+    if girada:
+        imagem = cv.transpose(imagem)
+    if inverter_x and inverter_y:
+        imagem = cv.flip(imagem, -1)
+    elif inverter_x:
+        imagem = cv.flip(imagem, 1)
+    elif inverter_y:
+        imagem = cv.flip(imagem, 0)
+    return imagem
+
+
+_larguras = {}
+
+
+def _largura_original(caminho):
+    """Largura em pixels do arquivo, lida do cabeçalho JPEG (sem decodificar)."""
+    if caminho not in _larguras:
+        from indice_metadados import ler_cabecalho
+        try:
+            _, quadro = ler_cabecalho(caminho)
+        except (OSError, ValueError):
+            quadro = None
+        _larguras[caminho] = quadro[0] if quadro else None
+    return _larguras[caminho]
+
+
+def pesos_borda(largura, altura):
+    """Peso de mesclagem: 1 no centro, caindo linearmente a zero nas bordas."""
+    u = np.minimum(np.arange(1, largura + 1), np.arange(largura, 0, -1)) / ((largura + 1) / 2.0)
+    v = np.minimum(np.arange(1, altura + 1), np.arange(altura, 0, -1)) / ((altura + 1) / 2.0)
+    return np.minimum.outer(v, u).astype(np.float32)
+
+
+# --- Refinamento por correlação de fase --------------------------------------
+
+def pares_vizinhos(origens, tamanho, sobreposicao_minima=0.2):
+    """
+    Pares (i, j) de imagens cuja sobreposição nominal é de pelo menos
+    `sobreposicao_minima` da largura e da altura. origens: (N, 2) em pixels.
+    """
+    largura, altura = tamanho
+    celulas = collections.defaultdict(list)
+    for i, (u, v) in enumerate(origens):
+        celulas[(int(u // largura), int(v // altura))].append(i)
+    pares = []
+    for (cu, cv_), membros in celulas.items():
+        for du in (-1, 0, 1):
+            for dv in (-1, 0, 1):
+                for j in celulas.get((cu + du, cv_ + dv), ()):
+                    for i in membros:
+                        if j <= i:
+                            continue
+                        deslocamento = np.abs(origens[j] - origens[i])
+                        if (deslocamento[0] <= largura * (1 - sobreposicao_minima)
+                                and deslocamento[1] <= altura * (1 - sobreposicao_minima)):
+                            pares.append((i, j))
+    return pares
+
+
+def _correlacionar(tarefa):
+    """
+    Deslocamento residual (em pixels da escala de trabalho) de cada par: quanto
+    a imagem j está além da posição nominal em relação à imagem i.
+    """
+    caminhos, pares, tamanho, transformacao = tarefa
+    cache = collections.OrderedDict()
+
+    def quadro(i):
+        if i not in cache:
+            cache[i] = carregar_quadro(caminhos[i], tamanho, transformacao, cinza=True)
+            if len(cache) > 64:
+                cache.popitem(last=False)
+        return cache[i]
+
+    largura, altura = tamanho
+    resultados = []
+    for i, j, du, dv in pares:
+        a, b = quadro(i), quadro(j)
+        if a is None or b is None:
+            continue
+        du, dv = int(round(du)), int(round(dv))
+        # Região comum: em a a partir de (du, dv); em b a partir de (0, 0)
+        x0, y0 = max(du, 0), max(dv, 0)
+        x1, y1 = min(largura, largura + du), min(altura, altura + dv)
+        if x1 - x0 < 32 or y1 - y0 < 32:
+            continue
+        recorte_a = a[y0:y1, x0:x1].astype(np.float32)
+        recorte_b = b[y0 - dv:y1 - dv, x0 - du:x1 - du].astype(np.float32)
+        janela = cv.createHanningWindow((x1 - x0, y1 - y0), cv.CV_32F)
+        (sx, sy), resposta = cv.phaseCorrelate(recorte_b, recorte_a, janela)
+        resultados.append((i, j, sx, sy, resposta))
+    return resultados
+
+
+def refinar_posicoes(caminhos, origens, tamanho, transformacao, fator, max_px,
+                     resposta_minima=0.1, peso_cnc=0.05, processos=None):
+    """
+    Correção (N, 2) em pixels de saída para cada imagem.
+
+    fator: redução usada na correlação (imagens correlacionadas em tamanho/fator)
+    max_px: maior correção aceita por par (erro máximo esperado da CNC)
+    peso_cnc: quanto cada imagem é puxada de volta à posição da CNC
+    """
+    tamanho_reduzido = (max(32, int(round(tamanho[0] / fator))), max(32, int(round(tamanho[1] / fator))))
+    escala = tamanho[0] / tamanho_reduzido[0]
+    reduzidas = origens / escala
+    pares = pares_vizinhos(origens, tamanho)
+    if not pares:
+        return np.zeros_like(origens)
+    tarefas = []
+    lote = 256
+    for inicio in range(0, len(pares), lote):
+        bloco = [(i, j, *(reduzidas[j] - reduzidas[i])) for i, j in pares[inicio:inicio + lote]]
+        tarefas.append((caminhos, bloco, tamanho_reduzido, transformacao))
+    medidas = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processos) as pool:
+        for resultado in pool.map(_correlacionar, tarefas):
+            medidas.extend(resultado)
+
+    restricoes = [(i, j, sx * escala, sy * escala) for i, j, sx, sy, resposta in medidas
+                  if resposta >= resposta_minima and math.hypot(sx * escala, sy * escala) <= max_px]
+    correcao = np.zeros_like(origens)
+    if not restricoes:
+        return correcao
+    i = np.array([r[0] for r in restricoes])
+    j = np.array([r[1] for r in restricoes])
+    c = np.array([(r[2], r[3]) for r in restricoes])
+    grau = np.bincount(i, minlength=len(origens)) + np.bincount(j, minlength=len(origens))
+    # Jacobi: cada imagem vai para a média do que os vizinhos indicam, presa à CNC
+    for _ in range(200):
+        soma = np.zeros_like(origens)
+        np.add.at(soma, j, correcao[i] + c)
+        np.add.at(soma, i, correcao[j] - c)
+        novo = soma / (grau + peso_cnc)[:, None]
+        if np.abs(novo - correcao).max() < 0.05:
+            correcao = novo
+            break
+        correcao = novo
+    return correcao
+
+
+# --- Montagem dos tiles ------------------------------------------------------
+
+def _montar_linha(tarefa):
+    """Mescla os tiles de uma linha e grava no canvas mapeado em disco."""
+    canvas_caminho, tiles, tamanho, transformacao = tarefa
+    canvas = np.load(canvas_caminho, mmap_mode="r+")
+    largura, altura = tamanho
+    pesos = pesos_borda(largura, altura)
+    bytes_quadro = largura * altura * 3
+    capacidade = max(4, LIMITE_CACHE_BYTES // max(1, bytes_quadro))
+    cache = collections.OrderedDict()
+    for (v0, v1, u0, u1), quadros in tiles:
+        acumulado = np.zeros((v1 - v0, u1 - u0, 3), np.float32)
+        soma = np.zeros((v1 - v0, u1 - u0), np.float32)
+        for caminho, qu, qv in quadros:
+            if caminho in cache:
+                cache.move_to_end(caminho)
+            else:
+                cache[caminho] = carregar_quadro(caminho, tamanho, transformacao)
+                if len(cache) > capacidade:
+                    cache.popitem(last=False)
+            imagem = cache[caminho]
+            if imagem is None:
+                continue
+            # Interseção do quadro (origem qu, qv) com o tile
+            a0, a1 = max(u0, qu), min(u1, qu + largura)
+            b0, b1 = max(v0, qv), min(v1, qv + altura)
+            if a0 >= a1 or b0 >= b1:
+                continue
+            peso = pesos[b0 - qv:b1 - qv, a0 - qu:a1 - qu]
+            acumulado[b0 - v0:b1 - v0, a0 - u0:a1 - u0] += imagem[b0 - qv:b1 - qv, a0 - qu:a1 - qu] * peso[..., None]
+            soma[b0 - v0:b1 - v0, a0 - u0:a1 - u0] += peso
+        np.divide(acumulado, np.maximum(soma, 1e-6)[..., None], out=acumulado)
+        canvas[v0:v1, u0:u1] = np.clip(acumulado + 0.5, 0, 255).astype(np.uint8)
+    canvas.flush()
+    return len(tiles)
+
+
+def _gravar_tiles(tarefa):
+    nivel_caminho, pasta, linha, tile, qualidade = tarefa
+    canvas = np.load(nivel_caminho, mmap_mode="r")
+    v0 = linha * tile
+    for coluna in range(math.ceil(canvas.shape[1] / tile)):
+        u0 = coluna * tile
+        bloco = np.ascontiguousarray(canvas[v0:v0 + tile, u0:u0 + tile])
+        cv.imwrite(os.path.join(pasta, f"{linha}_{coluna}.jpg"), bloco,
+                   [cv.IMWRITE_JPEG_QUALITY, qualidade])
+    return linha
+
+
+def reduzir_nivel(origem, destino, faixa):
+    """Nível seguinte da pirâmide (metade da resolução), reduzido em faixas."""
+    canvas = np.load(origem, mmap_mode="r")
+    altura, largura = math.ceil(canvas.shape[0] / 2), math.ceil(canvas.shape[1] / 2)
+    saida = np.lib.format.open_memmap(destino, mode="w+", dtype=np.uint8, shape=(altura, largura, 3))
+    passo = faixa * 2
+    for v0 in range(0, canvas.shape[0], passo):
+        bloco = np.ascontiguousarray(canvas[v0:v0 + passo])
+        alvo = saida[v0 // 2:v0 // 2 + math.ceil(bloco.shape[0] / 2)]
+        alvo[:] = cv.resize(bloco, (largura, alvo.shape[0]), interpolation=cv.INTER_AREA)
+    saida.flush()
+    return saida.shape
+
+
+def montar_mosaico(pasta, saida=None, cfg=None, escala=1.0, refinar=False, tile=TAMANHO_TILE,
+                   qualidade=QUALIDADE_TILE, processos=None, manter_canvas=False, log=print):
+    """
+    Monta o mosaico da sessão em `saida` (padrão <pasta>/mosaico).
+
+    cfg: cfg.json carregado (blocos "camera" e "mosaic")
+    escala: fração da resolução da câmera usada no nível 0
+    Retorna o dicionário gravado em mosaico.json.
+    """
+    inicio = time.monotonic()
+    cfg = cfg or {}
+    camera = cfg.get("camera", {})
+    opcoes = cfg.get("mosaic", {})
+    saida = saida or os.path.join(pasta, "mosaico")
+    os.makedirs(saida, exist_ok=True)
+
+    quadros = posicoes_sessao(pasta)
+    if not quadros:
+        raise ValueError(f"Nenhuma imagem com coordenadas em {pasta}")
+    resolucao = tuple(camera.get("resolution", RESOLUCAO_PADRAO))
+    campo = campo_visao_cfg(cfg)
+    girada = bool(camera.get("rotated", False))
+    transformacao = (girada, bool(opcoes.get("flip_x", False)), bool(opcoes.get("flip_y", False)))
+    # Tamanho de cada imagem já orientada nos eixos da máquina, na escala de saída
+    largura, altura = (resolucao[1], resolucao[0]) if girada else resolucao
+    largura, altura = max(1, int(round(largura * escala))), max(1, int(round(altura * escala)))
+    mm_por_px = campo[0] / largura
+
+    caminhos = [q[0] for q in quadros]
+    xy = np.array([(q[1], q[2]) for q in quadros], dtype=float)
+    xmin, ymax = xy[:, 0].min() - campo[0] / 2, xy[:, 1].max() + campo[1] / 2
+    # Coluna cresce com X; linha cresce com Y decrescente (Y para cima na imagem)
+    origens = np.column_stack([(xy[:, 0] - xmin) / mm_por_px - largura / 2,
+                               (ymax - xy[:, 1]) / mm_por_px - altura / 2])
+    if refinar:
+        fator = opcoes.get("refine_reduction", 4)
+        max_px = opcoes.get("refine_max_mm", 5.0) / mm_por_px
+        correcao = refinar_posicoes(caminhos, origens, (largura, altura), transformacao,
+                                    fator, max_px, processos=processos)
+        log(f"Refinamento: correção média {np.hypot(*correcao.T).mean() * mm_por_px:.2f} mm, "
+            f"máxima {np.hypot(*correcao.T).max() * mm_por_px:.2f} mm")
+        origens = origens + correcao
+    deslocamento = origens.min(axis=0)
+    origens -= deslocamento
+    origens = np.round(origens).astype(np.int64)
+    largura_total = int(origens[:, 0].max()) + largura
+    altura_total = int(origens[:, 1].max()) + altura
+    log(f"{len(quadros)} imagens -> {largura_total}x{altura_total} px ({mm_por_px:.4f} mm/px)")
+
+    # Imagens que tocam cada tile
+    linhas_tiles = math.ceil(altura_total / tile)
+    colunas_tiles = math.ceil(largura_total / tile)
+    por_tile = collections.defaultdict(list)
+    for caminho, (u, v) in zip(caminhos, origens):
+        for linha in range(v // tile, min(linhas_tiles, (v + altura - 1) // tile + 1)):
+            for coluna in range(u // tile, min(colunas_tiles, (u + largura - 1) // tile + 1)):
+                por_tile[(linha, coluna)].append((caminho, int(u), int(v)))
+
+    nivel0 = os.path.join(saida, "nivel0.npy")
+    canvas = np.lib.format.open_memmap(nivel0, mode="w+", dtype=np.uint8,
+                                       shape=(altura_total, largura_total, 3))
+    del canvas
+    tarefas = []
+    for linha in range(linhas_tiles):
+        tiles = [((linha * tile, min(altura_total, (linha + 1) * tile),
+                   coluna * tile, min(largura_total, (coluna + 1) * tile)), por_tile[(linha, coluna)])
+                 for coluna in range(colunas_tiles) if por_tile.get((linha, coluna))]
+        if tiles:
+            tarefas.append((nivel0, tiles, (largura, altura), transformacao))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processos) as pool:
+        for feitas, _ in enumerate(pool.map(_montar_linha, tarefas), 1):
+            log(f"Mesclagem: linha {feitas}/{len(tarefas)}")
+
+        # Pirâmide: nível 0 na resolução total, cada nível seguinte com a metade
+        niveis = [nivel0]
+        formas = [(altura_total, largura_total)]
+        while max(formas[-1]) > tile:
+            proximo = os.path.join(saida, f"nivel{len(niveis)}.npy")
+            formas.append(reduzir_nivel(niveis[-1], proximo, tile)[:2])
+            niveis.append(proximo)
+        tarefas = []
+        for n, (caminho, forma) in enumerate(zip(niveis, formas)):
+            pasta_nivel = os.path.join(saida, str(n))
+            os.makedirs(pasta_nivel, exist_ok=True)
+            tarefas.extend((caminho, pasta_nivel, linha, tile, qualidade)
+                           for linha in range(math.ceil(forma[0] / tile)))
+        list(pool.map(_gravar_tiles, tarefas))
+
+    visao_geral = np.load(niveis[-1], mmap_mode="r")
+    cv.imwrite(os.path.join(saida, "visao_geral.jpg"), np.ascontiguousarray(visao_geral))
+    del visao_geral
+    if not manter_canvas:
+        for caminho in niveis:
+            os.remove(caminho)
+
+    descricao = {
+        "largura": largura_total,
+        "altura": altura_total,
+        "tile": tile,
+        "niveis": len(niveis),
+        "mm_por_px": mm_por_px,
+        # Coordenada da máquina (mm) do canto superior esquerdo do nível 0
+        "origem_mm": [xmin + deslocamento[0] * mm_por_px, ymax - deslocamento[1] * mm_por_px],
+        "imagens": len(quadros),
+        "refinado": bool(refinar),
+    }
+    with open(os.path.join(saida, "mosaico.json"), "w") as f:
+        json.dump(descricao, f, indent=4)
+    log(f"Mosaico em {saida} ({len(niveis)} níveis, {time.monotonic() - inicio:.1f} s)")
+    return descricao
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monta o mosaico de uma sessão adensada")
+    parser.add_argument("pasta")
+    parser.add_argument("--saida", help="pasta dos tiles (padrão <pasta>/mosaico)")
+    parser.add_argument("--cfg", default="cfg.json")
+    parser.add_argument("--escala", type=float, help="fração da resolução da câmera (padrão do cfg ou 1.0)")
+    parser.add_argument("--refinar", action="store_true", help="refina as posições por correlação de fase")
+    parser.add_argument("--tile", type=int, help=f"lado do tile em pixels (padrão {TAMANHO_TILE})")
+    parser.add_argument("--processos", type=int)
+    parser.add_argument("--manter-canvas", action="store_true", help="mantém os níveis .npy")
+    args = parser.parse_args(argv)
+
+    with open(args.cfg, "r") as f:
+        cfg = json.load(f)
+    opcoes = cfg.get("mosaic", {})
+    montar_mosaico(args.pasta, args.saida, cfg,
+                   escala=args.escala or opcoes.get("scale", 1.0),
+                   refinar=args.refinar or opcoes.get("refine", False),
+                   tile=args.tile or opcoes.get("tile_px", TAMANHO_TILE),
+                   qualidade=opcoes.get("quality", QUALIDADE_TILE),
+                   processos=args.processos, manter_canvas=args.manter_canvas)
+
+
+if __name__ == "__main__":
+    main()
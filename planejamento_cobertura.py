@@ -0,0 +1,133 @@
+"""
+Planejamento de cobertura da captura adensada a partir do campo de visão.
+
+O campo de visão (FOV) vem da calibração da câmera: resolução, tamanho do
+pixel do sensor, distância focal e distância de trabalho (modelo pinhole), ou
+diretamente de uma escala medida em mm/pixel. Com a sobreposição desejada na
+direção da varredura (frontal) e entre linhas (lateral), cada região
+retangular (a mesa inteira ou a caixa de cada planta) é coberta com o menor
+número de posições: o número de imagens por eixo é o mínimo que respeita a
+sobreposição e o passo é distribuído por igual, de borda a borda.
+
+As linhas seguem o zig-zag de gerar_pontos_adensados: colunas em X e
+varredura em Y, alternando o sentido, o que também serve à captura contínua.
+No modo por planta, só o entorno de cada vaso do cfg.json é coberto, com
+micro-grades encadeadas pela rota otimizada entre as plantas.
+"""
+
+import math
+
+import numpy as np
+
+from planejamento_rota import otimizar_rota
+
+RESOLUCAO_PADRAO = (1920, 1080)
+
+
+def campo_visao(resolucao=RESOLUCAO_PADRAO, distancia_mm=None, foco_mm=None, pixel_um=None,
+                mm_por_px=None, girada=False):
+    """
+    Campo de visão (largura em X, altura em Y) em mm na distância de trabalho.
+
+    resolucao: (largura, altura) da imagem em pixels
+    distancia_mm, foco_mm, pixel_um: calibração pinhole (sensor = pixels x pixel_um)
+    mm_por_px: escala medida na distância de trabalho; tem prioridade sobre o pinhole
+    girada: a largura da imagem fica alinhada ao eixo Y da máquina
+    """
+    if mm_por_px is None:
+        if not (distancia_mm and foco_mm and pixel_um):
+            raise ValueError("Calibração da câmera incompleta: informe mm_por_px ou "
+                             "distância de trabalho, foco e tamanho do pixel")
+        mm_por_px = pixel_um / 1000.0 * distancia_mm / foco_mm
+    largura, altura = resolucao[0] * mm_por_px, resolucao[1] * mm_por_px
+    return (altura, largura) if girada else (largura, altura)
+
+
+def campo_visao_cfg(cfg):
+    """Campo de visão a partir do bloco "camera" do cfg.json."""
+    camera = cfg.get("camera", {})
+    return campo_visao(
+        tuple(camera.get("resolution", RESOLUCAO_PADRAO)),
+        camera.get("working_distance_mm"), camera.get("focal_mm"), camera.get("pixel_um"),
+        camera.get("mm_per_px"), camera.get("rotated", False))
+
+
+def posicoes_eixo(inicio, fim, campo, sobreposicao):
+    """
+    Centros das imagens ao longo de um eixo para cobrir [inicio, fim] com
+    sobreposição mínima `sobreposicao` (0 a <1) entre imagens vizinhas.
+    """
+    if not 0 <= sobreposicao < 1:
+        raise ValueError(f"Sobreposição deve estar entre 0 e 1: {sobreposicao}")
+    inicio, fim = min(inicio, fim), max(inicio, fim)
+    comprimento = fim - inicio
+    if comprimento <= campo:
+        return np.array([(inicio + fim) / 2.0])
+    passo_maximo = campo * (1.0 - sobreposicao)
+    quantidade = math.ceil((comprimento - campo) / passo_maximo - 1e-9) + 1
+    return np.linspace(inicio + campo / 2.0, fim - campo / 2.0, quantidade)
+
+
+def grade_cobertura(regiao, campo, frontal=0.6, lateral=0.3):
+    """
+    Pontos (N, 2) que cobrem a região (xmin, ymin, xmax, ymax) em zig-zag:
+    colunas em X (sobreposição lateral), varredura em Y (sobreposição frontal).
+    """
+    xmin, ymin, xmax, ymax = regiao
+    xs = posicoes_eixo(xmin, xmax, campo[0], lateral)
+    ys = posicoes_eixo(ymin, ymax, campo[1], frontal)
+    # Parte do canto mais próximo da origem (0, 0) da máquina
+    if abs(xs[-1]) < abs(xs[0]):
+        xs = xs[::-1]
+    if abs(ys[-1]) < abs(ys[0]):
+        ys = ys[::-1]
+    grade_y = np.tile(ys, (len(xs), 1))
+    grade_y[1::2] = grade_y[1::2, ::-1]
+    return np.column_stack([np.repeat(xs, len(ys)), grade_y.ravel()])
+
+
+def planejar_cobertura(regioes, campo, frontal=0.6, lateral=0.3):
+    """
+    Pontos de captura para uma lista de regiões. Retorna (coords, origem),
+    onde origem[i] é o índice da região do ponto i. Regiões sobrepostas
+    (plantas vizinhas) são cobertas individualmente.
+    """
+    blocos = [grade_cobertura(regiao, campo, frontal, lateral) for regiao in regioes]
+    if not blocos:
+        return np.empty((0, 2)), np.empty(0, dtype=np.int64)
+    origem = np.concatenate([np.full(len(bloco), i) for i, bloco in enumerate(blocos)])
+    return np.vstack(blocos), origem
+
+
+def regioes_plantas(plantas, raio_mm):
+    """Quadrado de lado 2*raio_mm centrado em cada planta {"X", "Y"}."""
+    return [(p["X"] - raio_mm, p["Y"] - raio_mm, p["X"] + raio_mm, p["Y"] + raio_mm)
+            for p in plantas]
+
+
+def micro_grades_plantas(plantas, raio_mm, campo, frontal=0.8, lateral=0.8, custo=None):
+    """
+    Micro-grades de alta sobreposição em volta de cada planta, encadeadas na
+    ordem de menor tempo de deslocamento entre plantas. Cada micro-grade é
+    espelhada para começar no canto mais perto de onde a anterior terminou.
+
+    Retorna (coords, indices), onde indices[i] é a posição em `plantas` da
+    planta do ponto i.
+    """
+    if not plantas:
+        return np.empty((0, 2)), np.empty(0, dtype=np.int64)
+    centros = [(p["X"], p["Y"]) for p in plantas]
+    ordem, _, _ = otimizar_rota(centros, custo)
+    blocos = []
+    indices = []
+    posicao = np.zeros(2)
+    for indice, regiao in zip(ordem, (regioes_plantas(plantas, raio_mm)[i] for i in ordem)):
+        grade = grade_cobertura(regiao, campo, frontal, lateral)
+        centro = np.asarray(centros[indice])
+        variantes = [centro + (grade - centro) * espelho
+                     for espelho in ((1, 1), (-1, 1), (1, -1), (-1, -1))]
+        grade = min(variantes, key=lambda v: np.abs(v[0] - posicao).max())
+        blocos.append(grade)
+        indices.append(np.full(len(grade), indice))
+        posicao = grade[-1]
+    return np.vstack(blocos), np.concatenate(indices)
@@ -0,0 +1,289 @@
+"""
+Planejamento da ordem de visita dos pontos (plantas do cfg.json ou grade do
+pontos.json).
+
+O custo de cada trecho é o tempo de deslocamento do GRBL, e não a distância
+euclidiana: o movimento é retilíneo, mas nenhum eixo pode passar da sua
+velocidade máxima, então uma diagonal custa quase o mesmo que o maior dos dois
+deslocamentos (tempo tipo Chebyshev). A rota sai da origem e volta a ela no
+final, como em run_process e run_dense_process. O modelo de tempo padrão é o
+EstimadorMovimento (estimativa_movimento.py).
+
+A ordem inicial vem do vizinho mais próximo e é refinada com 2-opt e Or-opt
+restritos aos k vizinhos de cada ponto, o que mantém grades de dezenas de
+milhares de pontos em poucos segundos.
+"""
+
+import collections
+import math
+import time
+
+import numpy as np
+
+from estimativa_movimento import EstimadorMovimento
+
+
+def tempo_rota(coords, ordem=None, custo=None, origem=(0.0, 0.0)):
+    """Tempo total de deslocamento: origem -> pontos na ordem -> origem."""
+    custo = custo or EstimadorMovimento()
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if ordem is not None:
+        coords = coords[np.asarray(ordem)]
+    caminho = np.vstack([origem, coords, origem])
+    delta = np.diff(caminho, axis=0)
+    return float(custo.tempos(delta[:, 0], delta[:, 1]).sum())
+
+
+def otimizar_rota(coords, custo=None, origem=(0.0, 0.0), tempo_limite=5.0, k_vizinhos=8):
+    """
+    Calcula a ordem de visita de menor tempo estimado.
+
+    coords: sequência de (X, Y) em mm
+    custo: objeto com tempo(dx, dy) e tempos(dx, dy); padrão EstimadorMovimento()
+    tempo_limite: tempo máximo (s) gasto no refinamento
+
+    Retorna (ordem, tempo_otimizado, tempo_original), onde ordem é um array de
+    índices em coords. Se a ordem original já for melhor, ela é mantida.
+    """
+    custo = custo or EstimadorMovimento()
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    n = len(coords)
+    original = np.arange(n)
+    tempo_original = tempo_rota(coords, original, custo, origem)
+    if n < 3:
+        return original, tempo_original, tempo_original
+
+    limite = time.monotonic() + tempo_limite
+    # Nó 0 é a origem; nós 1..n são os pontos
+    nos = np.vstack([origem, coords])
+    grade = _Grade(nos)
+    tour = _vizinho_mais_proximo(nos, grade, custo)
+    vizinhos = _k_vizinhos(nos, grade, custo, k_vizinhos)
+    _refinar(nos, tour, vizinhos, custo, limite)
+
+    inicio = int(np.where(tour == 0)[0][0])
+    tour = np.roll(tour, -inicio)
+    ordem = tour[1:] - 1
+    tempo_otimizado = tempo_rota(coords, ordem, custo, origem)
+    if tempo_otimizado >= tempo_original:
+        return original, tempo_original, tempo_original
+    return ordem, tempo_otimizado, tempo_original
+
+
+class _Grade:
+    """Índice espacial simples (células quadradas) para buscas de vizinhança."""
+
+    def __init__(self, nos):
+        self.minimo = nos.min(axis=0)
+        extensao = np.maximum(nos.max(axis=0) - self.minimo, 1e-9)
+        # Cerca de dois pontos por célula
+        self.lado = max(math.sqrt(extensao[0] * extensao[1] * 2.0 / len(nos)),
+                        float(extensao.max()) / 1e4, 1e-6)
+        self.celula = np.floor((nos - self.minimo) / self.lado).astype(np.int64)
+        self.dimensao = self.celula.max(axis=0) + 1
+        self.celulas = {}
+        for no, (cx, cy) in enumerate(self.celula.tolist()):
+            self.celulas.setdefault((cx, cy), []).append(no)
+
+    def anel(self, cx, cy, r):
+        """Células na borda do quadrado de raio r em torno de (cx, cy)."""
+        if r == 0:
+            yield (cx, cy)
+            return
+        for dx in range(-r, r + 1):
+            yield (cx + dx, cy - r)
+            yield (cx + dx, cy + r)
+        for dy in range(-r + 1, r):
+            yield (cx - r, cy + dy)
+            yield (cx + r, cy + dy)
+
+
+def _vizinho_mais_proximo(nos, grade, custo):
+    n = len(nos)
+    restantes = {chave: set(valor) for chave, valor in grade.celulas.items()}
+    visitado = np.zeros(n, dtype=bool)
+    tour = np.empty(n, dtype=np.int64)
+    atual = 0
+    raio_maximo = int(grade.dimensao.max())
+    for passo in range(n):
+        tour[passo] = atual
+        visitado[atual] = True
+        restantes[tuple(grade.celula[atual].tolist())].discard(atual)
+        if passo == n - 1:
+            break
+        cx, cy = grade.celula[atual].tolist()
+        candidatos = []
+        r = 0
+        # Procura em anéis; após achar candidatos, inclui mais um anel
+        while r <= raio_maximo:
+            for chave in grade.anel(cx, cy, r):
+                candidatos.extend(restantes.get(chave, ()))
+            if candidatos and r > 0:
+                break
+            r += 1
+            if r > 8 and not candidatos:
+                candidatos = np.flatnonzero(~visitado).tolist()
+                break
+        candidatos = np.asarray(candidatos)
+        delta = nos[candidatos] - nos[atual]
+        atual = int(candidatos[np.argmin(custo.tempos(delta[:, 0], delta[:, 1]))])
+    return tour
+
+
+def _k_vizinhos(nos, grade, custo, k):
+    n = len(nos)
+    vizinhos = [None] * n
+    for (cx, cy), membros in grade.celulas.items():
+        r = 1
+        while True:
+            candidatos = []
+            for dx in range(-r, r + 1):
+                for dy in range(-r, r + 1):
+                    candidatos.extend(grade.celulas.get((cx + dx, cy + dy), ()))
+            if len(candidatos) > k or len(candidatos) >= n or r >= 3:
+                break
+            r += 1
+        candidatos = np.asarray(candidatos)
+        membros = np.asarray(membros)
+        delta = nos[candidatos][None, :, :] - nos[membros][:, None, :]
+        tempos = custo.tempos(delta[..., 0], delta[..., 1])
+        tempos[candidatos[None, :] == membros[:, None]] = np.inf
+        quantidade = min(k, len(candidatos) - 1)
+        if quantidade <= 0:
+            for membro in membros.tolist():
+                vizinhos[membro] = []
+            continue
+        proximos = np.argpartition(tempos, quantidade - 1, axis=1)[:, :quantidade]
+        for linha, membro in enumerate(membros.tolist()):
+            escolhidos = proximos[linha]
+            ordem = np.argsort(tempos[linha, escolhidos])
+            vizinhos[membro] = candidatos[escolhidos[ordem]].tolist()
+    return vizinhos
+
+
+def _refinar(nos, tour, vizinhos, custo, limite, eps=1e-9):
+    """
+    Aplica 2-opt e Or-opt (segmentos de 1 a 3 pontos) a partir de uma fila de
+    pontos ativos: só os extremos das arestas alteradas voltam para a fila.
+    """
+    m = len(tour)
+    xs = nos[:, 0].tolist()
+    ys = nos[:, 1].tolist()
+    tempo = custo.tempo
+    cache = {}
+
+    def c(a, b):
+        chave = a * m + b if a < b else b * m + a
+        valor = cache.get(chave)
+        if valor is None:
+            valor = cache[chave] = tempo(xs[a] - xs[b], ys[a] - ys[b])
+        return valor
+
+    pos = np.empty(m, dtype=np.int64)
+    pos[tour] = np.arange(m)
+
+    def prox(no):
+        return int(tour[(pos[no] + 1) % m])
+
+    def ant(no):
+        return int(tour[(pos[no] - 1) % m])
+
+    def reescrever(inicio, nos_novos):
+        indices = (inicio + np.arange(len(nos_novos))) % m
+        tour[indices] = nos_novos
+        pos[nos_novos] = indices
+
+    def inverter(i, j):
+        # Inverte as posições i..j (sentido crescente, circular); inverter o
+        # complemento gera o mesmo ciclo, então inverte o trecho mais curto
+        tamanho = (j - i) % m + 1
+        if 2 * tamanho > m:
+            i, j, tamanho = (j + 1) % m, (i - 1) % m, m - tamanho
+        trecho = tour[(i + np.arange(tamanho)) % m]
+        reescrever(i, trecho[::-1].copy())
+
+    def mover(i, tamanho, v, inverte):
+        # Move o segmento que começa na posição i para logo após o nó v
+        segmento = tour[(i + np.arange(tamanho)) % m].copy()
+        if inverte:
+            segmento = segmento[::-1]
+        j = int(pos[v])
+        adiante = (j - i) % m
+        atras = (i - j) % m
+        if adiante < atras:
+            meio = tour[(i + tamanho + np.arange(adiante - tamanho + 1)) % m].copy()
+            reescrever(i, np.concatenate([meio, segmento]))
+        else:
+            meio = tour[(j + 1 + np.arange(atras - 1)) % m].copy()
+            reescrever((j + 1) % m, np.concatenate([segmento, meio]))
+
+    fila = collections.deque(range(m))
+    na_fila = np.ones(m, dtype=bool)
+
+    def ativar(*nos_alterados):
+        for no in nos_alterados:
+            if not na_fila[no]:
+                na_fila[no] = True
+                fila.append(no)
+
+    while fila and time.monotonic() < limite:
+        a = fila.popleft()
+        na_fila[a] = False
+        melhorou = False
+
+        # 2-opt nos dois sentidos: troca (a, a+1) e (b, b+1) por (a, b) e (a+1, b+1)
+        for sentido in (prox, ant):
+            a_viz = sentido(a)
+            d_a = c(a, a_viz)
+            for b in vizinhos[a]:
+                d_ab = c(a, b)
+                if d_ab >= d_a - eps:
+                    break
+                b_viz = sentido(b)
+                if b == a_viz or b_viz == a:
+                    continue
+                if d_ab + c(a_viz, b_viz) - d_a - c(b, b_viz) < -eps:
+                    if sentido is prox:
+                        inverter((int(pos[a]) + 1) % m, int(pos[b]))
+                    else:
+                        inverter(int(pos[b]), (int(pos[a]) - 1) % m)
+                    ativar(a, a_viz, b, b_viz)
+                    melhorou = True
+                    break
+            if melhorou:
+                break
+        if melhorou:
+            ativar(a)
+            continue
+
+        # Or-opt: move o segmento iniciado em a para junto de um vizinho
+        for tamanho in (1, 2, 3):
+            if tamanho >= m - 2:
+                break
+            i = int(pos[a])
+            segmento = [int(tour[(i + k) % m]) for k in range(tamanho)]
+            primeiro, ultimo = segmento[0], segmento[-1]
+            anterior, seguinte = ant(primeiro), prox(ultimo)
+            ganho = c(anterior, primeiro) + c(ultimo, seguinte) - c(anterior, seguinte)
+            if ganho <= eps:
+                continue
+            melhor = None
+            for extremo in (primeiro, ultimo) if tamanho > 1 else (primeiro,):
+                for v in vizinhos[extremo]:
+                    if v in segmento:
+                        continue
+                    v_prox = prox(v)
+                    if v_prox in segmento:
+                        continue
+                    base = c(v, v_prox)
+                    direto = c(v, primeiro) + c(ultimo, v_prox) - base
+                    invertido = c(v, ultimo) + c(primeiro, v_prox) - base
+                    acrescimo = min(direto, invertido)
+                    if acrescimo < ganho - eps and (melhor is None or acrescimo < melhor[0]):
+                        melhor = (acrescimo, v, v_prox, invertido < direto)
+            if melhor is not None:
+                _, v, v_prox, inverte = melhor
+                mover(i, tamanho, v, inverte)
+                ativar(a, anterior, seguinte, primeiro, ultimo, v, v_prox)
+                break
+    return tour
@@ -0,0 +1,178 @@
+"""
+Ponte entre as threads de trabalho (captura, leitura do GRBL) e o Tk.
+
+O Tk não é thread-safe: widgets só podem ser alterados pela thread principal.
+As rotinas de captura apenas enfileiram mensagens aqui; a thread principal
+drena tudo periodicamente com root.after(), inserindo as linhas de log em lote
+e aplicando só o último valor de progresso, status e imagem de cada intervalo.
+O log é um anel limitado: as linhas mais antigas são descartadas, então
+execuções longas não acumulam memória nem deixam o widget lento.
+
+A pré-visualização é reduzida ao tamanho do canvas por uma thread própria,
+limitada a `fps_preview` quadros por segundo; frames intermediários são
+descartados. O canvas tem um único item de imagem, cujo PhotoImage é
+atualizado no lugar.
+"""
+
+import queue
+import threading
+import time
+
+import cv2 as cv
+from PIL import Image
+
+
+class PonteInterface:
+    """
+    Canal thread-safe para atualizar a interface.
+
+    app: App com log_text, status_label, progress_bar, progress_text, image_label e canvas
+    intervalo_ms: período de atualização da interface
+    max_linhas: linhas mantidas no log
+    fps_preview: limite de quadros por segundo da pré-visualização
+    """
+
+    def __init__(self, app, intervalo_ms=100, max_linhas=2000, fps_preview=10.0):
+        self.app = app
+        self.root = app.root
+        self.intervalo_ms = intervalo_ms
+        self.max_linhas = max_linhas
+        self.periodo_preview = 1.0 / fps_preview if fps_preview > 0 else 0.0
+        self.linhas = queue.SimpleQueue()
+        self.chamadas = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self._status = None
+        self._progresso = None
+        self._imagem = None
+        self.descartadas = 0
+        # Pré-visualização: frame bruto mais recente -> thread de redução -> Tk
+        self.cond_preview = threading.Condition()
+        self._frame = None
+        self._tamanho_canvas = (int(app.canvas['width']), int(app.canvas['height']))
+        self._item_imagem = None
+        self._photo = None
+        self.frames_descartados = 0
+
+    def iniciar(self):
+        threading.Thread(target=self._renderizar, daemon=True).start()
+        self.root.after(self.intervalo_ms, self._drenar)
+        return self
+
+    # Chamados de qualquer thread
+
+    def log(self, mensagem):
+        self.linhas.put(mensagem)
+
+    def status(self, texto):
+        with self.lock:
+            self._status = texto
+
+    def progresso(self, percentual, texto):
+        with self.lock:
+            self._progresso = (percentual, texto)
+
+    def imagem(self, frame, legenda):
+        """frame: imagem BGR do OpenCV; só a mais recente é exibida. Não bloqueia."""
+        with self.cond_preview:
+            if self._frame is not None:
+                self.frames_descartados += 1
+            self._frame = (frame, legenda)
+            self.cond_preview.notify()
+
+    def chamar(self, funcao, *args):
+        """Executa funcao(*args) na thread principal."""
+        self.chamadas.put((funcao, args))
+
+    # Thread de pré-visualização
+
+    def _renderizar(self):
+        proximo = 0.0
+        while True:
+            with self.cond_preview:
+                while self._frame is None:
+                    self.cond_preview.wait()
+            # Limite de FPS: espera o intervalo e pega o frame mais recente
+            espera = proximo - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            with self.cond_preview:
+                frame, legenda = self._frame
+                self._frame = None
+                largura, altura = self._tamanho_canvas
+            proximo = time.monotonic() + self.periodo_preview
+            escala = min(largura / frame.shape[1], altura / frame.shape[0])
+            tamanho = (max(1, int(frame.shape[1] * escala)), max(1, int(frame.shape[0] * escala)))
+            reduzido = cv.resize(frame, tamanho, interpolation=cv.INTER_AREA)
+            imagem = Image.fromarray(cv.cvtColor(reduzido, cv.COLOR_BGR2RGB))
+            with self.lock:
+                self._imagem = (imagem, legenda)
+
+    # Thread principal
+
+    def _drenar(self):
+        try:
+            self._aplicar()
+        finally:
+            self.root.after(self.intervalo_ms, self._drenar)
+
+    def _aplicar(self):
+        linhas = []
+        while True:
+            try:
+                linhas.append(self.linhas.get_nowait())
+            except queue.Empty:
+                break
+        if linhas:
+            self._inserir_log(linhas)
+
+        with self.lock:
+            status, self._status = self._status, None
+            progresso, self._progresso = self._progresso, None
+            imagem, self._imagem = self._imagem, None
+        app = self.app
+        if status is not None:
+            app.status_label.config(text=f"Status: {status}")
+        if progresso is not None:
+            app.progress_bar['value'] = progresso[0]
+            app.progress_text.config(text=progresso[1])
+        if imagem is not None:
+            self._mostrar(*imagem)
+
+        while True:
+            try:
+                funcao, args = self.chamadas.get_nowait()
+            except queue.Empty:
+                break
+            funcao(*args)
+
+    def _mostrar(self, imagem, legenda):
+        from PIL import ImageTk
+        app = self.app
+        if self._photo is not None and (self._photo.width(), self._photo.height()) == imagem.size:
+            self._photo.paste(imagem)
+        else:
+            self._photo = ImageTk.PhotoImage(image=imagem)
+            if self._item_imagem is None:
+                self._item_imagem = app.canvas.create_image(0, 0, anchor='nw', image=self._photo)
+            else:
+                app.canvas.itemconfig(self._item_imagem, image=self._photo)
+            app.canvas.image = self._photo
+        app.image_label.config(text=f"Imagem Atual: {legenda}")
+        largura, altura = app.canvas.winfo_width(), app.canvas.winfo_height()
+        if largura > 1 and altura > 1:
+            with self.cond_preview:
+                self._tamanho_canvas = (largura, altura)
+
+    def _inserir_log(self, linhas):
+        # Do lote, só as últimas max_linhas chegariam a ficar no widget
+        if len(linhas) > self.max_linhas:
+            self.descartadas += len(linhas) - self.max_linhas
+            linhas = linhas[-self.max_linhas:]
+        texto = self.app.log_text
+        texto.insert('end', "\n".join(linhas) + "\n")
+        total = int(texto.index('end-1c').split('.')[0]) - 1
+        excesso = total - self.max_linhas
+        if excesso > 0:
+            self.descartadas += excesso
+            texto.delete('1.0', f'{excesso + 1}.0')
+        texto.see('end')
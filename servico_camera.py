@@ -0,0 +1,506 @@
+"""
+Serviço de câmera: leitura contínua do cv.VideoCapture em uma thread própria.
+
+Os frames vão para um buffer circular pequeno com o instante estimado do
+início da exposição, de modo que a captura pode pedir "o primeiro frame cuja
+exposição começou depois que a máquina parou", sem sleeps fixos e sem frames
+antigos presos no buffer do driver.
+
+ServicoCamera mantém a câmera aberta durante toda a vida do aplicativo: na
+primeira execução de cada sala espera a exposição automática convergir, trava
+exposição, balanço de branco e foco e guarda os valores por sala; as execuções
+seguintes começam a capturar na hora, com frames comparáveis entre si.
+
+GrupoCameras reúne as câmeras do pórtico (RGB e multiespectral), cada uma com
+o seu serviço e o seu grabber lendo em paralelo. Em cada parada os frames de
+todas são pedidos ao mesmo tempo, então a parada dura o atraso da câmera mais
+lenta, e a defasagem entre os inícios de exposição fica registrada.
+"""
+
+import collections
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+import time
+
+import cv2 as cv
+import numpy as np
+
+ARQUIVO_AJUSTES = "camera_ajustes.json"
+
+# Câmeras do mesmo grupo aquecem em paralelo e gravam no mesmo arquivo de ajustes
+_LOCK_AJUSTES = threading.Lock()
+
+BACKENDS = {
+    "dshow": cv.CAP_DSHOW,
+    "msmf": cv.CAP_MSMF,
+    "v4l2": cv.CAP_V4L2,
+    "any": cv.CAP_ANY,
+}
+
+# Valores de CAP_PROP_AUTO_EXPOSURE (automático, manual): cada backend usa os seus
+_AUTO_EXPOSICAO = {
+    "v4l2": (3, 1),
+    "dshow": (0.75, 0.25),
+    "msmf": (0.75, 0.25),
+}
+
+# Controles travados depois do aquecimento, na ordem em que são aplicados
+_CONTROLES = (
+    ("exposicao", cv.CAP_PROP_EXPOSURE),
+    ("ganho", cv.CAP_PROP_GAIN),
+    ("temperatura_wb", cv.CAP_PROP_WB_TEMPERATURE),
+    ("foco", cv.CAP_PROP_FOCUS),
+)
+
+
+class FrameGrabber:
+    """
+    Drena o VideoCapture continuamente.
+
+    cam: cv.VideoCapture já aberto e configurado
+    tamanho: quantidade de frames guardados no buffer circular
+    latencia: atraso extra (s) entre o fim da exposição e a entrega do frame;
+    None (padrão) usa um período de frame, margem para pipelines USB/DSHOW
+    que entregam o frame um período ou mais depois da leitura do sensor
+    """
+
+    def __init__(self, cam, tamanho=4, latencia=None):
+        self.cam = cam
+        self.latencia = latencia
+        self.frames = collections.deque(maxlen=tamanho)
+        self.cond = threading.Condition()
+        self.periodo = 1.0 / 30.0
+        self.sequencia = 0
+        self.falhas = 0
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+        with self.cond:
+            self.cond.notify_all()
+
+    def _executar(self):
+        ultimo = None
+        while not self._parar.is_set():
+            ret, frame = self.cam.read()
+            chegada = time.monotonic()
+            if not ret:
+                self.falhas += 1
+                time.sleep(0.01)
+                continue
+            if ultimo is not None:
+                # Média móvel do intervalo entre frames (período do sensor)
+                self.periodo = 0.9 * self.periodo + 0.1 * min(chegada - ultimo, 1.0)
+            ultimo = chegada
+            # O frame entregue agora começou a ser exposto cerca de um período
+            # antes, mais o atraso de entrega do driver
+            latencia = self.periodo if self.latencia is None else self.latencia
+            inicio_exposicao = chegada - self.periodo - latencia
+            with self.cond:
+                self.sequencia += 1
+                self.frames.append((inicio_exposicao, chegada, self.sequencia, frame))
+                self.cond.notify_all()
+
+    def frame_apos(self, t, timeout=2.0):
+        """
+        Retorna (frame, inicio_exposicao) do primeiro frame cuja exposição
+        começou em t ou depois (time.monotonic), esperando até timeout.
+        Retorna (None, None) se nenhum frame chegar a tempo.
+        """
+        limite = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                for inicio_exposicao, _, _, frame in self.frames:
+                    if inicio_exposicao >= t:
+                        return frame, inicio_exposicao
+                restante = limite - time.monotonic()
+                if restante <= 0 or self._parar.is_set():
+                    return None, None
+                self.cond.wait(restante)
+
+    def frame_proximo(self, t, timeout=2.0):
+        """
+        Retorna (frame, inicio_exposicao) do frame do buffer cuja exposição
+        começou mais perto de t, esperando até existir um frame posterior a t.
+        Usado na captura em movimento, quando o instante desejado já passou.
+        """
+        limite = time.monotonic() + timeout
+        with self.cond:
+            while not self.frames or self.frames[-1][0] < t:
+                restante = limite - time.monotonic()
+                if restante <= 0 or self._parar.is_set():
+                    break
+                self.cond.wait(restante)
+            if not self.frames:
+                return None, None
+            inicio_exposicao, _, _, frame = min(self.frames, key=lambda item: abs(item[0] - t))
+            return frame, inicio_exposicao
+
+    def ultimo_frame(self):
+        """Frame mais recente (ou None), sem esperar."""
+        with self.cond:
+            return self.frames[-1][3] if self.frames else None
+
+    def redimensionar(self, tamanho):
+        """Ajusta a quantidade de frames do buffer, mantendo os mais recentes."""
+        with self.cond:
+            if self.frames.maxlen != tamanho:
+                self.frames = collections.deque(self.frames, maxlen=tamanho)
+
+
+def nome_backend(nome=None):
+    """Backend do cfg ("auto", "dshow", "msmf", "v4l2" ou "any") resolvido para o sistema."""
+    nome = (nome or "auto").lower()
+    if nome == "auto":
+        return "dshow" if sys.platform.startswith("win") else "v4l2" if sys.platform.startswith("linux") else "any"
+    if nome not in BACKENDS:
+        raise ValueError(f"Backend de câmera desconhecido: {nome}")
+    return nome
+
+
+def abrir_camera(cfg_camera=None):
+    """
+    cv.VideoCapture aberto e configurado pelo bloco "camera" do cfg.json
+    (index, backend, resolution, fourcc, fps). Levanta RuntimeError se a
+    câmera não abrir.
+    """
+    cfg_camera = cfg_camera or {}
+    backend = nome_backend(cfg_camera.get("backend"))
+    indice = cfg_camera.get("index", 0)
+    cam = cv.VideoCapture(indice, BACKENDS[backend])
+    if not cam.isOpened():
+        raise RuntimeError(f"Câmera {indice} ({backend}) não abriu")
+    fourcc = cfg_camera.get("fourcc")
+    if fourcc:
+        # MJPG permite 1920x1080 a 30 fps na maioria das câmeras USB
+        cam.set(cv.CAP_PROP_FOURCC, cv.VideoWriter_fourcc(*fourcc))
+    largura, altura = cfg_camera.get("resolution", (1920, 1080))
+    cam.set(cv.CAP_PROP_FRAME_WIDTH, largura)
+    cam.set(cv.CAP_PROP_FRAME_HEIGHT, altura)
+    if cfg_camera.get("fps"):
+        cam.set(cv.CAP_PROP_FPS, cfg_camera["fps"])
+    # Buffer mínimo no driver: o buffer circular fica com o FrameGrabber
+    cam.set(cv.CAP_PROP_BUFFERSIZE, 1)
+    return cam
+
+
+class ServicoCamera:
+    """
+    Câmera aberta uma vez e compartilhada pelas execuções.
+
+    cfg_camera: bloco "camera" do cfg.json; além de index, backend,
+    resolution, fourcc e fps usa name (padrão "rgb"), warmup_s (limite da
+    espera pela exposição automática), lock_settings (trava exposição/balanço
+    de branco/foco), settings_file (ajustes travados por câmera e sala) e
+    latency_s (atraso de entrega dos frames; padrão um período de frame)
+    """
+
+    def __init__(self, cfg_camera=None, log=None):
+        self.cfg = dict(cfg_camera or {})
+        self.nome = self.cfg.get("name", "rgb")
+        self.backend = nome_backend(self.cfg.get("backend"))
+        self.arquivo_ajustes = self.cfg.get("settings_file", ARQUIVO_AJUSTES)
+        self.log = log or (lambda mensagem: None)
+        self.cam = None
+        self.grabber = None
+        self.sala = None
+        self.ajustes = None
+
+    def aberta(self):
+        return self.cam is not None
+
+    def mesma_configuracao(self, cfg_camera):
+        """True se o bloco "camera" não mudou desde a abertura (senão é preciso reabrir)."""
+        return dict(cfg_camera or {}) == self.cfg
+
+    def preparar(self, sala=None, tamanho=4, log=None):
+        """
+        Deixa a câmera pronta para uma execução e retorna o FrameGrabber.
+
+        Abre a câmera se preciso e, quando a sala muda (ou na primeira vez),
+        aplica os ajustes guardados da sala ou faz o aquecimento e trava os
+        valores convergidos. Para a mesma sala nada é refeito.
+        tamanho: frames no buffer circular do grabber
+        """
+        if log is not None:
+            self.log = log
+        if self.cam is None:
+            self.cam = abrir_camera(self.cfg)
+            self.sala = None
+            largura = self.cam.get(cv.CAP_PROP_FRAME_WIDTH)
+            altura = self.cam.get(cv.CAP_PROP_FRAME_HEIGHT)
+            self.log(f"-> Camera {self.nome} aberta ({self.backend}, {largura:.0f}x{altura:.0f})")
+        if self.grabber is None or sala != self.sala:
+            # Ajustes mudam só com a leitura parada: o VideoCapture não é thread-safe
+            if self.grabber is not None:
+                self.grabber.parar()
+            self._ajustar_sala(sala)
+            self.grabber = FrameGrabber(self.cam, tamanho, self.cfg.get("latency_s"))
+            self.grabber.iniciar()
+        else:
+            self.grabber.redimensionar(tamanho)
+        return self.grabber
+
+    def _ajustar_sala(self, sala):
+        self.sala = sala
+        if not self.cfg.get("lock_settings", True):
+            self.ajustes = None
+            self.aquecer()
+            return
+        guardados = self._carregar_ajustes().get(sala or "")
+        if guardados:
+            self._aplicar(guardados)
+            # Alguns frames para os valores novos chegarem ao sensor
+            self._descartar(5)
+            self.ajustes = guardados
+            self.log(f"-> Ajustes da câmera {self.nome} para {sala}: {self._descrever(guardados)}")
+            return
+        segundos = self.aquecer()
+        self.ajustes = self.travar()
+        self.log(f"-> Câmera {self.nome}: exposição convergiu em {segundos:.1f} s; travado: {self._descrever(self.ajustes)}")
+        with _LOCK_AJUSTES:
+            todos = self._carregar_ajustes()
+            todos[sala or ""] = self.ajustes
+            self._salvar_ajustes(todos)
+
+    def aquecer(self):
+        """
+        Lê frames, com os automáticos ligados, até o brilho médio estabilizar
+        (variação < 2% em 10 frames seguidos) ou até warmup_s. Retorna os
+        segundos gastos.
+        """
+        self._automatico(True)
+        inicio = time.monotonic()
+        limite = inicio + self.cfg.get("warmup_s", 5.0)
+        brilhos = collections.deque(maxlen=10)
+        while time.monotonic() < limite:
+            ret, frame = self.cam.read()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            pequeno = cv.resize(frame, (64, 36), interpolation=cv.INTER_AREA)
+            brilhos.append(float(pequeno.mean()))
+            if len(brilhos) == brilhos.maxlen and \
+                    max(brilhos) - min(brilhos) <= 0.02 * max(max(brilhos), 1.0):
+                break
+        return time.monotonic() - inicio
+
+    def travar(self):
+        """Desliga os automáticos mantendo os valores atuais. Retorna os valores travados."""
+        # -1 indica propriedade não suportada; 0 é um valor válido (ganho ou
+        # foco 0), então o suporte é confirmado pelo retorno de cam.set
+        ajustes = {nome: self.cam.get(propriedade) for nome, propriedade in _CONTROLES}
+        return self._aplicar({nome: valor for nome, valor in ajustes.items() if valor != -1.0})
+
+    def exposicao_s(self):
+        """
+        Exposição travada em segundos, ou None sem valor travado ou com backend
+        de unidade desconhecida. DSHOW/MSMF usam log2 dos segundos (-6 = 15,6
+        ms) e V4L2 unidades de 100 µs.
+        """
+        valor = (self.ajustes or {}).get("exposicao")
+        if valor is None:
+            return None
+        if self.backend in ("dshow", "msmf"):
+            return 2.0 ** valor
+        if self.backend == "v4l2" and valor > 0:
+            return valor * 1e-4
+        return None
+
+    def _automatico(self, ligado):
+        auto, manual = _AUTO_EXPOSICAO.get(self.backend, (0.75, 0.25))
+        self.cam.set(cv.CAP_PROP_AUTO_EXPOSURE, auto if ligado else manual)
+        self.cam.set(cv.CAP_PROP_AUTO_WB, 1 if ligado else 0)
+        self.cam.set(cv.CAP_PROP_AUTOFOCUS, 1 if ligado else 0)
+
+    def _aplicar(self, ajustes):
+        """Desliga os automáticos e aplica os valores; retorna os aceitos pelo driver."""
+        self._automatico(False)
+        aceitos = {}
+        for nome, propriedade in _CONTROLES:
+            if nome in ajustes and self.cam.set(propriedade, ajustes[nome]):
+                aceitos[nome] = ajustes[nome]
+        return aceitos
+
+    def _descartar(self, quantidade):
+        for _ in range(quantidade):
+            self.cam.grab()
+
+    @staticmethod
+    def _descrever(ajustes):
+        return ", ".join(f"{nome}={valor:g}" for nome, valor in ajustes.items()) or "sem controles manuais"
+
+    def _carregar_ajustes(self):
+        if not os.path.exists(self.arquivo_ajustes):
+            return {}
+        try:
+            with open(self.arquivo_ajustes, "r") as f:
+                return json.load(f).get(self.nome, {})
+        except (OSError, ValueError):
+            return {}
+
+    def _salvar_ajustes(self, sala_ajustes):
+        todos = {}
+        if os.path.exists(self.arquivo_ajustes):
+            try:
+                with open(self.arquivo_ajustes, "r") as f:
+                    todos = json.load(f)
+            except (OSError, ValueError):
+                todos = {}
+        todos[self.nome] = sala_ajustes
+        try:
+            with open(self.arquivo_ajustes, "w") as f:
+                json.dump(todos, f, indent=4)
+        except OSError as e:
+            self.log(f"Erro ao salvar {self.arquivo_ajustes}: {e}")
+
+    def esquecer_ajustes(self, sala=None):
+        """Descarta os ajustes guardados da sala: a próxima execução refaz o aquecimento."""
+        with _LOCK_AJUSTES:
+            todos = self._carregar_ajustes()
+            todos.pop(sala or "", None)
+            self._salvar_ajustes(todos)
+        if sala == self.sala:
+            self.sala = None
+            if self.grabber is not None:
+                self.grabber.parar()
+                self.grabber = None
+
+    def fechar(self):
+        if self.grabber is not None:
+            self.grabber.parar()
+            self.grabber = None
+        if self.cam is not None:
+            self.cam.release()
+            self.cam = None
+        self.sala = None
+
+
+def separar_bandas(frame, nomes=None):
+    """
+    Frame de uma câmera como array (altura, largura, k) e os nomes das k
+    bandas. nomes: bandas do cfg; com menos nomes que canais (câmera
+    monocromática entregue em BGR) ficam só os primeiros canais.
+    """
+    planos = frame if frame.ndim == 3 else frame[:, :, None]
+    if not nomes:
+        return planos, [f"b{i}" for i in range(planos.shape[2])]
+    if len(nomes) > planos.shape[2]:
+        raise ValueError(f"{len(nomes)} bandas configuradas para um frame de {planos.shape[2]} canais")
+    return planos[:, :, :len(nomes)], list(nomes)
+
+
+class GrupoCameras:
+    """
+    Câmeras disparadas juntas em cada parada.
+
+    cfgs_cameras: blocos de câmera do cfg.json; o primeiro é a câmera principal
+    (RGB, gravada em JPEG com EXIF) e os demais são as câmeras extras, com
+    bands opcional (nomes das bandas de cada canal)
+    empilhar: grava as bandas das câmeras extras de uma parada em um único
+    .npy (altura, largura, bandas) em vez de um arquivo por câmera
+    """
+
+    def __init__(self, cfgs_cameras, empilhar=True, log=None):
+        self.cfgs = [dict(cfg) for cfg in cfgs_cameras]
+        self.empilhar = empilhar
+        self.servicos = [ServicoCamera(cfg, log) for cfg in self.cfgs]
+        nomes = [servico.nome for servico in self.servicos]
+        if len(set(nomes)) != len(nomes):
+            raise ValueError(f"Nomes de câmera repetidos: {nomes}")
+        self.principal = self.servicos[0]
+        self.extras = self.servicos[1:]
+        self._pool = None
+
+    def mesma_configuracao(self, cfgs_cameras, empilhar=True):
+        return [dict(cfg) for cfg in cfgs_cameras] == self.cfgs and empilhar == self.empilhar
+
+    def _em_paralelo(self, funcao, servicos):
+        if len(servicos) == 1:
+            return [funcao(servicos[0])]
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=len(self.servicos), thread_name_prefix="camera")
+        return list(self._pool.map(funcao, servicos))
+
+    def preparar(self, sala=None, tamanho=4, log=None):
+        """Prepara todas as câmeras (aquecimento em paralelo). Retorna o grabber da principal."""
+        grabbers = self._em_paralelo(lambda servico: servico.preparar(sala, tamanho, log), self.servicos)
+        return grabbers[0]
+
+    def capturar(self, t, timeout=2.0, proximo=False, servicos=None):
+        """
+        {nome: (frame, inicio_exposicao)} com o primeiro frame de cada câmera
+        exposto a partir de t (proximo=True: o mais perto de t, para a captura
+        em movimento). As esperas correm em paralelo: o tempo total é o da
+        câmera mais lenta. Câmera sem frame a tempo vem com (None, None).
+        servicos: câmeras consultadas (padrão: todas)
+        """
+        servicos = servicos if servicos is not None else self.servicos
+
+        def ler(servico):
+            if proximo:
+                return servico.grabber.frame_proximo(t, timeout)
+            return servico.grabber.frame_apos(t, timeout)
+
+        return dict(zip((servico.nome for servico in servicos), self._em_paralelo(ler, servicos)))
+
+    @staticmethod
+    def defasagem(quadros):
+        """Diferença (s) entre o primeiro e o último início de exposição dos quadros."""
+        inicios = [inicio for _, inicio in quadros.values() if inicio is not None]
+        return max(inicios) - min(inicios) if len(inicios) > 1 else 0.0
+
+    def arquivos_extras(self, quadros, base):
+        """
+        Arquivos das câmeras extras para os quadros de uma parada:
+        [(caminho, array, descrição)], com caminho derivado de base (caminho
+        sem extensão do arquivo principal). A descrição traz as câmeras, as
+        bandas e o atraso (ms) de cada câmera em relação à principal.
+        """
+        inicio_principal = quadros.get(self.principal.nome, (None, None))[1]
+        separados = []
+        for servico in self.extras:
+            frame, inicio = quadros.get(servico.nome, (None, None))
+            if frame is None:
+                continue
+            planos, bandas = separar_bandas(frame, servico.cfg.get("bands"))
+            atraso = None
+            if inicio is not None and inicio_principal is not None:
+                atraso = round(1000 * (inicio - inicio_principal), 2)
+            separados.append((servico.nome, planos, bandas, atraso))
+        if not separados:
+            return []
+        formatos = {planos.shape[:2] for _, planos, _, _ in separados}
+        if self.empilhar and len(formatos) == 1:
+            pilha = np.concatenate([planos for _, planos, _, _ in separados], axis=2)
+            return [(f"{base}_bandas.npy", pilha, {
+                "cameras": [nome for nome, _, _, _ in separados],
+                "bandas": [banda for _, _, bandas, _ in separados for banda in bandas],
+                "atraso_ms": {nome: atraso for nome, _, _, atraso in separados}})]
+        arquivos = []
+        for nome, planos, bandas, atraso in separados:
+            # PNG sem perdas quando o número de canais permite; senão .npy
+            extensao = ".png" if planos.shape[2] in (1, 3, 4) else ".npy"
+            arquivos.append((f"{base}_{nome}{extensao}", planos, {
+                "cameras": [nome], "bandas": bandas, "atraso_ms": {nome: atraso}}))
+        return arquivos
+
+    def fechar(self):
+        for servico in self.servicos:
+            servico.fechar()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
@@ -0,0 +1,428 @@
+"""
+Simulador de GRBL 1.1 em um pseudo-terminal (Linux).
+
+Permite rodar run_process, run_dense_process e multi_images_capture sem o
+Arduino: basta apontar o "port" do cfg.json para o caminho exibido (ou para o
+link criado com --link). Responde $X, $H, $, $$, $N=valor, ?, G0/G1/G4,
+G90/G91 e F com "ok"/"error:N" e relatórios <Run|...>/<Idle|...>, simulando o
+tempo de cada movimento a partir da velocidade máxima, aceleração, tamanho do
+buffer de recepção e do planejador.
+
+Uso:
+    python simulador_grbl.py --link /tmp/grbl_sim
+"""
+
+import argparse
+import collections
+import math
+import os
+import re
+import select
+import sys
+import time
+
+CONFIGURACOES_PADRAO = {
+    0: 10, 1: 25, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0, 10: 1, 11: 0.010, 12: 0.002,
+    13: 0, 20: 0, 21: 0, 22: 1, 23: 0, 24: 25.0, 25: 500.0, 26: 250, 27: 1.0,
+    30: 1000, 31: 0, 32: 0,
+    100: 250.0, 101: 250.0, 102: 250.0,
+    110: 5000.0, 111: 5000.0, 112: 500.0,
+    120: 50.0, 121: 50.0, 122: 10.0,
+    130: 1000.0, 131: 2100.0, 132: 200.0,
+}
+
+EIXOS = "XYZ"
+_RE_PALAVRA = re.compile(r"([A-Z])([-+]?\d*\.?\d+)")
+
+
+def tempo_trapezio(distancia, velocidade, aceleracao):
+    """Tempo (s) de um movimento que parte e termina parado."""
+    if distancia <= 0:
+        return 0.0
+    if distancia >= velocidade * velocidade / aceleracao:
+        return distancia / velocidade + velocidade / aceleracao
+    return 2.0 * math.sqrt(distancia / aceleracao)
+
+
+def distancia_percorrida(t, distancia, velocidade, aceleracao):
+    """Distância (mm) percorrida após t segundos no perfil trapezoidal."""
+    t_acel = velocidade / aceleracao
+    if distancia < velocidade * t_acel:  # perfil triangular
+        t_acel = math.sqrt(distancia / aceleracao)
+        velocidade = aceleracao * t_acel
+    d_acel = 0.5 * aceleracao * t_acel * t_acel
+    t_cruzeiro = (distancia - 2 * d_acel) / velocidade
+    if t <= t_acel:
+        return 0.5 * aceleracao * t * t
+    if t <= t_acel + t_cruzeiro:
+        return d_acel + velocidade * (t - t_acel)
+    t_desacel = min(t - t_acel - t_cruzeiro, t_acel)
+    return min(distancia, d_acel + velocidade * t_cruzeiro
+               + velocidade * t_desacel - 0.5 * aceleracao * t_desacel * t_desacel)
+
+
+class Bloco:
+    """Segmento linear no planejador do simulador."""
+
+    def __init__(self, inicio, fim, feed_mm_min, configuracoes, rapido=False, escala=1.0):
+        self.inicio = inicio
+        self.escala = escala
+        self.fim = fim
+        delta = [f - i for i, f in zip(inicio, fim)]
+        self.distancia = math.sqrt(sum(d * d for d in delta))
+        self.t_inicio = None
+        self.duracao = 0.0
+        self.velocidade = 0.0
+        self.aceleracao = 1.0
+        if self.distancia == 0:
+            return
+        # Como no planejador do GRBL, nenhum eixo pode exceder seu limite
+        velocidade = math.inf if rapido else feed_mm_min / 60.0
+        aceleracao = math.inf
+        for eixo, d in enumerate(delta):
+            fracao = abs(d) / self.distancia
+            if fracao > 0:
+                velocidade = min(velocidade, configuracoes[110 + eixo] / 60.0 / fracao)
+                aceleracao = min(aceleracao, configuracoes[120 + eixo] / fracao)
+        self.velocidade = velocidade
+        self.aceleracao = aceleracao
+        self.duracao = tempo_trapezio(self.distancia, velocidade, aceleracao) / escala
+
+    def posicao(self, t):
+        if self.distancia == 0 or self.t_inicio is None:
+            return self.inicio
+        s = distancia_percorrida((t - self.t_inicio) * self.escala, self.distancia,
+                                 self.velocidade, self.aceleracao)
+        fracao = min(1.0, s / self.distancia)
+        return tuple(i + (f - i) * fracao for i, f in zip(self.inicio, self.fim))
+
+
+class SimuladorGrbl:
+    """
+    Máquina GRBL simulada ligada ao lado mestre de um pty.
+
+    rx_buffer: bytes do buffer de recepção (128 no Arduino)
+    blocos_planejador: blocos de movimento que cabem no planejador
+    escala: fator de aceleração do relógio (2.0 = duas vezes mais rápido)
+    """
+
+    def __init__(self, configuracoes=None, rx_buffer=128, blocos_planejador=15,
+                 escala=1.0, log=None):
+        self.configuracoes = dict(CONFIGURACOES_PADRAO)
+        self.configuracoes.update(configuracoes or {})
+        self.rx_buffer = rx_buffer
+        self.blocos_planejador = blocos_planejador
+        self.escala = escala
+        self.log = log or (lambda mensagem: print(mensagem, file=sys.stderr))
+        self.master = None
+        self.slave = None
+        self.caminho = None
+        self._reiniciar()
+        self.estatisticas = collections.Counter()
+
+    def _reiniciar(self):
+        self.posicao = (0.0, 0.0, 0.0)
+        self.planejador = collections.deque()
+        self.recebido = bytearray()
+        self.feed = None
+        self.modo = None
+        self.absoluto = True
+        self.pausado = None
+        self.espera = None
+        self.t_espera = None
+        self.estado = "Alarm" if self.configuracoes[22] else "Idle"
+
+    # --- pty ---------------------------------------------------------------
+
+    def abrir(self, link=None):
+        """Cria o pty e retorna o caminho a ser usado como "port"."""
+        import tty
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.caminho = os.ttyname(self.slave)
+        if link:
+            if os.path.islink(link):
+                os.unlink(link)
+            os.symlink(self.caminho, link)
+            self.caminho = link
+        self._banner()
+        return self.caminho
+
+    def _escrever(self, texto):
+        os.write(self.master, (texto + "\r\n").encode())
+
+    def _banner(self):
+        self._escrever("")
+        self._escrever("Grbl 1.1h ['$' for help]")
+        if self.estado == "Alarm":
+            self._escrever("[MSG:'$H'|'$X' to unlock]")
+
+    def executar(self):
+        """Laço principal: lê o pty, avança a simulação e responde."""
+        try:
+            while True:
+                ocupado = self.planejador or self.espera
+                prontos, _, _ = select.select([self.master], [], [], 0.001 if ocupado else 0.02)
+                if prontos:
+                    self._receber(os.read(self.master, 1024))
+                self._avancar(time.monotonic())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.log("Simulador encerrado: " + ", ".join(
+                f"{chave}={valor}" for chave, valor in sorted(self.estatisticas.items())))
+
+    # --- recepção ----------------------------------------------------------
+
+    def _receber(self, dados):
+        for byte in dados:
+            caractere = chr(byte)
+            if caractere == "?":
+                self._relatorio()
+            elif caractere == "!" and self.pausado is None and self.estado == "Run":
+                self.pausado = time.monotonic()
+                self.estado = "Hold"
+            elif caractere == "~" and self.pausado is not None:
+                # Retoma o bloco corrente de onde parou
+                if self.planejador and self.planejador[0].t_inicio is not None:
+                    self.planejador[0].t_inicio += time.monotonic() - self.pausado
+                self.pausado = None
+                self.estado = "Run"
+            elif byte == 0x18:
+                self._soft_reset()
+            elif len(self.recebido) >= self.rx_buffer:
+                # O Arduino descarta bytes quando o buffer está cheio
+                self.estatisticas["bytes_perdidos"] += 1
+            else:
+                self.recebido.append(byte)
+        self.estatisticas["pico_rx"] = max(self.estatisticas["pico_rx"], len(self.recebido))
+
+    def _soft_reset(self):
+        """
+        Ctrl-X: como no GRBL, parado (ou com o feed hold concluído) a posição e
+        o estado são mantidos; em movimento a posição se perde (ALARM:3).
+        """
+        agora = time.monotonic()
+        em_movimento = self.pausado is None and (bool(self.planejador) or self.estado == "Home")
+        posicao = self._posicao_atual(agora)
+        alarme = self.estado == "Alarm"
+        self._reiniciar()
+        if em_movimento:
+            self.estado = "Alarm"
+            self._escrever("ALARM:3")
+        else:
+            self.posicao = posicao
+            self.estado = "Alarm" if alarme else "Idle"
+        self._banner()
+
+    def _relatorio(self):
+        x, y, z = self._posicao_atual(time.monotonic())
+        feed = self.planejador[0].velocidade * 60.0 if self.planejador and self.estado == "Run" else 0
+        self._escrever(f"<{self.estado}|MPos:{x:.3f},{y:.3f},{z:.3f}|FS:{feed:.0f},0>")
+        self.estatisticas["relatorios"] += 1
+
+    # --- simulação ---------------------------------------------------------
+
+    def _posicao_atual(self, agora):
+        if self.pausado is not None:
+            agora = self.pausado
+        if self.estado == "Home" and self.t_espera is not None:
+            return self.espera[1].posicao(agora)
+        if self.planejador:
+            return self.planejador[0].posicao(agora)
+        return self.posicao
+
+    def _avancar(self, agora):
+        if self.pausado is not None:
+            return
+        # Conclui os blocos cujo tempo já passou, encadeando os seguintes
+        while self.planejador:
+            bloco = self.planejador[0]
+            if bloco.t_inicio is None:
+                bloco.t_inicio = agora
+            if agora < bloco.t_inicio + bloco.duracao:
+                break
+            self.planejador.popleft()
+            self.posicao = bloco.fim
+            if self.planejador:
+                self.planejador[0].t_inicio = bloco.t_inicio + bloco.duracao
+            self.estatisticas["tempo_movimento_s"] += round(bloco.duracao * self.escala, 3)
+        if self.estado == "Run" and not self.planejador:
+            self.estado = "Idle"
+
+        if self.espera and not self.planejador:
+            tipo, parametro = self.espera
+            if self.t_espera is None:
+                self.t_espera = agora
+                if tipo == "home":
+                    self.estado = "Home"
+                    parametro.t_inicio = agora
+            duracao = parametro.duracao if tipo == "home" else parametro / self.escala
+            if agora - self.t_espera < duracao:
+                return
+            if tipo == "home":
+                self.posicao = (0.0, 0.0, 0.0)
+                self.estado = "Idle"
+            self.espera = None
+            self.t_espera = None
+            self._escrever("ok")
+
+        while not self.espera and len(self.planejador) < self.blocos_planejador:
+            linha = self._proxima_linha()
+            if linha is None:
+                break
+            self._escrever(self._executar_linha(linha, agora))
+
+    def _proxima_linha(self):
+        for indice, byte in enumerate(self.recebido):
+            if byte in (0x0A, 0x0D):
+                linha = bytes(self.recebido[:indice]).decode(errors="replace")
+                del self.recebido[:indice + 1]
+                return linha
+        return None
+
+    def _executar_linha(self, linha, agora):
+        """Executa uma linha e retorna a resposta ("ok", "error:N" ou "")."""
+        self.estatisticas["linhas"] += 1
+        linha = re.sub(r"\(.*?\)", "", linha).split(";")[0]
+        linha = linha.replace(" ", "").upper()
+        if not linha:
+            return "ok"
+        if linha.startswith("$"):
+            return self._comando_sistema(linha, agora)
+        if self.estado == "Alarm":
+            return "error:9"
+        return self._gcode(linha, agora)
+
+    def _comando_sistema(self, linha, agora):
+        ocupado = bool(self.planejador) or self.estado not in ("Idle", "Alarm")
+        if linha == "$":
+            self._escrever("[HLP:$$ $# $G $I $N $x=val $Nx=line $J=line $SLP $C $X $H ~ ! ? ctrl-x]")
+            return "ok"
+        if linha == "$$":
+            if ocupado:
+                return "error:8"
+            for numero, valor in sorted(self.configuracoes.items()):
+                texto = f"{valor:.3f}" if isinstance(valor, float) else str(valor)
+                self._escrever(f"${numero}={texto}")
+            return "ok"
+        if linha == "$X":
+            if self.estado == "Alarm":
+                self._escrever("[MSG:Caution: Unlocked]")
+                self.estado = "Idle"
+            return "ok"
+        if linha == "$H":
+            if not self.configuracoes[22]:
+                return "error:5"
+            if ocupado:
+                return "error:8"
+            origem = self._posicao_atual(agora)
+            bloco = Bloco(origem, (0.0, 0.0, 0.0), self.configuracoes[25], self.configuracoes,
+                          escala=self.escala)
+            bloco.duracao += 0.5 / self.escala  # localização fina e afastamento das chaves
+            self.espera = ("home", bloco)
+            return ""  # "ok" só após o fim do homing
+        configuracao = re.match(r"^\$(\d+)=([-+]?\d*\.?\d+)$", linha)
+        if configuracao:
+            if ocupado:
+                return "error:8"
+            numero = int(configuracao.group(1))
+            if numero not in self.configuracoes:
+                return "error:3"
+            valor = configuracao.group(2)
+            self.configuracoes[numero] = float(valor) if "." in valor else int(valor)
+            return "ok"
+        if linha in ("$G", "$#", "$I", "$N", "$C"):
+            return "ok"
+        return "error:3"
+
+    def _gcode(self, linha, agora):
+        palavras = _RE_PALAVRA.findall(linha)
+        if "".join(letra + valor for letra, valor in palavras) != linha:
+            return "error:1"
+        movimento = None
+        alvo = {}
+        dwell = None
+        for letra, valor in palavras:
+            numero = float(valor)
+            if letra == "G":
+                if numero in (0, 1):
+                    movimento = int(numero)
+                elif numero == 4:
+                    dwell = 0.0
+                elif numero == 90:
+                    self.absoluto = True
+                elif numero == 91:
+                    self.absoluto = False
+                elif numero not in (17, 21, 54, 94):
+                    return "error:20"
+            elif letra == "F":
+                if numero <= 0:
+                    return "error:22"
+                self.feed = numero
+            elif letra == "P" and dwell is not None:
+                dwell = numero
+            elif letra in EIXOS:
+                alvo[EIXOS.index(letra)] = numero
+            else:
+                return "error:20"
+
+        if dwell is not None:
+            self.espera = ("dwell", dwell)
+            return ""
+        if not alvo:
+            return "ok"
+        if movimento is not None:
+            self.modo = movimento
+        movimento = self.modo
+        if movimento is None:
+            return "error:20"
+        if movimento == 1 and self.feed is None:
+            return "error:22"
+
+        inicio = self.planejador[-1].fim if self.planejador else self.posicao
+        fim = list(inicio)
+        for eixo, valor in alvo.items():
+            fim[eixo] = valor if self.absoluto else inicio[eixo] + valor
+        if self.configuracoes[20]:
+            for eixo, valor in enumerate(fim):
+                if valor > 0 or valor < -self.configuracoes[130 + eixo]:
+                    return "error:15"
+        bloco = Bloco(tuple(inicio), tuple(fim), self.feed or 0.0, self.configuracoes,
+                      rapido=movimento == 0, escala=self.escala)
+        self.planejador.append(bloco)
+        self.estado = "Run"
+        return "ok"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulador de GRBL em pseudo-terminal")
+    parser.add_argument("--link", help="cria um link simbólico estável para o pty (ex.: /tmp/grbl_sim)")
+    parser.add_argument("--max-rate", type=float, help="velocidade máxima de X e Y ($110/$111, mm/min)")
+    parser.add_argument("--aceleracao", type=float, help="aceleração de X e Y ($120/$121, mm/s²)")
+    parser.add_argument("--rx-buffer", type=int, default=128, help="buffer de recepção (bytes)")
+    parser.add_argument("--planejador", type=int, default=15, help="blocos no planejador")
+    parser.add_argument("--escala", type=float, default=1.0,
+                        help="acelera o relógio simulado (2.0 = duas vezes mais rápido)")
+    parser.add_argument("--sem-homing", action="store_true",
+                        help="desabilita o homing ($22=0) e o alarme inicial")
+    args = parser.parse_args(argv)
+
+    configuracoes = {}
+    if args.max_rate:
+        configuracoes[110] = configuracoes[111] = args.max_rate
+    if args.aceleracao:
+        configuracoes[120] = configuracoes[121] = args.aceleracao
+    if args.sem_homing:
+        configuracoes[22] = 0
+
+    simulador = SimuladorGrbl(configuracoes, args.rx_buffer, args.planejador, args.escala)
+    caminho = simulador.abrir(args.link)
+    print(f"GRBL simulado em: {caminho}")
+    print(f'Use  "port": "{caminho}"  no cfg.json. Ctrl+C para encerrar.')
+    sys.stdout.flush()
+    simulador.executar()
+
+
+if __name__ == "__main__":
+    main()